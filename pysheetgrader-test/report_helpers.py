@@ -0,0 +1,15 @@
+from pysheetgrader.grading.report import GradingReport, GradingReportType
+
+
+def create_report(rubric_args):
+    report = GradingReport(GradingReportType.ASSIGNMENT)
+    sheet_report = GradingReport(GradingReportType.SHEET)
+    sheet_report.report_html_args = {'name': "Q1"}
+    for score, html_args in rubric_args:
+        rubric_report = GradingReport(GradingReportType.RUBRIC)
+        rubric_report.submission_score = score
+        rubric_report.max_possible_score = 1.0
+        rubric_report.report_html_args = html_args
+        sheet_report += rubric_report
+    report += sheet_report
+    return report
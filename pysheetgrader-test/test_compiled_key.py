@@ -0,0 +1,75 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from pysheetgrader.compiled_key import CompiledKey, compile_key, decode_value, encode_value, load_key_document
+from pysheetgrader.document import Document
+from pysheetgrader.grading.rubric import GradingRubric, GradingRubricType
+from pysheetgrader.grading.test_case import GradingTestCase
+
+KEY_PATH = os.path.join(os.path.dirname(__file__), '..', 'excel', 'TestModeKey.xlsx')
+
+
+class TestCompiledKey(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings(action='ignore')
+        self.directory = tempfile.mkdtemp()
+        self.key_path = os.path.join(self.directory, 'Key.xlsx')
+        shutil.copy(KEY_PATH, self.key_path)
+        self.compiled_path = CompiledKey.default_path(self.key_path)
+        compile_key(self.key_path, self.compiled_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_compiled_key_matches_key(self):
+        key_document = Document(self.key_path, read_only=False)
+        compiled_key = CompiledKey(self.compiled_path)
+
+        self.assertTrue(compiled_key.is_valid_key())
+        key_sheets = key_document.get_grading_sheets()
+        compiled_sheets = compiled_key.get_grading_sheets()
+        self.assertEqual([(s.name, s.minimum_work, s.feedback) for s in compiled_sheets],
+                         [(s.name, s.minimum_work, s.feedback) for s in key_sheets])
+
+        for sheet in key_sheets:
+            key_rubrics = GradingRubric.create_rubrics_for_sheet(key_document, sheet, False, False)
+            compiled_rubrics = GradingRubric.create_rubrics_for_sheet(compiled_key, sheet, False, False)
+            self.assertEqual([(r.cell_coord, r.rubric_type, r.score) for r in compiled_rubrics],
+                             [(r.cell_coord, r.rubric_type, r.score) for r in key_rubrics])
+
+            for r in key_rubrics:
+                self.assertEqual(compiled_key.formula_wb[sheet.name][r.cell_coord].value,
+                                 key_document.formula_wb[sheet.name][r.cell_coord].value)
+                self.assertEqual(compiled_key.computed_value_wb[sheet.name][r.cell_coord].value,
+                                 key_document.computed_value_wb[sheet.name][r.cell_coord].value)
+
+        key_document.close()
+
+    def test_load_key_document(self):
+        self.assertIsInstance(load_key_document(self.compiled_path), CompiledKey)
+        # The compiled key next to the key spreadsheet is only used when it's passed explicitly.
+        key_document = load_key_document(self.key_path)
+        self.assertNotIsInstance(key_document, CompiledKey)
+        key_document.close()
+
+        # Once the key spreadsheet changes, its compiled key is not up to date anymore.
+        with open(self.key_path, 'ab') as file:
+            file.write(b'\0')
+        self.assertFalse(CompiledKey.is_up_to_date(self.compiled_path, self.key_path))
+
+    def test_encode_values(self):
+        values = [GradingRubricType.FORMULA, datetime.datetime(2024, 1, 2, 3, 4), datetime.timedelta(hours=1),
+                  GradingTestCase("case", 2.0, {'A1': 1.0}, 0.5, "fail")]
+        decoded = json.loads(json.dumps(values, default=encode_value), object_hook=decode_value)
+        self.assertEqual(decoded[:3], values[:3])
+        self.assertEqual((decoded[3].name, decoded[3].expected_output, dict(decoded[3].inputs),
+                          decoded[3].output_delta, decoded[3].failmsg), ("case", 2.0, {'A1': 1.0}, 0.5, "fail"))
+
+        with self.assertRaises(TypeError):
+            json.dumps(object(), default=encode_value)
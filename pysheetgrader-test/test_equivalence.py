@@ -0,0 +1,41 @@
+import unittest
+
+from sympy import symbols, sqrt, Max, Eq, sin, cos, Piecewise
+
+from pysheetgrader.equivalence import EquivalenceBudget, EquivalenceTier, check_equivalence
+
+a, b, c = symbols('a b c')
+
+
+class TestEquivalence(unittest.TestCase):
+
+    def assert_equivalence(self, key_expr, sub_expr, is_equivalent, tier, budget=None):
+        result = check_equivalence(key_expr, sub_expr, budget)
+        self.assertEqual((result.is_equivalent, result.tier), (is_equivalent, tier))
+
+    def test_structural(self):
+        self.assert_equivalence(a + b * c, c * b + a, True, EquivalenceTier.STRUCTURAL)
+
+    def test_probe(self):
+        self.assert_equivalence(a + b, a - b, False, EquivalenceTier.PROBE)
+        self.assert_equivalence(Max(a, b) * 2, Max(a, b) + 1, False, EquivalenceTier.PROBE)
+
+    def test_algebraic(self):
+        self.assert_equivalence((a + b) ** 2, a ** 2 + 2 * a * b + b ** 2, True, EquivalenceTier.ALGEBRAIC)
+        self.assert_equivalence((a ** 2 - b ** 2) / (a - b), a + b, True, EquivalenceTier.ALGEBRAIC)
+
+    def test_simplify(self):
+        self.assert_equivalence(sqrt(a ** 2 * b ** 2), a * b, False, EquivalenceTier.SIMPLIFY)
+        self.assert_equivalence(sin(a) ** 2 + cos(a) ** 2, 1, True, EquivalenceTier.SIMPLIFY)
+
+        # Expressions that can't be subtracted raise the same error as before.
+        self.assertRaises(TypeError, lambda: check_equivalence(Eq(a, b), Eq(b, a + 1)))
+
+    def test_budget(self):
+        budget = EquivalenceBudget(max_operations=2)
+        self.assert_equivalence((a + b) ** 2, a ** 2 + 2 * a * b + b ** 2, False, EquivalenceTier.BUDGET, budget)
+        self.assert_equivalence(a * (b + c), a * b + a * b, False, EquivalenceTier.PROBE, budget)
+
+        # Formulas matching on every random point aren't accepted over the budget.
+        key_expr = Piecewise((a + 1, a > 5), (a, True))
+        self.assert_equivalence(key_expr, a, False, EquivalenceTier.BUDGET, EquivalenceBudget(max_operations=0))
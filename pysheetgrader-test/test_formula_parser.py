@@ -1,9 +1,12 @@
+import pickle
 import unittest
 
 from pysheetgrader.formula_parser import parse_formula_tokens, parse_formula, parse_formula_inputs, \
-    encode_cell_reference, decode_cell_reference, transform_excel_formula_to_sympy
+    encode_cell_reference, decode_cell_reference, transform_excel_formula_to_sympy, compile_formula, FORMULA_CACHE, \
+    evaluate_formula, parse_from_excel, EXCEL_FORMULA_CACHE, encode_range_reference, decode_range_reference, NumericValue
 
 from pysheetgrader.custom_excel_formula import get_excel_formula_lambdas
+from sympy import Rational
 
 
 class TestFormulaParser(unittest.TestCase):
@@ -100,6 +103,91 @@ class TestFormulaParser(unittest.TestCase):
         result = parse_formula(formula, local_dict)
         self.assertEqual(result, 3000)
 
+    def test_compile_formula_cache(self):
+        formula = '= b2 * 3 + sum(c2:c3)'
+        FORMULA_CACHE.clear()
+        compiled = compile_formula(formula)
+        self.assertIs(compile_formula(formula), compiled)
+        self.assertEqual((FORMULA_CACHE.hits, FORMULA_CACHE.misses), (1, 1))
+        self.assertEqual(sorted(compiled.inputs), ['b_2', 'c_2', 'c_3'])
+
+        # The same compiled formula is evaluated with different values.
+        local_dict = dict(get_excel_formula_lambdas())
+        self.assertEqual(parse_formula(formula, dict(local_dict, b_2=1, c_2=2, c_3=3)), 8)
+        self.assertEqual(parse_formula(formula, dict(local_dict, b_2=2, c_2=0, c_3=1)), 7)
+        self.assertEqual(len(compiled.codes), 1)
+
+    def test_evaluate_formula_numeric(self):
+        formula = '= b2 ^ 2 - c2 / b2 + max(b2, c2)'
+        self.assertIsNotNone(compile_formula(formula).get_numeric_function())
+        self.assertEqual(evaluate_formula(formula, {'b_2': 2, 'c_2': 3}), 5.5)
+        self.assertEqual(evaluate_formula(formula, {'b_2': 4, 'c_2': 2}), 19.5)
+
+    def test_evaluate_formula_numeric_value(self):
+        formula = '= b2 / 10 + c2 / 10'
+        compile_formula(formula).get_numeric_function()
+        for _ in range(2):
+            result = evaluate_formula(formula, {'b_2': 1, 'c_2': 2})
+            # The float result is rounded, its Sympy evaluation isn't.
+            self.assertIsInstance(result, NumericValue)
+            self.assertEqual(result, 0.1 + 0.2)
+            self.assertEqual(result.exact(), Rational(3, 10))
+
+        self.assertIs(type(pickle.loads(pickle.dumps(result))), float)
+
+    def test_evaluate_formula_excel_functions(self):
+        formula = transform_excel_formula_to_sympy('=IF(AND(B2>1, NOT(C2>5)), ROUND(B2, 0), ROUNDUP(C2, 1))')
+        self.assertEqual(formula, '=excel_if(excel_and(b2>1, excel_not(c2>5)), round(b2, 0), roundup(c2, 1))')
+        self.assertIsNotNone(compile_formula(formula).get_numeric_function())
+        self.assertEqual(evaluate_formula(formula, {'b_2': 2.5, 'c_2': 3}), 3)
+        self.assertEqual(evaluate_formula(formula, {'b_2': 2.5, 'c_2': 5.01}), 5.1)
+        self.assertEqual(evaluate_formula('=average(b2:b4)', {'b_2': 1, 'b_3': 2, 'b_4': 6}), 3)
+
+    def test_evaluate_formula_len(self):
+        formula = transform_excel_formula_to_sympy('=LEN(A1)')
+        self.assertEqual(evaluate_formula(formula, {'a_1': "hello world"}), 11)
+        self.assertEqual(evaluate_formula(formula, {'a_1': 12.5}), 4)
+        self.assertEqual(evaluate_formula(formula, {'a_1': 3.0}), 1)
+        # The length of a cell without value isn't the length of its symbol's name.
+        self.assertEqual(str(parse_formula(formula, dict(get_excel_formula_lambdas()))), 'len(a_1)')
+
+    def test_evaluate_formula_ranges(self):
+        formula = '=sum(b1:b1000) / average(b1:b1000) + countif(b1:b1000, ">500") + c1'
+        compiled = compile_formula(formula, expand_ranges=False)
+        self.assertEqual(compiled.arguments, ['b_1__b_1000', 'c_1'])
+        self.assertEqual(compiled.ranges, {'b_1__b_1000'})
+
+        # Empty cells of ranges are skipped, like Excel does.
+        values = list(range(1, 1001)) + [None]
+        inputs = {'b_1__b_1000': values, 'c_1': 1}
+        self.assertEqual(evaluate_formula(formula, inputs, expand_ranges=False), 1000 + 500 + 1)
+        # Not evaluated numerically, since c1 is a Boolean.
+        self.assertEqual(evaluate_formula(formula, dict(inputs, c_1=True), expand_ranges=False), 1000 + 500 + 1)
+
+    def test_encode_range_reference(self):
+        self.assertEqual(encode_range_reference('B2:$c$500'), 'b_2__c_500')
+        self.assertEqual(decode_range_reference('b_2__c_500'), 'B2:C500')
+
+    def test_evaluate_formula_sympy_fallback(self):
+        formula = '= excel_if(b2 == "ok", b3, b4)'
+        self.assertIsNone(compile_formula(formula).get_numeric_function())
+        self.assertEqual(evaluate_formula(formula, {'b_2': "ok", 'b_3': 2000, 'b_4': 3000}), 2000)
+
+        # Failed numeric evaluations are left to Sympy, which raises the same errors as `parse_formula`.
+        self.assertRaises(ZeroDivisionError, lambda: evaluate_formula('= b2 / c2', {'b_2': 1, 'c_2': 0}))
+
+    def test_parse_from_excel_cache(self):
+        formula = '=IF(A1>2,SUM(B1:B3),0)'
+        EXCEL_FORMULA_CACHE.clear()
+        self.assertEqual(parse_from_excel(formula, A1=3, **{'B1:B3': [1, 2, 3]}), 6.0)
+        self.assertEqual(parse_from_excel(formula, A1=1, **{'B1:B3': [1, 2, 3]}), 0.0)
+        self.assertEqual((EXCEL_FORMULA_CACHE.hits, EXCEL_FORMULA_CACHE.misses), (1, 1))
+
+        # Unsupported functions are still rejected when the formula comes from the cache.
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                parse_from_excel('=ABS(A1)', A1=-1)
+
     def test_encode_cell_reference(self):
         self.assertEqual(encode_cell_reference('BC2'), 'bc_2')
         self.assertEqual(encode_cell_reference('C110'), 'c_110')
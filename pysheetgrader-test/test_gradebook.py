@@ -0,0 +1,68 @@
+import csv
+import importlib.util
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from pysheetgrader.gradebook import Gradebook
+
+from report_helpers import create_report
+
+
+class TestGradebook(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "gradebook.csv")
+        self.rubrics = {"Q1": [SimpleNamespace(cell_id="A1"), SimpleNamespace(cell_id="A2")]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_rows(self):
+        with open(self.path, newline='') as file:
+            return list(csv.reader(file))
+
+    def test_rubric_columns(self):
+        gradebook = Gradebook(self.path, self.rubrics)
+        # A2 wasn't graded, e.g. because of a failed killer rubric.
+        gradebook.append("student", create_report([(1.0, {'id': "A1", 'is_correct': True, 'error': "Error: x"})]))
+        gradebook.append("broken", None)
+        gradebook.close()
+
+        self.assertEqual(self.read_rows(), [
+            ["Submission", "Score", "Max Score", "Q1 Score", "Q1!A1 Score", "Q1!A1 Correct", "Q1!A1 Error",
+             "Q1!A2 Score", "Q1!A2 Correct", "Q1!A2 Error"],
+            ["student", "1.0", "1.0", "1.0", "1.0", "True", "Error: x", "", "", ""],
+            ["broken", "", "", "", "", "", "", "", "", ""],
+        ])
+
+    def test_exception_error(self):
+        gradebook = Gradebook(self.path, self.rubrics)
+        error = KeyError('Worksheet Q1 does not exist.')
+        row = gradebook.create_row("student", create_report([(0.0, {'id': "A1", 'error': error})]))
+        gradebook.close()
+        self.assertEqual(row[6], str(error))
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow isn't installed")
+    def test_arrow_exception_error(self):
+        import pyarrow
+        arrow_path = os.path.join(self.directory.name, "gradebook.arrow")
+        gradebook = Gradebook(self.path, self.rubrics, arrow_path)
+        gradebook.append("student", create_report([(0.0, {'id': "A1", 'error': KeyError("Q1")})]))
+        gradebook.close()
+
+        with open(arrow_path, 'rb') as file:
+            table = pyarrow.ipc.open_stream(file).read_all()
+        self.assertEqual(table.column("Q1!A1 Error").to_pylist(), [str(KeyError("Q1"))])
+
+    def test_rows_flushed_before_close(self):
+        gradebook = Gradebook(self.path, self.rubrics)
+        gradebook.append("student", create_report([]))
+        self.assertEqual(len(self.read_rows()), 2)
+        gradebook.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
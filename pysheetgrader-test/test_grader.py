@@ -0,0 +1,73 @@
+import os
+import unittest
+import warnings
+from unittest import mock
+
+from pysheetgrader import pool
+from pysheetgrader.document import Document
+from pysheetgrader.grader import Grader
+from pysheetgrader.grading.rubric import GradingRubric, GradingRubricType
+from pysheetgrader.grading.test_case import GradingTestCase
+from pysheetgrader.grading.strategy.formula import NaiveFormulaStrategy
+
+KEY_PATH = os.path.join(os.path.dirname(__file__), '..', 'excel', 'TestModeKey.xlsx')
+SUBMISSION_PATH = os.path.join(os.path.dirname(__file__), '..', 'excel', 'TestModeSubmission.xlsx')
+
+
+class TestGrader(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings(action='ignore')
+        self.key_document = Document(KEY_PATH, read_only=True)
+        self.grader = Grader(self.key_document, False, False, False)
+
+    def tearDown(self):
+        self.key_document.close()
+
+    def test_grade_many_continues_after_grading_exception(self):
+        grade = self.grader.grade
+        documents = []
+
+        def grade_or_raise(document):
+            documents.append(document)
+            if len(documents) == 1:
+                raise ValueError("Malformed submission")
+            return grade(document)
+
+        with mock.patch.object(self.grader, 'grade', side_effect=grade_or_raise), \
+                mock.patch('sys.stderr'):
+            results = list(self.grader.grade_many([SUBMISSION_PATH, SUBMISSION_PATH]))
+
+        self.assertEqual([path for path, _ in results], [SUBMISSION_PATH, SUBMISSION_PATH])
+        self.assertIsNone(results[0][1])
+        self.assertIsNotNone(results[1][1])
+
+    def test_grade_in_worker_catches_exception(self):
+        worker_grader = mock.Mock(is_log=False)
+        worker_grader.grade_many.side_effect = ValueError("Malformed submission")
+
+        with mock.patch.object(pool, '_worker_grader', worker_grader), mock.patch('sys.stderr'):
+            self.assertEqual(pool.grade_in_worker(SUBMISSION_PATH), (SUBMISSION_PATH, None))
+
+    def test_cached_verdicts_skip_parsing(self):
+        submissions = list(self.grader.grade_many([SUBMISSION_PATH]))
+        self.assertGreater(len(self.grader.verdict_cache.memory), 0)
+
+        # The second grading of the same formulas reuses their verdicts without parsing them.
+        with mock.patch.object(NaiveFormulaStrategy, 'parse_formula', side_effect=AssertionError("Parsed")):
+            cached_submissions = list(self.grader.grade_many([SUBMISSION_PATH]))
+        self.assertEqual(cached_submissions[0][1].report_lines, submissions[0][1].report_lines)
+
+    def test_required_cells_include_test_case_references(self):
+        values = self.grader.rubrics['RConstant'][0].get_values()
+        values['rubric_type'] = GradingRubricType.TEST
+        values['test_cases'] = [GradingTestCase("T1", 2, {'D40': 1}, failmsg="Check the value of $E$41")]
+        self.grader.rubrics['RConstant'] = [GradingRubric(values, False, False)]
+
+        required_cells = self.grader.find_required_cells()['RConstant']
+        self.assertIn('D40', required_cells)
+        self.assertIn('E41', required_cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from pysheetgrader.profiler import NULL_PHASE, profile_phase, profiled, start_profiler, stop_profiler
+
+
+@profiled('inner')
+def inner_function():
+    return 1
+
+
+class TestProfiler(unittest.TestCase):
+
+    def tearDown(self):
+        stop_profiler()
+
+    def test_disabled(self):
+        self.assertIs(profile_phase('phase'), NULL_PHASE)
+        self.assertEqual(inner_function(), 1)
+
+    def test_nested_phases(self):
+        profiler = start_profiler(trace=True)
+        with profile_phase('outer', {'path': 'a.xlsx'}):
+            inner_function()
+            inner_function()
+        stop_profiler()
+
+        phases = profiler.to_dict()['phases']
+        self.assertEqual(list(phases), ['outer', 'outer/inner'])
+        self.assertEqual(phases['outer/inner']['count'], 2)
+        self.assertGreaterEqual(phases['outer']['wall_time'], phases['outer/inner']['wall_time'])
+        self.assertEqual([event['name'] for event in profiler.trace_events], ['inner', 'inner', 'outer'])
+        self.assertEqual(profiler.trace_events[-1]['args'], {'path': 'a.xlsx'})
+
+    def test_phase_ends_on_exception(self):
+        profiler = start_profiler()
+        with self.assertRaises(ValueError):
+            with profile_phase('outer'):
+                raise ValueError()
+        self.assertEqual(profiler.stack, [])
+        self.assertEqual(profiler.phases['outer'][0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
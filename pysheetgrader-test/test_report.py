@@ -0,0 +1,51 @@
+import pickle
+import unittest
+
+from pysheetgrader.grading.report import GradingReport, GradingReportType
+
+
+def create_rubric_report(cell_id, score):
+    report = GradingReport(GradingReportType.RUBRIC)
+    report.submission_score = score
+    report.max_possible_score = 1.0
+    report.append_line("\t- Cell: {}", cell_id)
+    report.report_html_args = {'cell_id': cell_id}
+    return report
+
+
+class TestGradingReport(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet_report = GradingReport(GradingReportType.SHEET)
+        self.sheet_report.append_line("Sheet {}", "Q1")
+        self.sheet_report.report_html_args = {'name': "Q1"}
+        self.sheet_report += create_rubric_report("A1", 1.0)
+        self.sheet_report += create_rubric_report("A2", 0.0)
+
+    def test_report_lines(self):
+        self.assertEqual(self.sheet_report.report_lines, ["Sheet Q1\n", "\t- Cell: A1\n", "\t- Cell: A2\n"])
+        self.assertEqual(self.sheet_report.submission_score, 1.0)
+        self.assertEqual(self.sheet_report.max_possible_score, 2.0)
+
+    def test_truncate_lines_keeps_children(self):
+        self.sheet_report.truncate_lines(1)
+        self.assertEqual(self.sheet_report.report_lines, ["Sheet Q1\n"])
+        self.assertEqual(len(self.sheet_report.create_html_args()['rubrics']), 2)
+
+    def test_create_html_args(self):
+        html_args = self.sheet_report.create_html_args()
+        self.assertEqual(html_args, {'name': "Q1", 'rubrics': [{'cell_id': "A1"}, {'cell_id': "A2"}]})
+
+    def test_to_dict(self):
+        result = self.sheet_report.to_dict()
+        self.assertEqual(result['type'], 'sheet')
+        self.assertEqual(result['lines'], ["Sheet Q1"])
+        self.assertEqual([child['lines'] for child in result['children']], [["\t- Cell: A1"], ["\t- Cell: A2"]])
+
+    def test_pickle(self):
+        report = pickle.loads(pickle.dumps(self.sheet_report))
+        self.assertEqual(report.report_lines, self.sheet_report.report_lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from pysheetgrader.grading.rubric import GradingRubricType
+from pysheetgrader.stats import ClassStatistics, TopCounter
+
+from report_helpers import create_report
+
+
+class TestTopCounter(unittest.TestCase):
+
+    def test_keeps_frequent_values(self):
+        counter = TopCounter(2)
+        for value in ["a", "a", "a", "b", "c", "a", "d"]:
+            counter.add(value)
+        self.assertEqual(len(counter.counts), 2)
+        self.assertEqual(counter.most_common()[0], ("a", 4))
+
+
+class TestClassStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "stats.json")
+        self.rubrics = {"Q1": [SimpleNamespace(cell_id="A1", rubric_type=GradingRubricType.FORMULA),
+                               SimpleNamespace(cell_id="A2", rubric_type=None)]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_statistics(self):
+        stats = ClassStatistics(self.path, self.rubrics, write_interval=2)
+        stats.append(create_report([(1.0, {'id': "A1", 'is_correct': True}), (0.0, {'id': "A2"})]))
+        self.assertFalse(os.path.exists(self.path))
+        stats.append(create_report([(0.0, {'id': "A1", 'is_correct': False, 'error': "Error: x"})]))
+        self.assertTrue(os.path.exists(self.path))
+        stats.append(None)
+        stats.close()
+
+        with open(self.path) as file:
+            result = json.load(file)
+        self.assertEqual(result['submissions'], 3)
+        self.assertEqual(result['failed_submissions'], 1)
+        sheet = result['sheets']['Q1']
+        self.assertEqual(sheet['most_failed_rubrics'], [{'cell_id': "A1", 'failed': 1}, {'cell_id': "A2", 'failed': 1}])
+        self.assertEqual(sheet['rubrics']['A1']['pass_rate'], 0.5)
+        self.assertEqual(sheet['rubrics']['A1']['scores']['histogram'], [1, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(result['rubric_types']['FORMULA']['top_errors'], [{'message': "Error: x", 'count': 1}])
+        self.assertEqual(result['rubric_types']['MANUAL']['graded'], 1)
+
+    def test_exception_errors_counted_by_message(self):
+        stats = ClassStatistics(self.path, self.rubrics)
+        for _ in range(2):
+            stats.append(create_report([(0.0, {'id': "A1", 'error': KeyError('Worksheet Q1 does not exist.')})]))
+        stats.close()
+
+        with open(self.path) as file:
+            result = json.load(file)
+        self.assertEqual(result['sheets']['Q1']['rubrics']['A1']['top_errors'],
+                         [{'message': str(KeyError('Worksheet Q1 does not exist.')), 'count': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import math
+import os
+import pickle
+import unittest
+from unittest import mock
+import warnings
+
+from pysheetgrader.document import Document
+from pysheetgrader.sheet import Sheet
+from pysheetgrader.grading.report import GradingReport, GradingReportType
+from pysheetgrader.grading.rubric import GradingRubric, GradingRubricType, RubricResult
+from pysheetgrader.grading.test_case import GradingTestCase
+from pysheetgrader.formula_parser import evaluate_formula
+from pysheetgrader.grading.strategy import test as test_strategy
+from pysheetgrader.grading.strategy.relative import RelativeStrategy
+from pysheetgrader.grading.strategy.context import SheetContext
+from pysheetgrader.grading.strategy import registry
+from pysheetgrader.grading.strategy.registry import get_strategy
+
+EXCEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'excel')
+SHEET_NAME = 'Test Case Samples'
+
+
+class TestTestRunStrategy(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings(action='ignore')
+        self.key_document = Document(os.path.join(EXCEL_PATH, 'TestModeKey.xlsx'))
+        self.sub_document = Document(os.path.join(EXCEL_PATH, 'TestModeSubmission.xlsx'))
+        self.rubrics = GradingRubric.create_rubrics_for_sheet(self.key_document, Sheet(SHEET_NAME, 0, None),
+                                                              False, False)
+
+    def tearDown(self):
+        self.key_document.close()
+        self.sub_document.close()
+
+    def create_strategy(self, rubric):
+        return test_strategy.TestRunStrategy(SheetContext(self.key_document, self.sub_document, SHEET_NAME), rubric)
+
+    def test_test_run_match_all_matches_test_run_match(self):
+        for rubric in self.rubrics:
+            strategy = self.create_strategy(rubric)
+            formula = strategy.sub_sheet_raw[rubric.cell_coord].value
+            test_cases = list(rubric.test_cases) + [
+                GradingTestCase(f"case_{index}", 0, dict(rubric.test_cases[0].inputs), output_delta=index * 100000)
+                for index in range(10)
+            ]
+
+            batch_runs = strategy.test_run_match_all(test_cases, formula)
+            self.assertIsNotNone(batch_runs, rubric.cell_coord)
+            for test_case, batch_run in zip(test_cases, batch_runs):
+                result_match, result, lower_range, upper_range = strategy.test_run_match(test_case, formula)
+                if batch_run is not None:
+                    self.assertTrue(result_match, f"{rubric.cell_coord} {test_case.name}")
+                    self.assertAlmostEqual(batch_run[1], float(result))
+                elif result_match:
+                    # Only passing results on a bound of the expected range are left to `test_run_match()`.
+                    self.assertTrue(math.isclose(result, lower_range) or math.isclose(result, upper_range),
+                                    f"{rubric.cell_coord} {test_case.name}")
+
+    def test_value_matches_on_delta_boundary(self):
+        def create_strategy(constant_delta):
+            rubric = GradingRubric(dict(self.rubrics[0].get_values(), constant_delta=constant_delta), False, False)
+            return RelativeStrategy(SheetContext(self.key_document, self.sub_document, SHEET_NAME), rubric)
+
+        # Evaluated numerically as 0.30000000000000004, compared as 3/10 on the boundaries.
+        key_value = evaluate_formula('= b2 / 10 + c2 / 10', {'b_2': 1, 'c_2': 2})
+
+        self.assertTrue(create_strategy(0).value_matches(key_value, 0.3))
+        strategy = create_strategy(0.1)
+        self.assertTrue(strategy.value_matches(key_value, 0.2))
+        self.assertTrue(strategy.value_matches(key_value, 0.4))
+        self.assertFalse(strategy.value_matches(key_value, 0.19999))
+
+    def test_test_run_match_all_bounds(self):
+        strategy = self.create_strategy(self.rubrics[0])
+        test_cases = [GradingTestCase("inside", 0.3, {'B2': 1, 'C2': 2}, output_delta=0.1),
+                      GradingTestCase("on_bound", 0.3, {'B2': 1, 'C2': 2}),
+                      GradingTestCase("on_delta_bound", 0.4, {'B2': 1, 'C2': 2}, output_delta=0.1)]
+
+        # Results on a bound of the expected range are left to `test_run_match()`, without tolerance.
+        batch_runs = strategy.test_run_match_all(test_cases, '=B2 / 10 + C2 / 10')
+        self.assertEqual([batch_run is not None for batch_run in batch_runs], [True, False, False])
+
+    def test_test_run_match_all_not_numeric(self):
+        strategy = self.create_strategy(self.rubrics[0])
+        test_cases = [GradingTestCase("text", 1, {'B2': "text"})]
+        self.assertIsNone(strategy.test_run_match_all(test_cases, '=B2 * 2'))
+        self.assertIsNone(strategy.test_run_match_all([GradingTestCase("if", 1, {'B2': 1})], '=IF(B2 = 1, 1, 0)'))
+
+    def test_grade(self):
+        report = self.create_strategy(self.rubrics[-1]).grade()
+        self.assertEqual(report.max_possible_score, self.rubrics[-1].score)
+        self.assertEqual(len(report.report_html_args['test_cases']), len(self.rubrics[-1].test_cases))
+
+    def test_grade_result(self):
+        rubric = self.rubrics[-1]
+        result = RubricResult()
+        context = SheetContext(self.key_document, self.sub_document, SHEET_NAME)
+        report = test_strategy.TestRunStrategy(context, rubric, result).grade()
+        self.assertEqual(result.is_correct, report.submission_score == rubric.score)
+        self.assertFalse(RubricResult().is_correct)
+
+    def test_rubric_read_only(self):
+        rubric = self.rubrics[-1]
+        with self.assertRaises(AttributeError):
+            rubric.score = 0
+        with self.assertRaises(AttributeError):
+            rubric.test_cases[0].expected_output = 0
+        with self.assertRaises(TypeError):
+            rubric.test_cases[0].inputs['B2'] = 0
+
+        copy = pickle.loads(pickle.dumps(rubric))
+        self.assertEqual(copy.get_values()['test_params'], rubric.get_values()['test_params'])
+        self.assertEqual(copy.cell_coord, rubric.cell_coord)
+        self.assertEqual(dict(copy.test_cases[0].inputs), dict(rubric.test_cases[0].inputs))
+
+    def test_strategy_registry(self):
+        self.assertIs(get_strategy(GradingRubricType.TEST), test_strategy.TestRunStrategy)
+        self.assertIsNone(get_strategy(None))
+        report = GradingReport(GradingReportType.RUBRIC)
+        test_strategy.TestRunStrategy.append_header_lines(report, self.rubrics[-1])
+        self.assertEqual(report.report_lines[-1], "\t- Test cases:\n")
+
+    def test_strategy_registry_without_entry_point_selection(self):
+        # Python < 3.10 returns the entry points as a dictionary of {group: entry points}.
+        entry_point = mock.Mock()
+        entry_point.name = 'relative'
+        entry_point.load.return_value = test_strategy.TestRunStrategy
+        with mock.patch.object(registry, 'entry_points',
+                               return_value={registry.STRATEGY_ENTRY_POINT_GROUP: (entry_point,)}), \
+                mock.patch.object(registry, '___strategies', None):
+            self.assertIs(get_strategy(GradingRubricType.RELATIVE), test_strategy.TestRunStrategy)
+            self.assertIs(get_strategy(GradingRubricType.TEST), test_strategy.TestRunStrategy)
+        self.assertIs(get_strategy(GradingRubricType.RELATIVE), RelativeStrategy)
@@ -0,0 +1,55 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from pysheetgrader.equivalence import EquivalenceResult, EquivalenceTier
+from pysheetgrader.verdict_cache import VerdictCache, normalize_formula
+
+
+class TestVerdictCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'verdicts.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_normalize_formula(self):
+        self.assertEqual(normalize_formula('= SUM(B2:B3) * 2'), normalize_formula('=sum(b2:b3)*2'))
+        self.assertEqual(normalize_formula('=IF(B2 = "a b", 1, 0)'), 'if(b_2="a b",1,0)')
+
+    def test_memory_cache(self):
+        cache = VerdictCache()
+        self.assertIsNone(cache.get('=B2+B3', '=B3+B2'))
+        cache.put('=B2+B3', '=B3+B2', 0, EquivalenceResult(True, EquivalenceTier.STRUCTURAL))
+        result = cache.get('=b2 + b3', '= b3+b2')
+        self.assertTrue(result.is_equivalent)
+        self.assertEqual(result.tier, EquivalenceTier.STRUCTURAL)
+        self.assertIsNone(cache.get('=B2+B3', '=B3+B2', delta=0.5))
+
+    def test_sqlite_cache(self):
+        cache = VerdictCache(self.path)
+        cache.put('=B2*2', '=B2+B3', 0, EquivalenceResult(False, EquivalenceTier.PROBE))
+        cache.close()
+
+        # Verdicts are shared with later runs and with worker processes, which get a copy without the memory cache.
+        for other_cache in (VerdictCache(self.path), pickle.loads(pickle.dumps(cache))):
+            self.assertEqual(len(other_cache.memory), 0)
+            result = other_cache.get('=B2*2', '=B2+B3')
+            self.assertFalse(result.is_equivalent)
+            self.assertEqual(result.tier, EquivalenceTier.PROBE)
+            other_cache.close()
+
+    def test_sqlite_cache_budget_verdicts(self):
+        # Verdicts of the BUDGET tier depend on the budget of the run, so they're only kept in memory.
+        cache = VerdictCache(self.path)
+        cache.put('=B2*2', '=B2+B2', 0, EquivalenceResult(False, EquivalenceTier.BUDGET))
+        self.assertEqual(cache.get('=B2*2', '=B2+B2').tier, EquivalenceTier.BUDGET)
+        cache.close()
+
+        other_cache = VerdictCache(self.path)
+        self.assertIsNone(other_cache.get('=B2*2', '=B2+B2'))
+        other_cache.close()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from openpyxl import Workbook, load_workbook
+
+from pysheetgrader.workbook import IndexedSheet, IndexedWorkbook, WorkbookReader
+
+SUBMISSION_PATH = os.path.join(os.path.dirname(__file__), '..', 'excel', 'TestModeSubmission.xlsx')
+KEY_PATH = os.path.join(os.path.dirname(__file__), '..', 'excel', 'TestModeKey.xlsx')
+
+
+class TestIndexedWorkbook(unittest.TestCase):
+
+    def setUp(self):
+        self.workbooks = {data_only: load_workbook(SUBMISSION_PATH, data_only=data_only) for data_only in (False, True)}
+
+    def tearDown(self):
+        for workbook in self.workbooks.values():
+            workbook.close()
+
+    def assert_matches_workbook(self, indexed_workbook, workbook):
+        self.assertEqual(indexed_workbook.sheetnames, workbook.sheetnames)
+        for worksheet in workbook.worksheets:
+            indexed_sheet = indexed_workbook[worksheet.title]
+            for row in worksheet.iter_rows():
+                for cell in row:
+                    self.assertEqual(indexed_sheet[cell.coordinate].value, cell.value,
+                                     f"{worksheet.title}!{cell.coordinate}")
+
+    def test_indexed_workbook_matches_openpyxl(self):
+        reader = WorkbookReader(SUBMISSION_PATH)
+        for data_only, workbook in self.workbooks.items():
+            self.assert_matches_workbook(IndexedWorkbook(reader, data_only), workbook)
+        reader.close()
+
+    def test_indexed_sheet_lookup(self):
+        sheet = IndexedSheet('Sheet', {'B4': 10, 'C1': 0})
+        self.assertEqual(sheet['B4'].value, 10)
+        self.assertEqual(sheet['$b$4'].value, 10)
+        self.assertEqual(sheet['C1'].value, 0)
+        self.assertIsNone(sheet['Z99'].value)
+        self.assertRaises(ValueError, lambda: sheet['B4:C5'])
+        self.assertEqual(sheet.get_range('B3:C4'), ((None, None), (10, None)))
+
+    def test_partially_loaded_sheet(self):
+        worksheet = self.workbooks[False].worksheets[0]
+        reader = WorkbookReader(SUBMISSION_PATH, targets={worksheet.title: {'$b$2'}})
+        formula_sheet = IndexedWorkbook(reader, data_only=False)[worksheet.title]
+        self.assertEqual(formula_sheet.loaded_coords, {'B2'})
+        self.assertEqual(formula_sheet['B2'].value, worksheet['B2'].value)
+
+        # Looking up a cell that wasn't targeted loads the whole sheet.
+        self.assertEqual(formula_sheet['A1'].value, worksheet['A1'].value)
+        self.assertIsNone(formula_sheet.loaded_coords)
+        self.assert_matches_workbook(IndexedWorkbook(reader, data_only=False), self.workbooks[False])
+        reader.close()
+
+    def test_comments_match_openpyxl(self):
+        workbook = load_workbook(KEY_PATH)
+        reader = WorkbookReader(KEY_PATH)
+        indexed_workbook = IndexedWorkbook(reader, data_only=False)
+        for worksheet in workbook.worksheets:
+            indexed_sheet = indexed_workbook[worksheet.title]
+            for row in worksheet.iter_rows():
+                for cell in row:
+                    indexed_comment = indexed_sheet[cell.coordinate].comment
+                    self.assertEqual(indexed_comment.text if indexed_comment else None,
+                                     cell.comment.text if cell.comment else None,
+                                     f"{worksheet.title}!{cell.coordinate}")
+        reader.close()
+        workbook.close()
+
+    def test_missing_sheet(self):
+        reader = WorkbookReader(SUBMISSION_PATH)
+        self.assertRaises(KeyError, lambda: IndexedWorkbook(reader, data_only=True)['NotASheet'])
+        reader.close()
+
+    def test_recalculate_values(self):
+        # Workbooks saved by openpyxl have no cached values.
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'NoValues.xlsx')
+        workbook = Workbook()
+        worksheet = workbook.active
+        for coord, value in {'A1': 2, 'A2': 3, 'B1': '=A1 * A2', 'B2': '=SUM(A1:A2) + B1', 'B3': '=B2 > 10',
+                             'C1': '=C2 + 1', 'C2': '=C1 + 1', 'C3': '=MOD(A1, 2)', 'D10': 1}.items():
+            worksheet[coord] = value
+        workbook.save(path)
+
+        reader = WorkbookReader(path, targets={worksheet.title: {'B2', 'B3', 'C1', 'C3'}}, recalculate=True)
+        value_sheet = IndexedWorkbook(reader, data_only=True)[worksheet.title]
+        self.assertEqual(value_sheet['B2'].value, 11)
+        self.assertIs(value_sheet['B3'].value, True)
+        # Cells in a reference cycle or using unsupported functions are left empty.
+        self.assertIsNone(value_sheet['C1'].value)
+        self.assertIsNone(value_sheet['C3'].value)
+        # Only the cells the targeted cells depend on are loaded.
+        self.assertEqual(value_sheet.loaded_coords, {'A1', 'A2', 'B1', 'B2', 'B3', 'C1', 'C2', 'C3'})
+        reader.close()
+
+        reader = WorkbookReader(path, targets={worksheet.title: {'B2'}})
+        self.assertIsNone(IndexedWorkbook(reader, data_only=True)[worksheet.title]['B2'].value)
+        reader.close()
+        shutil.rmtree(directory)
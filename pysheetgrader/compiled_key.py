@@ -0,0 +1,251 @@
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+
+from pysheetgrader.document import Document
+from pysheetgrader.sheet import Sheet
+from pysheetgrader.grading.rubric import GradingRubric, GradingRubricType
+from pysheetgrader.grading.test_case import GradingTestCase
+from pysheetgrader.profiler import profiled
+from pysheetgrader.workbook import IndexedSheet, IndexedWorkbook, PreloadedWorkbookReader
+
+
+class CompiledKey(Document):
+    """
+    Key document loaded from a compiled key file created by `compile_key()`, instead of from the key spreadsheet.
+    It holds the grading order, the already-parsed rubric values of every graded sheet and the formulas and cached
+    values of every key sheet, so loading it doesn't need to open the spreadsheet or parse any rubric note.
+
+    A compiled key file starts with FILE_SIGNATURE, followed by a JSON header line (format version and hash of the key
+    spreadsheet) and the JSON content, see `encode_value()`. Loading it only reads data, it never runs code.
+
+    The key formulas aren't stored parsed: their Sympy expressions have no data representation, and each process
+    parses a key formula only once anyway, see `formula_parser.FORMULA_CACHE`.
+
+    Attributes:
+        FILE_SIGNATURE      Bytes written at the start of every compiled key file.
+        FORMAT_VERSION      Version of the compiled key content. Files with another version must be compiled again.
+        FILE_EXTENSION      Extension of compiled key files.
+    """
+
+    FILE_SIGNATURE = b'PYSHEETGRADER-KEY\n'
+    FORMAT_VERSION = 3
+    FILE_EXTENSION = '.pskey'
+
+    @profiled('load_compiled_key')
+    def __init__(self, path):
+        """
+        Initializer for this class.
+        :param path: Valid path of the compiled key file.
+        :exception ValueError: Raises a ValueError if the file is not a compiled key of the current format version.
+        """
+        header = self.read_header(path)
+        if header is None or header['version'] != self.FORMAT_VERSION:
+            raise ValueError(f"The file is not a compiled key of version {self.FORMAT_VERSION}, please compile "
+                             f"the key again. Path: {path}")
+
+        with open(path, 'rb') as file:
+            file.readline()
+            file.readline()
+            content = json.load(file, object_hook=decode_value)
+
+        self.path = path
+        self.read_only = True
+        self.key_path = content['key_path']
+        self.key_hash = header['key_hash']
+        self.grading_sheet_values = content['grading_sheets']
+        self.rubric_values = content['rubric_values']
+
+        reader = PreloadedWorkbookReader({
+            name: (IndexedSheet(name, formulas), IndexedSheet(name, values))
+            for name, (formulas, values) in content['sheets'].items()
+        })
+        self.formula_wb = IndexedWorkbook(reader, data_only=False)
+        self.computed_value_wb = IndexedWorkbook(reader, data_only=True)
+
+    def get_grading_sheets(self) -> [Sheet]:
+        """
+        Returns ordered list of sheets to be graded, as stored in the compiled key.
+        :return: List of Sheet.
+        """
+        return [Sheet(name, minimum_work, feedback) for name, minimum_work, feedback in self.grading_sheet_values]
+
+    @classmethod
+    def read_header(cls, path):
+        """
+        Reads the header of the compiled key file in `path`.
+        :param path: String value of the file path.
+        :return: Dictionary of the header values (`version` and `key_hash`), or None if the file is not
+            a compiled key.
+        """
+        with open(path, 'rb') as file:
+            if file.readline() != cls.FILE_SIGNATURE:
+                return None
+            return json.loads(file.readline())
+
+    @classmethod
+    def is_compiled_key(cls, path):
+        """
+        Returns a Boolean value to identify whether the file in `path` is a compiled key file.
+        :param path: String value of the file path.
+        :return: Boolean value.
+        """
+        with open(path, 'rb') as file:
+            return file.read(len(cls.FILE_SIGNATURE)) == cls.FILE_SIGNATURE
+
+    @classmethod
+    def is_up_to_date(cls, path, key_path):
+        """
+        Returns a Boolean value to identify whether the compiled key file in `path` exists, has the current format
+        version, and was compiled from the current content of the key spreadsheet in `key_path`.
+        :param path: String value of the compiled key file path.
+        :param key_path: String value of the key spreadsheet path.
+        :return: Boolean value.
+        """
+        if not os.path.isfile(path) or not cls.is_compiled_key(path):
+            return False
+
+        header = cls.read_header(path)
+        return header['version'] == cls.FORMAT_VERSION and header['key_hash'] == hash_file(key_path)
+
+    @classmethod
+    def default_path(cls, key_path):
+        """
+        Returns the default path of the compiled key of the passed key spreadsheet: next to it, with the
+        compiled key extension.
+        :param key_path: String value of the key spreadsheet path.
+        :return: String value of the compiled key path.
+        """
+        return os.path.splitext(key_path)[0] + cls.FILE_EXTENSION
+
+
+def hash_file(path):
+    """
+    Returns the SHA-256 hex digest of the content of the file in `path`.
+    :param path: String value of the file path.
+    :return: String value of the hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compile_key(key_path, output_path, log_mode=False):
+    """
+    Compiles the key spreadsheet in `key_path` into a compiled key file in `output_path`, which can be loaded
+    with CompiledKey instead of the key spreadsheet.
+
+    :param key_path: String value of the key spreadsheet path.
+    :param output_path: String value of the compiled key file path.
+    :param log_mode: Boolean marker whether exceptions when parsing the rubrics should be printed with traceback.
+    :exception ValueError: Raises a ValueError if the key spreadsheet is not a valid key.
+    """
+    key_document = Document(key_path, read_only=True)
+    try:
+        if not key_document.is_valid_key():
+            raise ValueError(f"The document passed is not a valid key. Path: {key_path}")
+
+        grading_sheets = key_document.get_grading_sheets()
+        rubric_values = {sheet.name: GradingRubric.create_rubric_values_for_sheet(key_document, sheet, log_mode)
+                         for sheet in grading_sheets}
+
+        reader = key_document.formula_wb.reader
+        sheets = {}
+        for worksheet in reader.workbook.worksheets:
+            formula_sheet, value_sheet = reader.read_sheet(worksheet.title)
+            sheets[worksheet.title] = (formula_sheet.values, value_sheet.values)
+    finally:
+        key_document.close()
+
+    header = {
+        'version': CompiledKey.FORMAT_VERSION,
+        'key_hash': hash_file(key_path),
+    }
+    content = {
+        'key_path': os.path.abspath(key_path),
+        'grading_sheets': [(sheet.name, sheet.minimum_work, sheet.feedback) for sheet in grading_sheets],
+        'rubric_values': rubric_values,
+        'sheets': sheets,
+    }
+    with open(output_path, 'wb') as file:
+        file.write(CompiledKey.FILE_SIGNATURE)
+        file.write(json.dumps(header).encode() + b'\n')
+        file.write(json.dumps(content, default=encode_value, separators=(',', ':')).encode())
+
+
+def encode_value(value):
+    """
+    Encodes a value of the compiled key content that isn't a JSON type into a tagged JSON object, which
+    `decode_value()` turns back into the value. Used as the `default` of `json.dumps()`.
+    :param value: Rubric type, test case, date or time cell value, or openpyxl's array or data table formula.
+    :return: Dictionary with the `$type` of the value.
+    :exception TypeError: Raises a TypeError for any other type of value.
+    """
+    if isinstance(value, GradingRubricType):
+        return {'$type': 'rubric_type', 'name': value.name}
+    if isinstance(value, GradingTestCase):
+        return {'$type': 'test_case', 'name': value.name, 'expected_output': value.expected_output,
+                'inputs': dict(value.inputs), 'output_delta': value.output_delta, 'failmsg': value.failmsg}
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return {'$type': type(value).__name__, 'value': value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {'$type': 'timedelta', 'seconds': value.total_seconds()}
+    if isinstance(value, ArrayFormula):
+        return {'$type': 'array_formula', 'ref': value.ref, 'text': value.text}
+    if isinstance(value, DataTableFormula):
+        return {'$type': 'data_table_formula', 'attributes': vars(value)}
+
+    raise TypeError(f"Can't store a value of type {type(value).__name__} in a compiled key: {value!r}")
+
+
+def decode_value(obj):
+    """
+    Decodes a JSON object of the compiled key content, turning the tagged objects of `encode_value()` back into
+    their values. Used as the `object_hook` of `json.load()`.
+    :param obj: Dictionary of a JSON object.
+    :return: Decoded value, or `obj` itself if it's not tagged.
+    """
+    value_type = obj.get('$type')
+    if value_type is None:
+        return obj
+    if value_type == 'rubric_type':
+        return GradingRubricType[obj['name']]
+    if value_type == 'test_case':
+        return GradingTestCase(obj['name'], obj['expected_output'], obj['inputs'], obj['output_delta'],
+                               obj['failmsg'])
+    if value_type in ('datetime', 'date', 'time'):
+        return getattr(datetime, value_type).fromisoformat(obj['value'])
+    if value_type == 'timedelta':
+        return datetime.timedelta(seconds=obj['seconds'])
+    if value_type == 'array_formula':
+        return ArrayFormula(obj['ref'], obj['text'])
+    if value_type == 'data_table_formula':
+        return DataTableFormula(**obj['attributes'])
+
+    raise ValueError(f"Unknown value type in compiled key: {value_type}")
+
+
+def load_key_document(path, warn_outdated=True):
+    """
+    Loads the key document in `path`, which can be a key spreadsheet or a compiled key file. A compiled key is only
+    loaded when it's the passed path itself: compiled keys next to a key spreadsheet are never picked up. A warning
+    is printed if the compiled key's spreadsheet changed since it was compiled.
+
+    :param path: String value of the key spreadsheet or compiled key path.
+    :param warn_outdated: Boolean marker whether an outdated compiled key should be reported. Defaults to True.
+    :return: Document (or CompiledKey) instance.
+    """
+    if not CompiledKey.is_compiled_key(path):
+        return Document(path, read_only=True)
+
+    key_document = CompiledKey(path)
+    if warn_outdated and os.path.isfile(key_document.key_path) and hash_file(key_document.key_path) != key_document.key_hash:
+        print(f"Warning: the key spreadsheet changed since the compiled key was created, please compile it again. "
+              f"Key spreadsheet path: {key_document.key_path}", file=sys.stderr)
+    return key_document
@@ -1,47 +1,158 @@
-from sympy.utilities.lambdify import implemented_function
-from sympy import symbols, lambdify
+from collections import ChainMap
+from types import MappingProxyType
+import math
+import re
+import statistics
+
+from sympy import Function
+import numpy
 import sympy
 
 
+class ExcelFunction:
+    """
+    Excel function supported in formulas, under the lower-cased name used in the Sympy-friendly formula (see
+    `transform_excel_formula_to_sympy()`), with two implementations:
+
+        - `symbolic`, called when Sympy parses a formula, with Python or Sympy values.
+        - `numeric`, called by the numeric functions compiled with `lambdify`, with Python numbers only.
+
+    Both are called with the list of the cell values of a range as argument if the formula's ranges aren't expanded
+    (see `CompiledFormula`). The aggregate functions (e.g. SUM) take the values of such lists, skipping empty cells.
+    """
+    __slots__ = ('name', 'symbolic', 'numeric')
+
+    def __init__(self, name: str, symbolic, numeric):
+        """
+        Initializer of this class.
+        :param name: String value of the function name.
+        :param symbolic: Python function of the Sympy implementation.
+        :param numeric: Python function of the numeric implementation.
+        """
+        self.name = name
+        self.symbolic = symbolic
+        self.numeric = numeric
+
+
+# Names of the Excel functions that aren't valid Python names, and their names in the registry.
+EXCEL_FUNCTION_ALIASES = {
+    'if': 'excel_if',
+    'and': 'excel_and',
+    'or': 'excel_or',
+    'not': 'excel_not',
+    '_xlfn.stdev.s': 'stdev_s',
+}
+
+
 """
-Static dictionary of this file. Please use `get_excel_formula_lambdas()` method to retrieve this instead of
-    accessing it directly.
+Static registry of this file, built once. Please use `get_excel_functions()` and the other getters below to retrieve
+    it instead of accessing it directly.
 """
+___excel_functions = None
 ___excel_formula_lambdas = None
+___excel_formula_placeholders = None
+___excel_formula_numerics = {}
+
+
+def get_excel_functions():
+    """
+    Returns the read-only registry of supported Excel functions.
+    :return: Read-only dictionary of {function name: ExcelFunction instance}.
+    """
+    global ___excel_functions
+
+    # If it's already initialized, then early return.
+    if ___excel_functions is not None:
+        return ___excel_functions
+
+    # The name of each function should be the lower-cased Excel name, or its alias in EXCEL_FUNCTION_ALIASES.
+    excel_functions = [
+        ExcelFunction('sum', *create_aggregate(lambda values: sympy.Add(*values), sum)),
+        ExcelFunction('max', *create_aggregate(lambda values: sympy.Max(*values), max)),
+        ExcelFunction('min', *create_aggregate(lambda values: sympy.Min(*values), min)),
+        ExcelFunction('average', *create_aggregate(lambda values: sympy.Add(*values) / len(values),
+                                                   lambda values: sum(values) / len(values))),
+        ExcelFunction('stdev_s', *create_aggregate(stdev_s, statistics.stdev)),
+        ExcelFunction('sqrt', sympy.sqrt, math.sqrt),
+        ExcelFunction('exp', sympy.exp, math.exp),
+        ExcelFunction('ln', sympy.log, math.log),
+        ExcelFunction('round', excel_round, excel_round_numeric),
+        ExcelFunction('roundup', roundup, roundup_numeric),
+        ExcelFunction('excel_if', excel_if, excel_if),
+        ExcelFunction('excel_and', sympy.And, lambda *values: all(values)),
+        ExcelFunction('excel_or', sympy.Or, lambda *values: any(values)),
+        ExcelFunction('excel_not', sympy.Not, lambda value: not value),
+        ExcelFunction('len', excel_len, excel_len),
+        ExcelFunction('concatenate', concatenate, concatenate),
+        ExcelFunction('countif', countif, countif),
+    ]
+    ___excel_functions = MappingProxyType({function.name: function for function in excel_functions})
+
+    return ___excel_functions
 
 
 def get_excel_formula_lambdas():
     """
-    Returns dictionary of Excel formulas as key and the corresponding Sympy lambdas as the value.
-    :return: Dictionary instance.
+    Returns read-only dictionary of Excel formulas as key and the corresponding Sympy lambdas as the value.
+    Layer the inputs of a formula over it with `create_formula_scope()` instead of copying it.
+    :return: Read-only dictionary instance.
     """
     global ___excel_formula_lambdas
 
-    # If it's already initialized, then early return.
-    if ___excel_formula_lambdas:
-        return ___excel_formula_lambdas
-
-    # TODO: Implement more function here.
-    # Custom implementation
-    # The key and the first parameter of the `implemented_function` should be the same.
-    # We can also reuse Sympy's predefined function, especially for formula with variable args like sum.
-
-    # This is just a sample.
-
-    roundup_f = implemented_function('roundup', lambda number, digits: roundup(number, digits))
-    excel_if = implemented_function('execl_if', lambda cond, first, second: first if cond else second)
-    x, y, z = symbols("x y z")
-    ___excel_formula_lambdas = {
-        'sum': sympy.Add,
-        'max': sympy.Max,
-        'min': sympy.Min,
-        'excel_if': lambdify((x, y, z), excel_if(x, y, z)),
-        'roundup': lambdify((x, y), roundup_f(x, y)),
-    }
+    if ___excel_formula_lambdas is None:
+        ___excel_formula_lambdas = MappingProxyType({name: function.symbolic
+                                                     for name, function in get_excel_functions().items()})
 
     return ___excel_formula_lambdas
 
 
+def get_excel_formula_placeholders():
+    """
+    Returns read-only dictionary of Excel formulas as key and undefined Sympy functions of the same name as the
+    value. Formulas parsed with these keep their function calls, which `lambdify` then maps to the numeric
+    implementations of `get_excel_formula_numerics()`.
+    :return: Read-only dictionary instance.
+    """
+    global ___excel_formula_placeholders
+
+    if ___excel_formula_placeholders is None:
+        ___excel_formula_placeholders = MappingProxyType({name: Function(name) for name in get_excel_functions()})
+
+    return ___excel_formula_placeholders
+
+
+def get_excel_formula_numerics(modules: str = 'math'):
+    """
+    Returns read-only dictionary of Excel formulas as key and their numeric implementations as the value, to be
+    passed to `lambdify` with the passed modules.
+    :param modules: String value of the `lambdify` modules. With 'numpy', the implementations are vectorized to take
+        arrays of values, and return floats. Defaults to 'math'.
+    :return: Read-only dictionary instance.
+    """
+    if modules not in ___excel_formula_numerics:
+        numerics = {name: function.numeric for name, function in get_excel_functions().items()}
+        if modules == 'numpy':
+            numerics = {name: numpy.vectorize(numeric, otypes=[float]) for name, numeric in numerics.items()}
+        ___excel_formula_numerics[modules] = MappingProxyType(numerics)
+
+    return ___excel_formula_numerics[modules]
+
+
+def create_formula_scope(inputs: dict, functions=None):
+    """
+    Returns the names available to a formula: its inputs, layered over the functions. Neither is copied nor
+    modified, so the functions can be shared by concurrent evaluations.
+    :param inputs: Dictionary of {encoded input coordinate: cell value}.
+    :param functions: Dictionary of custom formulas and their Sympy lambdas. Defaults to None, which uses
+        `get_excel_formula_lambdas()`.
+    :return: ChainMap instance.
+    """
+    if functions is None:
+        functions = get_excel_formula_lambdas()
+
+    return ChainMap(inputs, functions)
+
+
 # Custom formula definition
 
 def roundup(number, decimals=0):
@@ -55,3 +166,122 @@ def roundup(number, decimals=0):
     except Exception:
         # Just in case the result cannot be converted to float, e.g. due to Formula comparison
         return result
+
+
+def roundup_numeric(number, decimals=0):
+    multiplier = 10 ** decimals
+    return math.ceil(number * multiplier) / multiplier
+
+
+def excel_round(number, decimals=0):
+    # Excel rounds halves away from zero, unlike Python's `round`.
+    multiplier = 10 ** decimals
+    result = sympy.sign(number) * sympy.floor(abs(number) * multiplier + sympy.Rational(1, 2)) / multiplier
+
+    try:
+        return sympy.Float(result)
+    except Exception:
+        return result
+
+
+def excel_round_numeric(number, decimals=0):
+    multiplier = 10 ** decimals
+    return math.copysign(math.floor(abs(number) * multiplier + 0.5), number) / multiplier
+
+
+def excel_if(cond, first, second):
+    return first if cond else second
+
+
+def flatten_ranges(values) -> list:
+    """
+    Returns the passed function arguments with the lists of range values replaced by the non-empty values in them.
+    :param values: Tuple of function arguments.
+    :return: List of values.
+    """
+    flattened = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            flattened.extend(item for item in value if item is not None)
+        else:
+            flattened.append(value)
+
+    return flattened
+
+
+def create_aggregate(symbolic, numeric):
+    """
+    Returns the implementations of an aggregate function (e.g. SUM), which take any number of values and ranges.
+    The Sympy implementation uses the numeric one when every value is a Python number, so the values of long ranges
+    aren't added up as Sympy numbers.
+    :param symbolic: Python function taking the list of values, returning a Sympy expression.
+    :param numeric: Python function taking the list of numbers, returning a Python number.
+    :return: Tuple of (Sympy implementation, numeric implementation).
+    """
+    def aggregate_symbolic(*values):
+        values = flatten_ranges(values)
+        if all(type(value) in (int, float) for value in values):
+            return numeric(values)
+        return symbolic(values)
+
+    def aggregate_numeric(*values):
+        return numeric(flatten_ranges(values))
+
+    return aggregate_symbolic, aggregate_numeric
+
+
+def stdev_s(values):
+    mean = sympy.Add(*values) / len(values)
+    return sympy.sqrt(sympy.Add(*[(value - mean) ** 2 for value in values]) / (len(values) - 1))
+
+
+def concatenate(*values):
+    return ''.join(str(value) for value in values)
+
+
+def excel_len(value):
+    # The length of a symbol, e.g. of a cell without value, is unknown, so the call is kept unevaluated.
+    if isinstance(value, sympy.Basic):
+        if not value.is_Number:
+            return Function('len')(value)
+        value = int(value) if value.is_Integer else float(value)
+
+    # Excel shows whole numbers without decimals.
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return len(str(value))
+
+
+# Matches the comparison operator and the value of a COUNTIF criteria, e.g. ">=5".
+COUNTIF_CRITERIA_PATTERN = re.compile(r'^(<=|>=|<>|<|>|=)?(.*)$')
+
+
+def countif(*arguments):
+    # The range may be expanded into separate arguments by the formula parser, so the criteria is the last one.
+    values, criteria = flatten_ranges(arguments[:-1]), arguments[-1]
+    operator, expected = '=', criteria
+    if isinstance(criteria, str):
+        operator, expected = COUNTIF_CRITERIA_PATTERN.match(criteria).groups()
+        operator = operator or '='
+        try:
+            expected = float(expected)
+        except ValueError:
+            pass
+
+    comparisons = {
+        '=': lambda value: value == expected,
+        '<>': lambda value: value != expected,
+        '<': lambda value: value < expected,
+        '<=': lambda value: value <= expected,
+        '>': lambda value: value > expected,
+        '>=': lambda value: value >= expected,
+    }
+    count = 0
+    for value in values:
+        try:
+            count += bool(comparisons[operator](value))
+        except TypeError:
+            # Values that can't be compared with the criteria, e.g. text with a number, aren't counted.
+            pass
+
+    return count
@@ -1,5 +1,7 @@
 from pysheetgrader.sheet import Sheet
 from pysheetgrader.utils import get_headers
+from pysheetgrader.workbook import IndexedWorkbook, WorkbookReader
+from pysheetgrader.profiler import profile_phase
 
 from openpyxl import load_workbook
 
@@ -12,6 +14,8 @@ class Document:
                                     of grading other sheets.
         COLUMN_HEADER_NAMES         Holds the variables (headers) to be extracted from the order sheet 
                                     and possible names (for backwards compatibility) of those variables
+        rubric_values               Dictionary of {sheet name: list of rubric values} already parsed from the key,
+                                    used instead of the rubric notes when it's not None. Only set by compiled keys.
     """
 
     # How to add a new header:
@@ -25,22 +29,37 @@ class Document:
         "feedback": ["feedback"]
     }
 
-    def __init__(self, path, read_only=True):
+    def __init__(self, path, read_only=True, targets=None, recalculate=False):
         """
         Initializer for this class.
         :param path: Valid path of the document. This path will be opened into two workbooks: `formula_wb` and
             `computed_value_wb`.
         :param read_only: Boolean marker whether the document should be treated as read-only. This will affect
             the `formula_wb` and `computed_value_wb` property of this instance - whether they're read-only or not.
-            Please set this to `False` when creating key documents, so the rubric notes can be accessed.
+            Read-only documents are read through a single WorkbookReader, which parses each sheet once for both
+            workbooks and indexes its cells, so they can be looked up without re-reading the sheet every time.
+            Their rubric notes are read directly from the comments parts of the xlsx file.
             Defaults to `True`.
+        :param targets: Dictionary of {sheet name: set of cell coordinates} of the cells expected to be looked up,
+            so read-only documents only load these cells of these sheets. Looking up any other cell of such a sheet
+            loads the whole sheet. Ignored if `read_only` is False. Defaults to None, which loads every cell.
+        :param recalculate: Boolean marker whether the values of formula cells that weren't cached by the
+            spreadsheet application should be computed, see `WorkbookReader.recalculate_sheet()`. Ignored if
+            `read_only` is False. Defaults to False.
         """
 
         self.path = path
         self.read_only = read_only
-
-        self.formula_wb = load_workbook(path, read_only=read_only, data_only=False)
-        self.computed_value_wb = load_workbook(path, read_only=read_only, data_only=True)
+        self.rubric_values = None
+
+        with profile_phase('load_workbook', {'path': path}):
+            if read_only:
+                reader = WorkbookReader(path, targets, recalculate)
+                self.formula_wb = IndexedWorkbook(reader, data_only=False)
+                self.computed_value_wb = IndexedWorkbook(reader, data_only=True)
+            else:
+                self.formula_wb = load_workbook(path, read_only=read_only, data_only=False)
+                self.computed_value_wb = load_workbook(path, read_only=read_only, data_only=True)
 
     def is_valid_key(self):
         """
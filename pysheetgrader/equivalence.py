@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+from enum import Enum
+import math
+import random
+import signal
+import threading
+
+from sympy import Expr, cancel, count_ops, expand, lambdify, simplify
+
+from pysheetgrader.profiler import profile_phase, profiled
+
+
+class EquivalenceTier(Enum):
+    """
+    Tier of `check_equivalence()` that decided whether two formulas are equivalent, from the cheapest to the most
+    expensive one.
+    """
+    STRUCTURAL = 'structural'
+    PROBE = 'probe'
+    ALGEBRAIC = 'algebraic'
+    SIMPLIFY = 'simplify'
+    BUDGET = 'budget'
+
+
+class EquivalenceBudget:
+    """
+    Limits of the expensive tiers of `check_equivalence()`.
+    """
+
+    def __init__(self, max_operations: int = 500, timeout: float = 10.0):
+        """
+        Initializer of this class.
+        :param max_operations: Integer maximum number of operations (Sympy's `count_ops`) of both formulas together,
+            above which they're not expanded or simplified. None disables the limit. Defaults to 500.
+        :param timeout: Float maximum number of seconds spent expanding and simplifying a formula. None disables the
+            limit.
+            Only enforced in the main thread of platforms with SIGALRM. Defaults to 10 seconds.
+        """
+        self.max_operations = max_operations
+        self.timeout = timeout
+
+
+class EquivalenceResult:
+    """
+    Result of `check_equivalence()`: whether the formulas are equivalent, and the tier that decided it.
+    """
+    __slots__ = ('is_equivalent', 'tier')
+
+    def __init__(self, is_equivalent: bool, tier: EquivalenceTier):
+        self.is_equivalent = is_equivalent
+        self.tier = tier
+
+    def __bool__(self):
+        return self.is_equivalent
+
+
+class EquivalenceTimeout(Exception):
+    """
+    Raised by `time_limit()` when its time is up.
+    """
+
+
+# Number of random points tried by the probe tier, and the range of their coordinates.
+PROBE_POINTS = 8
+PROBE_RANGE = (0.5, 3.0)
+
+# Minimum number of points that must be evaluated for the probe tier to be conclusive.
+MIN_PROBED_POINTS = 3
+
+
+@profiled('equivalence')
+def check_equivalence(key_expr, sub_expr, budget: EquivalenceBudget = None) -> EquivalenceResult:
+    """
+    Checks whether the passed Sympy expressions are equivalent, like `simplify(key_expr - sub_expr) == 0`, but trying
+    cheaper tiers first:
+
+        1. Structural: the expressions are equal once Sympy put them in canonical form.
+        2. Probe: both expressions are evaluated on random points. A point where they differ proves they're not
+            equivalent.
+        3. Algebraic: the difference of the expressions is zero once expanded or cancelled, within the `budget`.
+        4. Simplify: the difference of the expressions is zero once simplified, within the `budget`.
+
+    Expressions that aren't numeric (e.g. relations) go straight to the simplify tier. If the expressions are over
+    the `budget`, they're not equivalent, with the BUDGET tier: matching on random points doesn't prove that they're
+    equivalent.
+
+    :param key_expr: Sympy expression of the key formula.
+    :param sub_expr: Sympy expression of the submission formula.
+    :param budget: EquivalenceBudget instance. Defaults to None, which uses the default EquivalenceBudget.
+    :return: EquivalenceResult instance.
+    """
+    if budget is None:
+        budget = EquivalenceBudget()
+
+    if key_expr == sub_expr:
+        return EquivalenceResult(True, EquivalenceTier.STRUCTURAL)
+
+    if isinstance(key_expr, Expr) and isinstance(sub_expr, Expr):
+        if probe_equivalence(key_expr, sub_expr) is False:
+            return EquivalenceResult(False, EquivalenceTier.PROBE)
+        if not is_within_operations(budget, key_expr, sub_expr):
+            return EquivalenceResult(False, EquivalenceTier.BUDGET)
+
+    try:
+        with time_limit(budget.timeout):
+            if isinstance(key_expr, Expr) and isinstance(sub_expr, Expr):
+                difference = key_expr - sub_expr
+                if expand(difference) == 0 or cancel(difference) == 0:
+                    return EquivalenceResult(True, EquivalenceTier.ALGEBRAIC)
+
+            with profile_phase('simplify'):
+                return EquivalenceResult(simplify(key_expr - sub_expr) == 0, EquivalenceTier.SIMPLIFY)
+    except EquivalenceTimeout:
+        return EquivalenceResult(False, EquivalenceTier.BUDGET)
+
+
+def probe_equivalence(key_expr: Expr, sub_expr: Expr):
+    """
+    Evaluates both expressions on the same random points, seeded so the result is reproducible.
+    :param key_expr: Sympy expression.
+    :param sub_expr: Sympy expression.
+    :return: False if they differ on a point, True if they match on at least MIN_PROBED_POINTS points, or None if
+        they couldn't be evaluated on enough points.
+    """
+    symbols = sorted(key_expr.free_symbols | sub_expr.free_symbols, key=str)
+    try:
+        key_function = lambdify(symbols, key_expr, modules='math')
+        sub_function = lambdify(symbols, sub_expr, modules='math')
+    except Exception:
+        return None
+
+    generator = random.Random(0)
+    probed_points = 0
+    for _ in range(PROBE_POINTS):
+        point = [generator.uniform(*PROBE_RANGE) for _ in symbols]
+        try:
+            key_value = float(key_function(*point))
+            sub_value = float(sub_function(*point))
+        except Exception:
+            continue
+        if not (math.isfinite(key_value) and math.isfinite(sub_value)):
+            continue
+
+        if not math.isclose(key_value, sub_value, rel_tol=1e-9, abs_tol=1e-9):
+            return False
+        probed_points += 1
+
+    return True if probed_points >= MIN_PROBED_POINTS else None
+
+
+def is_within_operations(budget: EquivalenceBudget, key_expr, sub_expr) -> bool:
+    """
+    Returns a Boolean value to identify whether the passed expressions are small enough to be expanded or simplified.
+    :param budget: EquivalenceBudget instance.
+    :param key_expr: Sympy expression.
+    :param sub_expr: Sympy expression.
+    :return: Boolean value.
+    """
+    if budget.max_operations is None:
+        return True
+
+    return count_ops(key_expr) + count_ops(sub_expr) <= budget.max_operations
+
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Context manager that raises EquivalenceTimeout if its block runs for more than the passed number of seconds.
+    The limit is ignored if `seconds` is None, outside of the main thread, or on platforms without SIGALRM.
+    :param seconds: Float number of seconds, or None.
+    """
+    if seconds is None or not hasattr(signal, 'SIGALRM') \
+            or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def raise_timeout(signum, frame):
+        raise EquivalenceTimeout()
+
+    previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
@@ -1,9 +1,18 @@
 from openpyxl.formula import Tokenizer
 from openpyxl.formula.tokenizer import Token
-from openpyxl.worksheet.datavalidation import expand_cell_ranges
+from openpyxl.utils.cell import get_column_letter, range_boundaries, rows_from_range
+from itertools import chain
 from sympy.simplify.simplify import simplify
-from sympy.parsing.sympy_parser import parse_expr
+from sympy.parsing.sympy_parser import stringify_expr, eval_expr, standard_transformations
+from sympy import Max, Min, Symbol, lambdify
+from pysheetgrader.custom_excel_formula import EXCEL_FUNCTION_ALIASES, create_formula_scope, \
+    get_excel_formula_numerics, get_excel_formula_placeholders
+from pysheetgrader.profiler import profile_phase, profiled
+from pysheetgrader.utils import LRUCache
+import builtins
+import math
 import re
+import types
 import formulas
 
 # there are likely many more supported
@@ -35,12 +44,282 @@ SUPPORTED_FUNCTIONS = [
     'AND',
 ]
 
+# Matches a cell range encoded by `encode_range_reference()`.
+RANGE_REFERENCE_PATTERN = re.compile(r"^[a-z]+_\d+__[a-z]+_\d+$")
+
+# Maximum number of distinct formulas kept by `compile_formula()`.
+FORMULA_CACHE_SIZE = 4096
+
+# Cache of {(formula, expand_ranges): CompiledFormula}, so each distinct formula is tokenized once per process.
+FORMULA_CACHE = LRUCache(FORMULA_CACHE_SIZE)
+
+# Cache of {formula: (compiled function, name of its first unsupported function or None)} of `parse_from_excel()`,
+# so each distinct formula is compiled by `formulas` once per process.
+EXCEL_FORMULA_CACHE = LRUCache(FORMULA_CACHE_SIZE)
+
+
+# Matches the calls of the functions of EXCEL_FUNCTION_ALIASES, e.g. "if(" but not "countif(".
+EXCEL_FUNCTION_ALIAS_PATTERN = re.compile(r'(?<![\w.])(' + '|'.join(map(re.escape, EXCEL_FUNCTION_ALIASES)) + r')\(')
+
+
+def create_sympy_global_dict():
+    """
+    Returns the global namespace Sympy's `parse_expr` uses by default: everything from `sympy`, Python's built-in
+    functions, and Sympy's Max and Min as `max` and `min`.
+    :return: Dictionary instance.
+    """
+    global_dict = {}
+    exec('from sympy import *', global_dict)
+    for name, obj in vars(builtins).items():
+        if isinstance(obj, types.BuiltinFunctionType):
+            global_dict[name] = obj
+    global_dict['max'] = Max
+    global_dict['min'] = Min
+    return global_dict
+
+
+# Built once, instead of on every `parse_expr` call.
+SYMPY_GLOBAL_DICT = create_sympy_global_dict()
+
+
+class CompiledFormula:
+    """
+    Formula already tokenized by `parse_formula_tokens`, with its input coordinates and the Sympy expression string
+    they form. The Python code Sympy generates from the expression only depends on which names are defined in the
+    `local_dict`, so it's generated once for every set of names and evaluated again with the new values.
+    """
+
+    __slots__ = ('formula', 'tokens', 'inputs', 'arguments', 'ranges', 'expression', 'codes', 'numeric_functions')
+
+    def __init__(self, formula: str, expand_ranges: bool = True):
+        """
+        Initializer of this class.
+        :param formula: String value of the formula. Should start with '=', otherwise it will throw an exception.
+        :param expand_ranges: Boolean marker whether cell ranges are expanded into their cells, as needed to compare
+            formulas. Otherwise each range is a single input (see `encode_range_reference`), whose value is the list
+            of the values of its cells. Defaults to True.
+        """
+        self.formula = formula
+        self.tokens = tokenize_formula(formula, expand_ranges)
+        self.inputs = [split for token in self.tokens if re.search(r"[a-z]+_\d+", token)
+                       for split in token.split(",")]
+        # Inputs without duplicates, used as the arguments of the numeric functions.
+        self.arguments = list(dict.fromkeys(self.inputs))
+        # Inputs that are ranges, if they're not expanded.
+        self.ranges = {name for name in self.arguments if RANGE_REFERENCE_PATTERN.match(name)}
+        expression = "".join(self.tokens).lower()
+        self.expression = expression.replace('<==', '<=').replace('>==', '>=')
+        self.codes = {}
+        self.numeric_functions = {}
+
+    def evaluate(self, local_dict: dict = None):
+        """
+        Returns the Sympy-parsed form of this formula, the same as Sympy's `parse_expr` would.
+        :param local_dict: Dictionary for replacing variables with values or custom formulas with Sympy lambdas.
+        :return: Sympy expression.
+        """
+        if local_dict is None:
+            local_dict = {}
+
+        names = frozenset(local_dict)
+        code = self.codes.get(names)
+        if code is None:
+            code = stringify_expr(self.expression, local_dict, SYMPY_GLOBAL_DICT, standard_transformations)
+            self.codes[names] = code
+
+        return eval_expr(code, local_dict, SYMPY_GLOBAL_DICT)
+
+    def get_numeric_function(self, modules: str = 'math'):
+        """
+        Returns this formula compiled with Sympy's `lambdify` into a Python function that takes the numeric values
+        of `arguments` (the distinct inputs), in order, as positional arguments. The Excel functions of the formula
+        are called with their numeric implementations (see `get_excel_formula_numerics`). The function is compiled
+        once for every `modules`.
+
+        Formulas comparing values with `==` can't be compiled, since Sympy compares symbols structurally when
+        parsing. Neither can formulas with names that are neither inputs nor functions.
+
+        :param modules: String value of the `lambdify` modules. Use 'numpy' for a function that takes arrays of
+            values. Defaults to 'math'.
+        :return: Python function, or None if the formula can't be compiled.
+        """
+        if modules in self.numeric_functions:
+            return self.numeric_functions[modules]
+
+        numeric_function = None
+        if '==' not in self.expression and '<>' not in self.expression:
+            symbols = [Symbol(name) for name in self.arguments]
+            local_dict = create_formula_scope(dict(zip(self.arguments, symbols)), get_excel_formula_placeholders())
+            try:
+                expression = self.evaluate(local_dict)
+                if not getattr(expression, 'free_symbols', set()) - set(symbols):
+                    numeric_function = lambdify(symbols, expression,
+                                                modules=[dict(get_excel_formula_numerics(modules)), modules])
+            except Exception:
+                numeric_function = None
+
+        self.numeric_functions[modules] = numeric_function
+        return numeric_function
+
+    def discard_numeric_function(self, modules: str = 'math'):
+        """
+        Discards the numeric function of `get_numeric_function()`, e.g. because its result didn't match Sympy's.
+        Later calls of `get_numeric_function()` with the same arguments return None.
+        :param modules: String value of the `lambdify` modules. Defaults to 'math'.
+        """
+        self.numeric_functions[modules] = None
+
+
+class NumericValue(float):
+    """
+    Float result of a numeric function (see `evaluate_formula`). It behaves like a float, but also keeps what's
+    needed to evaluate its formula with Sympy, since the numeric function computes with floats and its result can be
+    rounded differently than Sympy's exact one.
+    Pickled as a plain float.
+    """
+    __slots__ = ('compiled', 'local_dict', 'exact_value')
+
+    def __new__(cls, value, compiled: CompiledFormula, local_dict: dict, exact_value=None):
+        instance = super().__new__(cls, value)
+        instance.compiled = compiled
+        instance.local_dict = local_dict
+        instance.exact_value = exact_value
+        return instance
+
+    def exact(self):
+        """
+        Returns the Sympy evaluation of the formula, evaluated on the first call.
+        :return: Sympy expression.
+        """
+        if self.exact_value is None:
+            self.exact_value = self.compiled.evaluate(self.local_dict)
+        return self.exact_value
+
+    def __reduce__(self):
+        return float, (float(self),)
+
+
+def get_exact_value(value):
+    """
+    Returns the Sympy evaluation of the passed value if it's a NumericValue, or the value itself otherwise.
+    :param value: Any value.
+    :return: Any value.
+    """
+    return value.exact() if isinstance(value, NumericValue) else value
+
+
+@profiled('evaluate')
+def evaluate_formula(formula: str, inputs: dict, expand_ranges: bool = True):
+    """
+    Evaluates the passed formula with the values of its input cells.
+
+    If every input is a number, the formula is evaluated with its numeric function (see
+    `CompiledFormula.get_numeric_function`). The first result of a numeric function is checked against the Sympy
+    evaluation, and the function is discarded if they differ. Otherwise, or if the numeric evaluation fails (e.g.
+    on a division by zero), the formula is parsed with Sympy and the functions of `get_excel_formula_lambdas`, like
+    `parse_formula`.
+    Float results of numeric functions are returned as NumericValue instances, whose `exact()` method returns the
+    Sympy evaluation, e.g. to compare them on a grading boundary (see `BaseStrategy.value_matches`).
+
+    :param formula: String value of the formula. Should start with '=', otherwise it will throw an exception.
+    :param inputs: Dictionary of {encoded input coordinate: cell value}. If `expand_ranges` is False, the inputs
+        also include the encoded ranges, with the lists of their cell values as values.
+    :param expand_ranges: Boolean marker whether cell ranges are expanded into their cells (see `CompiledFormula`).
+        Ranges that aren't expanded can only be passed to functions taking ranges, e.g. SUM. Defaults to True.
+    :return: Python number, NumericValue or Boolean value if evaluated numerically, Sympy expression otherwise.
+    """
+    if not formula or not isinstance(formula, str):
+        raise ValueError(f"Expected formula, got {formula}")
+
+    compiled = compile_formula(formula, expand_ranges)
+    local_dict = create_formula_scope(inputs)
+
+    if all(is_number(value) or is_number_range(value) for value in inputs.values()):
+        is_checked = 'math' in compiled.numeric_functions
+        numeric_function = compiled.get_numeric_function()
+        if numeric_function is not None:
+            try:
+                result = numeric_function(*[inputs[name] for name in compiled.arguments])
+            except Exception:
+                result = None
+
+            if result is not None:
+                if is_checked:
+                    return NumericValue(result, compiled, local_dict) if type(result) is float else result
+
+                expected = compiled.evaluate(local_dict)
+                if is_same_number(result, expected):
+                    return NumericValue(result, compiled, local_dict, expected) if type(result) is float else result
+                compiled.discard_numeric_function()
+                return expected
+
+    return compiled.evaluate(local_dict)
+
+
+def is_number(value) -> bool:
+    """
+    Returns a Boolean value to identify whether the passed value is an int or float, excluding Booleans.
+    :param value: Any value.
+    :return: Boolean value.
+    """
+    return type(value) in (int, float)
+
+
+def is_number_range(value) -> bool:
+    """
+    Returns a Boolean value to identify whether the passed value is the list of values of a range whose cells are
+    numbers or empty.
+    :param value: Any value.
+    :return: Boolean value.
+    """
+    return isinstance(value, (list, tuple)) and all(item is None or is_number(item) for item in value)
+
+
+def is_same_number(value, expected) -> bool:
+    """
+    Returns a Boolean value to identify whether the numeric `value` is the same as the `expected` Sympy number or
+    Boolean, apart from floating point rounding.
+    :param value: Python number or Boolean value.
+    :param expected: Sympy expression.
+    :return: Boolean value.
+    """
+    value_is_bool = isinstance(value, bool)
+    expected_is_bool = expected in (True, False)
+    if value_is_bool or expected_is_bool:
+        return value_is_bool and expected_is_bool and value == bool(expected)
+
+    try:
+        return math.isclose(float(value), float(expected), rel_tol=1e-12, abs_tol=1e-12)
+    except (TypeError, ValueError):
+        return False
+
+
+def compile_formula(formula: str, expand_ranges: bool = True) -> CompiledFormula:
+    """
+    Returns the CompiledFormula of the passed formula, from FORMULA_CACHE if it was already compiled.
+    :param formula: String value of the formula. Should start with '=', otherwise it will throw an exception.
+    :param expand_ranges: Boolean marker whether cell ranges are expanded into their cells (see `CompiledFormula`).
+        Defaults to True.
+    :return: CompiledFormula instance.
+    """
+    key = (formula, expand_ranges)
+    compiled = FORMULA_CACHE.get(key)
+    if compiled is None:
+        with profile_phase('compile_formula'):
+            compiled = CompiledFormula(formula, expand_ranges)
+        FORMULA_CACHE.put(key, compiled)
+
+    return compiled
+
+
 def transform_excel_formula_to_sympy(formula: str) -> str:
     """
     Transform the string value of an excel formula and turns it into Sympy friendly format.
 
     Steps include:
         1. to lowercase
+        2. rename the functions of EXCEL_FUNCTION_ALIASES, e.g. if to excel_if
+        3. replace the comparison = with ==
 
     :param formula: the string value of an excel formula.
     :return: the string value of a Sympy friendly formula.
@@ -50,8 +329,9 @@ def transform_excel_formula_to_sympy(formula: str) -> str:
     # Lowercase the inputs and the custom functions, because Sympy supports simple functions out-of-the box
     #   e.g. sqrt, sin
     lowercased_formula = formula.lower()
-    # execl_if should be specified since it conflicts with python's if
-    lowercased_formula = lowercased_formula.replace("if(", "excel_if(")
+    # excel_if should be specified since it conflicts with python's if, and so on for the other aliases.
+    lowercased_formula = EXCEL_FUNCTION_ALIAS_PATTERN.sub(lambda match: EXCEL_FUNCTION_ALIASES[match.group(1)] + '(',
+                                                          lowercased_formula)
 
     # replace all = except the first one, with == (condition)
     lowercased_formula = re.sub(r"(?<!=)=(?!=)", '==', lowercased_formula)
@@ -59,19 +339,38 @@ def transform_excel_formula_to_sympy(formula: str) -> str:
 
     return lowercased_formula
 
+def compile_excel_formula(formula: str):
+    """
+    Returns the function compiled by `formulas` for the passed formula, from EXCEL_FORMULA_CACHE if it was already
+    compiled.
+    :param formula: String value of the Excel formula. Should start with '='.
+    :return: Function taking the formula inputs as keyword arguments.
+    :raises ValueError: If the formula uses a function that isn't in SUPPORTED_FUNCTIONS.
+    """
+    compiled = EXCEL_FORMULA_CACHE.get(formula)
+    if compiled is None:
+        func_ast = formulas.Parser().ast(formula)
+        unsupported_name = next((func_entry.name for func_entry in func_ast[0]
+                                 if func_entry.__class__ == formulas.tokens.function.Function
+                                 and func_entry.name not in SUPPORTED_FUNCTIONS), None)
+        compiled = (func_ast[1].compile(), unsupported_name)
+        EXCEL_FORMULA_CACHE.put(formula, compiled)
+
+    func, unsupported_name = compiled
+    if unsupported_name is not None:
+        print(f'Excel formula error: {unsupported_name} not supported')
+        raise ValueError(f'Excel formula error: {unsupported_name} not supported')
+
+    return func
+
+
+@profiled('evaluate_excel')
 def parse_from_excel(formula: str, **kwargs):
     '''
     based on what you name the kwargs, replace in given str with whatever value you feed
     return parsed expression via library
     '''
-    func_ast = formulas.Parser().ast(formula)
-    func = func_ast[1].compile()
-
-    for func_entry in func_ast[0]:
-        if func_entry.__class__ == formulas.tokens.function.Function and func_entry.name not in SUPPORTED_FUNCTIONS:
-            print(f'Excel formula error: {func_entry.name} not supported')
-            raise ValueError(f'Excel formula error: {func_entry.name} not supported')
-        
+    func = compile_excel_formula(formula)
     r = func(**kwargs)
 
     try:
@@ -91,6 +390,18 @@ def parse_formula_tokens(formula: str) -> [str]:
     :param formula: String value of the formula. Should start with '=', otherwise it will throw an exception.
     :return: A list of string values of tokens.
     """
+    return list(compile_formula(formula).tokens)
+
+
+def tokenize_formula(formula: str, expand_ranges: bool = True) -> [str]:
+    """
+    Tokenizes the formula for `parse_formula_tokens`, without using FORMULA_CACHE.
+    :param formula: String value of the formula. Should start with '=', otherwise it will throw an exception.
+    :param expand_ranges: Boolean marker whether cell ranges are expanded into their encoded cells, joined by commas.
+        Otherwise a single range (e.g. "B2:B500", but not "B2:B5 C2") is replaced by a single encoded range, see
+        `encode_range_reference`. Defaults to True.
+    :return: A list of string values of tokens.
+    """
     string_tokens = []
     formula_tokenizer = Tokenizer(formula)
 
@@ -98,8 +409,17 @@ def parse_formula_tokens(formula: str) -> [str]:
         # Uncomment this part for debugging.
         # print(f"Token value: {token.value}, token type: {token.type}, token subtype: {token.subtype}")
 
-        if token.subtype == Token.RANGE:  # TODO: This will still fail on sheet reference ranges.
-            expanded_range = expand_cell_ranges(token.value)
+        if token.subtype == Token.RANGE and token.value.lower() in ('true', 'false'):
+            # Lower-cased logical values (e.g. from `transform_excel_formula_to_sympy`) aren't recognized as such.
+            string_tokens.append(token.value)
+
+        elif token.subtype == Token.RANGE and not expand_ranges and ':' in token.value and ' ' not in token.value:
+            string_tokens.append(encode_range_reference(token.value))
+
+        elif token.subtype == Token.RANGE:  # TODO: This will still fail on sheet reference ranges.
+            # In row-major order, unlike openpyxl's `expand_cell_ranges`, whose order changes between processes.
+            expanded_range = dict.fromkeys(chain.from_iterable(
+                chain.from_iterable(rows_from_range(r)) for r in token.value.split()))
             encoded_range = [encode_cell_reference(r) for r in expanded_range]
             string_range = ",".join(encoded_range)
             string_tokens.append(string_range)
@@ -125,22 +445,11 @@ def parse_formula_inputs(formula: str, encoded: bool = True) -> [str]:
     :param formula: String value of the formula. Should start with '=', otherwise it will throw an exception.
     :return: A list of strings of input coordinates.
     """
-    tokens = parse_formula_tokens(formula)
-    inputs = []
-    for token in tokens:
-        result = re.search(r"[a-z]+_\d+", token)
-        if result is not None:
-            # check if the token is something from the range operator: e.g. b_14,c_14,d_14
-            if "," in token:
-                splits = token.split(",")
-                for split in splits:
-                    inputs.append(split if encoded else decode_cell_reference(split))
-            else:
-                inputs.append(token if encoded else decode_cell_reference(token))
-
-    return inputs
+    inputs = compile_formula(formula).inputs
+    return list(inputs) if encoded else [decode_cell_reference(i) for i in inputs]
 
 
+@profiled('parse')
 def parse_formula(formula: str, local_dict: dict = None):
     """
     Returns the Sympy-parsed form for of the passed Excel formula. If is preferred to have the lowercased version of
@@ -159,12 +468,7 @@ def parse_formula(formula: str, local_dict: dict = None):
     if not formula or not isinstance(formula, str):
         raise ValueError(f"Expected formula, got {formula}")
 
-    string_tokens = parse_formula_tokens(formula)
-    # Lowercase the form, to allow Sympy use built-in functions.
-    expanded_form = "".join(string_tokens).lower()
-    expanded_form = expanded_form.replace('<==', '<=').replace('>==', '>=')
-    
-    return parse_expr(expanded_form, local_dict=local_dict)
+    return compile_formula(formula).evaluate(local_dict)
 
 
 def encode_cell_reference(reference: str):
@@ -185,6 +489,22 @@ def encode_cell_reference(reference: str):
     return f"{column}_{row}".lower()
 
 
+def encode_range_reference(reference: str):
+    """
+    Encodes the string of a cell range, e.g. "B2:$b$500", into a single name, e.g. "b_2__b_500", like
+    `encode_cell_reference`.
+    """
+    min_col, min_row, max_col, max_row = range_boundaries(reference)
+    return f"{get_column_letter(min_col)}_{min_row}__{get_column_letter(max_col)}_{max_row}".lower()
+
+
+def decode_range_reference(encoded_reference: str):
+    """
+    Decodes the cell range from encode_range_reference method, e.g. "B2:B500".
+    """
+    return ":".join(decode_cell_reference(bound) for bound in encoded_reference.split("__"))
+
+
 def decode_cell_reference(encoded_reference: str):
     """
     Decodes the cell reference from encode_cell_reference method so it can be used in normal spreadsheet operations.
@@ -0,0 +1,117 @@
+import csv
+
+
+class Gradebook:
+    """
+    Combined score sheet of a batch of graded submissions, saved as a CSV file with one row per submission.
+    Besides the assignment score, each row has the score of every sheet, and the score, correctness and error of
+    every rubric of the key, in columns named after the rubric's sheet and cell ID, e.g. `Q1!B5 Score`. The rows can
+    also be saved as an Arrow IPC stream, which requires the optional `pyarrow` package.
+    Rows are flushed as soon as they're appended, so a batch that stops midway keeps the rows written so far.
+    Please call the `close()` method when the batch is done.
+    """
+
+    HEADER = ["Submission", "Score", "Max Score"]
+
+    # Suffixes and Arrow types of the columns of each rubric, in order.
+    RUBRIC_COLUMNS = (("Score", 'float64'), ("Correct", 'bool_'), ("Error", 'string'))
+
+    def __init__(self, output_path, rubrics=None, arrow_output_path=None):
+        """
+        Initializer of this class. Creates (or overwrites) the file at `output_path` and writes the header row.
+        :param output_path: String value of the output file path.
+        :param rubrics: Dictionary of {sheet name: list of GradingRubric instances} of the key, in sheet order,
+            e.g. the `rubrics` of a Grader. Defaults to None, which only keeps the assignment score columns.
+        :param arrow_output_path: String value of the path of the Arrow IPC stream file that also receives the rows.
+            Defaults to None, which saves the CSV file only.
+        """
+        self.output_path = output_path
+        self.arrow_output_path = arrow_output_path
+
+        # Header and Arrow type of each column, and the column index of each {(sheet name, cell ID or None)}.
+        self.header = list(self.HEADER)
+        column_types = ['string', 'float64', 'float64']
+        self.column_indices = {}
+        for sheet_name, sheet_rubrics in (rubrics or {}).items():
+            self.column_indices[(sheet_name, None)] = len(self.header)
+            self.header.append(f"{sheet_name} Score")
+            column_types.append('float64')
+            for rubric in sheet_rubrics:
+                if (sheet_name, rubric.cell_id) in self.column_indices:
+                    continue
+                self.column_indices[(sheet_name, rubric.cell_id)] = len(self.header)
+                for suffix, column_type in self.RUBRIC_COLUMNS:
+                    self.header.append(f"{sheet_name}!{rubric.cell_id} {suffix}")
+                    column_types.append(column_type)
+
+        self.file = open(output_path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.header)
+        self.file.flush()
+
+        self.arrow_schema = None
+        self.arrow_file = None
+        self.arrow_writer = None
+        if arrow_output_path is not None:
+            import pyarrow
+            self.arrow_schema = pyarrow.schema([(name, getattr(pyarrow, column_type)())
+                                                for name, column_type in zip(self.header, column_types)])
+            self.arrow_file = open(arrow_output_path, 'wb')
+            self.arrow_writer = pyarrow.ipc.new_stream(self.arrow_file, self.arrow_schema)
+
+    def create_row(self, name, report):
+        """
+        Creates the row of a graded submission. Cells without value, e.g. of rubrics that weren't graded, are None.
+        :param name: String value of the submission name.
+        :param report: GradingReport instance of the submission, or None if the submission couldn't be graded.
+        :return: List of the row's values, in the order of the header.
+        """
+        row = [name] + [None] * (len(self.header) - 1)
+        if report is None:
+            return row
+
+        row[1] = report.submission_score
+        row[2] = report.max_possible_score
+        for sheet_report in report.children:
+            sheet_name = sheet_report.report_html_args.get('name')
+            index = self.column_indices.get((sheet_name, None))
+            if index is None:
+                continue
+            row[index] = sheet_report.submission_score
+
+            for rubric_report in sheet_report.children:
+                html_args = rubric_report.report_html_args
+                index = self.column_indices.get((sheet_name, html_args.get('id')))
+                if index is None:
+                    continue
+                error = html_args.get('error')
+                row[index:index + len(self.RUBRIC_COLUMNS)] = [rubric_report.submission_score,
+                                                               html_args.get('is_correct'),
+                                                               str(error) if error is not None else None]
+        return row
+
+    def append(self, name, report):
+        """
+        Appends the row of a graded submission.
+        :param name: String value of the submission name.
+        :param report: GradingReport instance of the submission, or None if the submission couldn't be graded.
+            The score columns are left empty in that case.
+        """
+        row = self.create_row(name, report)
+        self.writer.writerow(row)
+        self.file.flush()
+
+        if self.arrow_writer is not None:
+            import pyarrow
+            arrays = [pyarrow.array([value], type=field.type) for value, field in zip(row, self.arrow_schema)]
+            self.arrow_writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=self.arrow_schema))
+            self.arrow_file.flush()
+
+    def close(self):
+        """
+        Closes the gradebook files.
+        """
+        self.file.close()
+        if self.arrow_writer is not None:
+            self.arrow_writer.close()
+            self.arrow_file.close()
@@ -1,34 +1,45 @@
 from pysheetgrader.sheet import Sheet
+from pysheetgrader.document import Document
+from pysheetgrader.pool import grade_in_pool
+from pysheetgrader.profiler import profile_phase, profiled
+from pysheetgrader.verdict_cache import VerdictCache
+from pysheetgrader.workbook import IndexedSheet
 
 from pysheetgrader.grading.rubric import GradingRubric
-from pysheetgrader.grading.rubric import GradingRubricType
+from pysheetgrader.grading.rubric import RubricResult
 from pysheetgrader.grading.report import GradingReport
 from pysheetgrader.grading.report import GradingReportType
-from pysheetgrader.grading.strategy.constant import ConstantStrategy
-from pysheetgrader.grading.strategy.base import BaseStrategy
-from pysheetgrader.grading.strategy.formula import NaiveFormulaStrategy
-from pysheetgrader.grading.strategy.soft import SoftFormulaStrategy
-from pysheetgrader.grading.strategy.test import TestRunStrategy
-from pysheetgrader.grading.strategy.relative import RelativeStrategy
-from pysheetgrader.grading.strategy.relative_f import RelativeFormulaStrategy
-from pysheetgrader.grading.strategy.check import CheckStrategy
-from pysheetgrader.grading.strategy.assertion import AssertionStrategy
+from pysheetgrader.grading.strategy.context import SheetContext
 from pysheetgrader.grading.strategy.manual import ManualStrategy
+from pysheetgrader.grading.strategy.registry import get_strategy
 
 import re
 import os
+import sys
+from traceback import print_exc
+from openpyxl.utils import rows_from_range
+
+# Matches cell coordinates and ranges referred in formulas and rubric values, e.g. "B4", "$B$4" or "B2:C10".
+CELL_REFERENCE_PATTERN = re.compile(r"\$?[A-Z]{1,3}\$?\d+(?::\$?[A-Z]{1,3}\$?\d+)?")
 
 class Grader:
     """
     Responsible to grade submission Document instances against the key Document.
     """
 
-    def __init__(self, key_document, is_testmode, is_debug, is_log):
+    def __init__(self, key_document, is_testmode, is_debug, is_log, equivalence_budget=None, verdict_cache=None,
+                 recalculate=False):
         """
         Initializer of this instance.
 
         :param key_document: Document instance of a valid key.
         :param is_testmode: Boolean to indicate that autograder is running in test mode.
+        :param equivalence_budget: EquivalenceBudget instance limiting the comparison of formula rubrics.
+            Defaults to None, which uses the default EquivalenceBudget.
+        :param verdict_cache: VerdictCache instance reused by every graded submission. Defaults to None, which uses
+            a new in-memory VerdictCache.
+        :param recalculate: Boolean to indicate that the values of submission formula cells without cached value
+            should be computed when the submission is opened. Defaults to False.
         :exception ValueError: Raises a ValueError if the passed `key_document` is not a valid key.
         """
         # Sanity check
@@ -38,11 +49,91 @@ class Grader:
         # Attributes
         self.key_document = key_document
         self.grading_sheets = key_document.get_grading_sheets()
-        self.correct_cells = []
         self.is_testmode = is_testmode
         self.is_debug = is_debug
         self.is_log = is_log
+        self.equivalence_budget = equivalence_budget
+        self.verdict_cache = verdict_cache if verdict_cache is not None else VerdictCache()
+        self.recalculate = recalculate
+
+        # Parse the rubric notes once, so they're not parsed again for every graded submission.
+        if key_document.rubric_values is None:
+            with profile_phase('parse_rubric_notes'):
+                key_document.rubric_values = {
+                    sheet.name: GradingRubric.create_rubric_values_for_sheet(key_document, sheet, is_log)
+                    for sheet in self.grading_sheets
+                }
+        # Build the rubrics once, and share them with every graded submission.
+        with profile_phase('create_rubrics'):
+            self.rubrics = {
+                sheet.name: GradingRubric.create_rubrics_for_sheet(key_document, sheet, is_debug, is_log)
+                for sheet in self.grading_sheets
+            }
+        self.required_cells = self.find_required_cells()
+
+    def find_required_cells(self):
+        """
+        Finds the cells of the submission sheets that the rubrics of this instance's key may look up: the rubric
+        cells, every cell referred in their rubric values and test cases, and every cell referred in the key formulas
+        of those cells.
+
+        :return: Dictionary of {sheet name: set of cell coordinates}.
+        """
+        required_cells = {}
+        for sheet in self.grading_sheets:
+            rubrics = self.rubrics[sheet.name]
+            try:
+                key_sheet = self.key_document.formula_wb[sheet.name]
+            except KeyError:
+                continue
+
+            texts = []
+            for rubric in rubrics:
+                texts.extend(self.find_rubric_texts(rubric))
+                for coord in rubric.get_all_cell_coord():
+                    try:
+                        texts.append(str(key_sheet[coord].value))
+                    except ValueError:
+                        pass
+
+            coords = set()
+            for match in CELL_REFERENCE_PATTERN.finditer(" ".join(texts)):
+                for row in rows_from_range(match.group().replace('$', '')):
+                    coords.update(row)
+            required_cells[sheet.name] = {IndexedSheet.normalize_coord(coord) for coord in coords}
+
+        return required_cells
+
+    @staticmethod
+    def find_rubric_texts(rubric):
+        """
+        Finds the texts of the passed rubric that may refer cells: its rubric values, and the inputs, expected output and
+        failure message of each of its test cases.
+        :param rubric: GradingRubric instance.
+        :return: List of String values.
+        """
+        texts = []
+        for name, value in rubric.get_values().items():
+            if name == 'test_cases':
+                # Test cases have no readable representation, so their fields are collected one by one.
+                for test_case in value or []:
+                    texts.extend(str(item) for item in test_case.inputs.items())
+                    texts.append(str(test_case.expected_output))
+                    texts.append(str(test_case.failmsg))
+            elif value is not None:
+                texts.append(str(value))
+        return texts
+
+    def open_submission(self, path):
+        """
+        Opens the submission document in `path` as a read-only Document that only loads the cells this instance's
+        key may look up, computing their values if they weren't cached and `recalculate` is set.
+        :param path: String value of the submission document path.
+        :return: Document instance.
+        """
+        return Document(path, read_only=True, targets=self.required_cells, recalculate=self.recalculate)
 
+    @profiled('grade')
     def grade(self, document):
         """
         Grade the passed `document` against this instance's key document.
@@ -50,8 +141,8 @@ class Grader:
         :return: GradingReport instance of the grade.
         """
         report = GradingReport(GradingReportType.ASSIGNMENT)
-        report.report_html_args = {'name': os.path.basename(document.path), 'sheets': []}
-        report.append_line(f"========== START GRADING PROCESS ==========")
+        report.report_html_args = {'name': os.path.basename(document.path)}
+        report.append_line("========== START GRADING PROCESS ==========")
 
         for sheet in self.grading_sheets:
             report += self.grade_sheet(document, sheet)
@@ -62,9 +153,52 @@ class Grader:
         if self.is_testmode:
             report.report_html_args['total_tests'] = report.total_tests
             report.report_html_args['passing_tests'] = report.passing_tests
-        report.append_line(f"\nFinal score: {report.submission_score} / {report.max_possible_score}")
+        report.append_line("\nFinal score: {} / {}", report.submission_score, report.max_possible_score)
         return report
 
+    def grade_many(self, document_paths, jobs=1, max_tasks_per_worker=None):
+        """
+        Grade the submission documents in `document_paths` one by one against this instance's key document.
+        The key document and its grading sheets are loaded once and reused for every submission, and each
+        submission document is closed as soon as it's graded.
+
+        :param document_paths: Iterable of String values of submission document paths.
+        :param jobs: Integer number of worker processes. If it's more than 1, the submissions are graded in a
+            process pool where every worker loads the key document once. Defaults to 1.
+        :param max_tasks_per_worker: Integer number of submissions graded by a worker process before it's replaced.
+            Only used when `jobs` is more than 1. Defaults to None, which keeps the workers for the whole batch.
+        :return: Generator of (path, GradingReport) tuples, in the order of `document_paths`. The GradingReport is
+            None if the submission document couldn't be opened or graded.
+        """
+        if jobs > 1:
+            grader_args = (self.is_testmode, self.is_debug, self.is_log, self.equivalence_budget,
+                           self.verdict_cache, self.recalculate)
+            yield from grade_in_pool(self.key_document.path, grader_args, document_paths, jobs,
+                                     max_tasks_per_worker)
+            return
+
+        for path in document_paths:
+            try:
+                document = self.open_submission(path)
+            except Exception as exc:
+                print(f"Exception when opening submission {path}: {exc}", file=sys.stderr)
+                if self.is_log:
+                    print_exc()
+                yield path, None
+                continue
+
+            try:
+                report = self.grade(document)
+            except Exception as exc:
+                print(f"Exception when grading submission {path}: {exc}", file=sys.stderr)
+                if self.is_log:
+                    print_exc()
+                report = None
+            finally:
+                document.close()
+
+            yield path, report
+
     def grade_sheet(self, document, sheet: Sheet):
         """
         Grade the passed `sheet_name` of the passed `document` against this instance's key document.
@@ -74,59 +208,64 @@ class Grader:
         :return: GradingReport instance of the grade for the sheet.
         """
         report = GradingReport(GradingReportType.SHEET)
-        report.report_html_args = {'name': sheet.name, 'rubrics': [], 'minimum_work_reached': True,
+        report.report_html_args = {'name': sheet.name, 'minimum_work_reached': True,
                                    'minimum_work': sheet.minimum_work,
                                    'minimum_work_feedback': sheet.feedback,
                                    'submission_score': 0,
                                    'max_possible_score': 0}
-        report.append_line(f"\n {'Running Tests' if self.is_testmode else 'Grading'} for sheet: {sheet.name}")
-        rubrics = GradingRubric.create_rubrics_for_sheet(self.key_document, sheet, self.is_debug, self.is_log)
+        report.append_line("\n {} for sheet: {}", 'Running Tests' if self.is_testmode else 'Grading', sheet.name)
+        total_tests = 0
+        passing_tests = 0
+        context = SheetContext(self.key_document, document, sheet.name, set(), self.equivalence_budget,
+                               self.verdict_cache)
 
-        for r in rubrics:
-            sub_score = report.submission_score
-            report += self.grade_sheet_by_rubric(document, sheet, r)
+        for r in self.rubrics[sheet.name]:
+            result = RubricResult()
+            with profile_phase(f"rubric:{r.rubric_type.name if r.rubric_type else 'MANUAL'}", {'cell': r.cell_id}):
+                report += self.grade_sheet_by_rubric(document, sheet, r, result, context)
             if self.is_testmode:
-                sheet.total_tests += 1
-                if r.is_test_pass:
-                    sheet.passing_tests += 1
-            if r.is_correct:
-                self.correct_cells.append(r.cell_coord)
-            if r.killer and not r.is_correct:
+                total_tests += 1
+                if result.is_test_pass:
+                    passing_tests += 1
+            if result.is_correct:
+                context.correct_cells.add(r.cell_coord)
+            if r.killer and not result.is_correct:
                 report.submission_score = 0
                 if r.hidden:
-                    report.append_line(f"This tab didn't pass its prerequisites! - Please contact the professor")
-                    break
+                    report.append_line("This tab didn't pass its prerequisites! - Please contact the professor")
                 else:
-                    report.append_line(f"Cell {r.cell_coord} must be correct before this tab can be graded!")
-                    break
-        self.correct_cells = []
+                    report.append_line("Cell {} must be correct before this tab can be graded!", r.cell_coord)
+                break
+
         if report.submission_score < sheet.minimum_work:
             # If the students don't give an assignment a real try,
             # we don't want to give any feedback or provide a grade.
             report.submission_score = 0.0
-            report.report_lines = report.report_lines[:1]
+            report.truncate_lines(1)
             report.report_html_args['minimum_work_reached'] = False
-            report.append_line(f"Minimum work ({sheet.minimum_work}) not reached: {sheet.feedback}")
+            report.append_line("Minimum work ({}) not reached: {}", sheet.minimum_work, sheet.feedback)
 
-        report.append_line(f"Score for {sheet.name} sheet: "
-                           f"{report.submission_score} / {report.max_possible_score}")
+        report.append_line("Score for {} sheet: {} / {}", sheet.name, report.submission_score,
+                           report.max_possible_score)
 
         report.report_html_args['submission_score'] = report.submission_score
         report.report_html_args['max_possible_score'] = report.max_possible_score
         if self.is_testmode:
-            report.total_tests = sheet.total_tests
-            report.passing_tests = sheet.passing_tests
-            report.report_html_args['total_tests'] = sheet.total_tests
-            report.report_html_args['passing_tests'] = sheet.passing_tests
+            report.total_tests = total_tests
+            report.passing_tests = passing_tests
+            report.report_html_args['total_tests'] = total_tests
+            report.report_html_args['passing_tests'] = passing_tests
         return report
 
-    def grade_sheet_by_rubric(self, document, sheet: Sheet, rubric): # TODO: REFACTOR
+    def grade_sheet_by_rubric(self, document, sheet: Sheet, rubric, result: RubricResult, context: SheetContext):
         """
         Grades the `sheet_name` of the passed `document` using the passed `rubric`.
 
         :param document: Document instance.
         :param sheet: The Sheet object that represents the sheet to be graded
         :param rubric: GradingRubric instance.
+        :param result: RubricResult instance of the document, updated with the grading of the rubric.
+        :param context: SheetContext instance of the document's sheet.
         :return: GradingReport instance of the grade of the document's sheet.
         """
         report = GradingReport(GradingReportType.RUBRIC)
@@ -136,97 +275,54 @@ class Grader:
             'cell': rubric.cell_coord,
             'hidden': rubric.hidden,
             'description': rubric.description,
-            'test_params': rubric.test_params
+            'test_params': dict(rubric.test_params) if rubric.test_params is not None else None
         }
 
         if rubric.manual:
-            report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, constant value comparison")
+            report.append_line("    #{} Cell {}, constant value comparison", rubric.cell_id, rubric.cell_coord)
             html_args['rubric_type'] = "Manual check"
 
-        if rubric.rubric_type == GradingRubricType.CONSTANT:
+        strategy = get_strategy(rubric.rubric_type)
+        if strategy is not None:
             if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, constant value comparison")
-            report += ConstantStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells).grade()
-            html_args['rubric_type'] = "Value check" if rubric.grading_nature == 'positive' else "Value check (penalty)"
-        elif rubric.rubric_type == GradingRubricType.FORMULA:
-            if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, formula comparison")
-            report += NaiveFormulaStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells,
-                                           report_line_prefix="\t").grade()
-            html_args['rubric_type'] = "Formula check" if rubric.grading_nature == 'positive' else "Formula check (penalty)"
-        elif rubric.rubric_type == GradingRubricType.SOFT_FORMULA:
-            if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, soft formula comparison")
-            report += SoftFormulaStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells,
-                                          report_line_prefix="\t").grade()
-            html_args['rubric_type'] = "Soft formula check" if rubric.grading_nature == 'positive' else "Soft Formula Check (penalty)"
-        elif rubric.rubric_type == GradingRubricType.TEST:
-            if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, test case runs")
-                report.append_line(f"\t- Test cases:")
-            report += TestRunStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells,
-                                      report_line_prefix="\t\t").grade()
-            html_args['rubric_type'] = "Test runs" if rubric.grading_nature == 'positive' else "Test Runs check (penalty)"
-        elif rubric.rubric_type == GradingRubricType.RELATIVE:
-            if not rubric.hidden:
-                report.append_line(
-                    f"    #{rubric.cell_id} Cell {rubric.cell_coord}, relative comparison (accept both "
-                    f"constant and formula cell)")
-            report += RelativeStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells,
-                                       report_line_prefix="\t").grade()
-            html_args['rubric_type'] = "Relative formula check (accept both constant and formula cell)" if rubric.grading_nature == 'positive' else "Relative formula check (accept both constant and formula cell) (penalty)"
-        elif rubric.rubric_type == GradingRubricType.RELATIVE_F:
-            if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, relative comparison (only accept "
-                                   f"formula cell)")
-            report += RelativeFormulaStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells,
-                                              report_line_prefix="\t").grade()
-            html_args['rubric_type'] = "Relative formula check (only accept formula cell)" if rubric.grading_nature == 'positive' else "Relative formula (penalty)"
-        elif  rubric.rubric_type == GradingRubricType.CHECK:
-            if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, check result comparison ")
-            report += CheckStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells).grade()
-            html_args['rubric_type'] = "Result check" if rubric.grading_nature == 'positive' else "Result check (penalty)"
-        elif  rubric.rubric_type == GradingRubricType.ASSERTION:
-            if not rubric.hidden:
-                report.append_line(f"    #{rubric.cell_id} Cell {rubric.cell_coord}, check result comparison ")
-            report += AssertionStrategy(self.key_document, document, sheet.name, rubric, self.correct_cells).grade()
-            html_args['rubric_type'] = "Result check" if rubric.grading_nature == 'positive' else "Result check (penalty)"
-        
-        feedback = ManualStrategy(
-            self.key_document, 
-            document, 
-            sheet.name, 
-            rubric, 
-            self.correct_cells
-        ).get_submitted_value() if rubric.manual else self.render_failure_message(
-            document, sheet.name, rubric.fail_msg
-        ) if rubric.fail_msg else "" 
+                strategy.append_header_lines(report, rubric)
+            report += strategy(context, rubric, result).grade()
+            html_args['rubric_type'] = strategy.get_html_rubric_type(rubric)
 
         if not self.is_testmode:
+            # The feedback is only shown for incorrect cells.
+            feedback = None
+            if not result.is_correct:
+                with profile_phase('feedback'):
+                    feedback = ManualStrategy(context, rubric).get_submitted_value() if rubric.manual \
+                        else self.render_failure_message(document, sheet.name, rubric.fail_msg) if rubric.fail_msg \
+                        else ""
+
             if not rubric.hidden:
                 if rubric.description:
-                    report.append_line(f"\t- Description: {rubric.description}")
-                if rubric.fail_msg and not rubric.is_correct:
-                    report.append_line(f"\t- Feedback: {feedback}")
+                    report.append_line("\t- Description: {}", rubric.description)
+                if rubric.fail_msg and not result.is_correct:
+                    report.append_line("\t- Feedback: {}", feedback)
                     html_args['feedback'] = feedback
-                report.append_line(f"\t- Score: {report.submission_score} / {report.max_possible_score}")
+                report.append_line("\t- Score: {} / {}", report.submission_score, report.max_possible_score)
 
-            if rubric.hidden and not rubric.is_correct:
+            if rubric.hidden and not result.is_correct:
                 # student does not pass the hidden cell, show hint
                 html_args['hidden_hint'] = {'hint': feedback}
-                report.append_line(f"    #{rubric.cell_id} (Hidden): {feedback}")
+                report.append_line("    #{} (Hidden): {}", rubric.cell_id, feedback)
         else:
-            report.append_line(f"\t- Test: {rubric.test_params.get('name', '')}")
-            rubric.is_test_pass = (((rubric.test_params.get('expected_score', None) is None) or rubric.test_params['expected_score'] == report.submission_score) and rubric.is_correct and rubric.test_params.get("expected_result", "correct") == "correct") or \
-                                        ((not rubric.is_correct) and rubric.test_params.get("expected_result", "correct") == "incorrect")
-            status = "PASS" if rubric.is_test_pass else f"FAIL: {rubric.test_params.get('failure_message', '')}"
-            report.append_line(f"\t- Status: {status}")
+            report.append_line("\t- Test: {}", rubric.test_params.get('name', ''))
+            result.is_test_pass = (((rubric.test_params.get('expected_score', None) is None) or rubric.test_params['expected_score'] == report.submission_score) and result.is_correct and rubric.test_params.get("expected_result", "correct") == "correct") or \
+                                        ((not result.is_correct) and rubric.test_params.get("expected_result", "correct") == "incorrect")
+            if result.is_test_pass:
+                report.append_line("\t- Status: PASS")
+            else:
+                report.append_line("\t- Status: FAIL: {}", rubric.test_params.get('failure_message', ''))
 
         html_args['submission_score'] = report.submission_score
         html_args['max_possible_score'] = report.max_possible_score
-        html_args['is_correct'] = rubric.is_correct
-        html_args['is_test_pass'] = rubric.is_test_pass
+        html_args['is_correct'] = result.is_correct
+        html_args['is_test_pass'] = result.is_test_pass
         report.report_html_args.update(html_args)
         return report
 
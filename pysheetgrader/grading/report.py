@@ -10,30 +10,47 @@ class GradingReportType(Enum):
     ASSIGNMENT = 3
 
 
+# Key of the HTML arguments holding the HTML arguments of the children of each report type.
+CHILDREN_HTML_ARGS_KEYS = {
+    GradingReportType.SHEET: 'rubrics',
+    GradingReportType.ASSIGNMENT: 'sheets',
+}
+
+
 class GradingReport:
     """
-    Representation of a grading report.
-    Please use the `append_line()` method instead of appending the lines manually to `report_lines` property
-    so it could do proper side effects (e.g. printing every new lines).
+    Representation of a grading report, as a tree: an assignment report holds its sheet reports, which hold their
+    rubric reports. Nothing is rendered while grading: the report lines are kept as format strings and arguments,
+    and the text, HTML arguments or JSON of a report are only built when `report_lines`, `create_html_args()` or
+    `to_dict()` are called.
+
+    Please use the `append_line()` method instead of appending the lines manually, and add child reports with `+=`.
+    A child report shouldn't be modified once it's added.
 
     Attributes:
-        - print_appended_lines: Prints the appended line passed to the `append_line()` method. Defaults to `False`.
+        - report_html_args: Dictionary of the HTML arguments of this report only, without its children's.
+        - entries: List of the lines, as (format string, arguments) tuples, and child reports, in text order.
+        - children: List of the child reports, in order.
     """
+    __slots__ = ('report_type', 'submission_score', 'max_possible_score', 'total_tests', 'passing_tests',
+                 'report_html_args', 'entries', 'children', 'rendered_lines')
 
     def __init__(self, t: GradingReportType):
         self.submission_score = 0
         self.max_possible_score = 0
-        self.report_lines = []
         self.report_type = t
         self.report_html_args = {}
         self.total_tests = 0
         self.passing_tests = 0
+        self.entries = []
+        self.children = []
+        self.rendered_lines = None
 
     def __add__(self, other):
         if self.report_type == GradingReportType.SHEET and other.report_type == GradingReportType.RUBRIC:
-            self.report_html_args['rubrics'].append(other.report_html_args)
+            self.children.append(other)
         elif self.report_type == GradingReportType.ASSIGNMENT and other.report_type == GradingReportType.SHEET:
-            self.report_html_args['sheets'].append(other.report_html_args)
+            self.children.append(other)
         elif self.report_type == GradingReportType.RUBRIC and other.report_type == GradingReportType.RUBRIC:
             self.report_html_args.update(other.report_html_args)
         else:
@@ -53,16 +70,89 @@ class GradingReport:
 
         self.submission_score += other_report.submission_score
         self.max_possible_score += other_report.max_possible_score
-        self.report_lines.extend(other_report.report_lines)
+        if self.report_type == other_report.report_type:
+            # Parts of the same rubric are merged, their few lines aren't worth a tree level.
+            self.entries.extend(other_report.entries)
+        else:
+            self.entries.append(other_report)
+        self.rendered_lines = None
         if self.report_type == GradingReportType.ASSIGNMENT and other_report.report_type == GradingReportType.SHEET:
             self.total_tests += other_report.total_tests
             self.passing_tests += other_report.passing_tests
-    def append_line(self, string_line):
+
+    def append_line(self, string_line, *args):
+        """
+        Appends a line to this instance's report lines. The line is only formatted when the report is rendered.
+        :param string_line: String instance, or format string of `str.format()` if `args` are passed.
+        :param args: Arguments of the format string.
+        """
+        self.entries.append((string_line, args))
+        self.rendered_lines = None
+
+    def truncate_lines(self, count):
+        """
+        Removes the lines of this report after the first `count` entries from its text. The child reports are kept
+        in the HTML arguments and JSON of this report.
+        :param count: Integer number of entries to keep.
+        """
+        del self.entries[count:]
+        self.rendered_lines = None
+
+    @property
+    def report_lines(self):
+        """
+        Returns the rendered lines of this report and its children, each ending with a new line. They're rendered
+        once, on first use.
+        :return: List of String instances.
         """
-        Appends the passed string_line to this instance's `report_lines`.
-        :param string_line: String instance.
+        if self.rendered_lines is None:
+            lines = []
+            self.render_lines(lines)
+            self.rendered_lines = lines
+        return self.rendered_lines
+
+    def render_lines(self, lines):
+        """
+        Renders the lines of this report and its children into the passed list.
+        :param lines: List of String instances.
+        """
+        for entry in self.entries:
+            if isinstance(entry, GradingReport):
+                lines.extend(entry.report_lines)
+            else:
+                lines.append(render_line(entry))
+
+    def create_html_args(self):
+        """
+        Returns the arguments of the HTML report template for this report, including its children's.
+        :return: Dictionary of HTML arguments.
+        """
+        html_args = dict(self.report_html_args)
+        children_key = CHILDREN_HTML_ARGS_KEYS.get(self.report_type)
+        if children_key is not None:
+            html_args[children_key] = [child.create_html_args() for child in self.children]
+        return html_args
+
+    def to_dict(self):
+        """
+        Returns the JSON-friendly representation of this report and its children. Values that aren't JSON types,
+        e.g. exceptions, are left as they are.
+        :return: Dictionary of the report type, scores, HTML arguments (`details`), own lines and children.
         """
-        self.report_lines.append(string_line + "\n")
+        details = dict(self.report_html_args)
+        details.pop(CHILDREN_HTML_ARGS_KEYS.get(self.report_type), None)
+        result = {
+            'type': self.report_type.name.lower(),
+            'submission_score': self.submission_score,
+            'max_possible_score': self.max_possible_score,
+            'details': details,
+            'lines': [render_line(entry)[:-1] for entry in self.entries if not isinstance(entry, GradingReport)],
+            'children': [child.to_dict() for child in self.children],
+        }
+        if self.report_type != GradingReportType.RUBRIC:
+            result['total_tests'] = self.total_tests
+            result['passing_tests'] = self.passing_tests
+        return result
 
     def print_lines(self):
         """
@@ -71,3 +161,13 @@ class GradingReport:
         """
         for line in self.report_lines:
             print(line, end='')
+
+
+def render_line(entry):
+    """
+    Renders a line entry of a GradingReport.
+    :param entry: Tuple of (format string, arguments).
+    :return: String value of the line, ending with a new line.
+    """
+    string_line, args = entry
+    return (string_line.format(*args) if args else string_line) + "\n"
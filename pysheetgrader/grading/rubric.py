@@ -1,5 +1,6 @@
 import sys
 from enum import Enum
+from types import MappingProxyType
 import yaml
 from openpyxl.worksheet.worksheet import Worksheet
 
@@ -8,6 +9,9 @@ from pysheetgrader.grading.test_case import GradingTestCase
 from pysheetgrader.utils import get_headers
 from traceback import print_exc
 
+# YAML loader of the rubric notes: the full loader, C-accelerated if PyYAML was built with libyaml. The full loader is
+# kept on purpose rather than the safe one, since rubric notes rely on tags the safe loader rejects.
+YAML_LOADER = getattr(yaml, 'CLoader', yaml.Loader)
 
 
 class GradingRubricType(Enum):
@@ -51,10 +55,35 @@ class GradingRubricType(Enum):
             raise Exception(f"Unsupported rubric type {value}")
 
 
+class RubricResult:
+    """
+    Grading state of a GradingRubric for a single submission, written by the grading strategies.
+    """
+    __slots__ = ('is_correct', 'is_test_pass')
+
+    def __init__(self):
+        """
+        Initializer of this class.
+        :param is_correct: True if evaluated and correct, false otherwise.
+        :param is_test_pass: True if Test is passing, false otherwise.
+        """
+        self.is_correct = False
+        self.is_test_pass = False
+
+
 class GradingRubric:
     """
     Representation of a grading rubric in a sheet.
+
+    Instances are read-only definitions derived from the key, so the rubrics of a key can be shared by concurrent
+    gradings. The grading of a submission is recorded in a RubricResult instead.
     """
+    __slots__ = ('cell_id', 'cell_coord', 'rubric_type', 'grading_nature', 'score', 'constant_delta', 'result_coord',
+                 'alt_cells', 'test_cases', 'hidden', 'killer', 'manual', 'description', 'fail_msg', 'prereq_cells',
+                 'test_params', 'parse_excel', 'debug', 'log_mode')
+
+    # Slots holding the rubric values, see `get_values()`.
+    VALUE_NAMES = __slots__[:-2]
 
     def __init__(self, values: dict, debug_mode:bool, log_mode:bool):
         """
@@ -73,36 +102,55 @@ class GradingRubric:
         :param constant_delta: Float value of the delta / precision that allowed for a constant GradingRubricType.
             Defaults to 0.
         :param alt_cells: List of String of alternative cell coordinates to be reviewed by this rubric.
-            Defaults to empty list.
-        :param test_cases: List of GradingTestCase instances. Defaults to empty list.
-        :param test_params: Dictionary of data to be used in test mode.
-        :param is_correct: True if evaluated and correct, false otherwise.
-        :param is_test_pass: True if Test is passing, false otherwise.
+            Defaults to empty list. Stored as a tuple.
+        :param test_cases: List of GradingTestCase instances. Defaults to empty list. Stored as a tuple.
+        :param test_params: Dictionary of data to be used in test mode. Stored as a read-only dictionary.
         """
-        self.cell_id = values["cell_id"]
-        self.cell_coord = values["cell_coord"]
-        self.rubric_type = values["rubric_type"]
-
-        self.grading_nature = values.get("grading_nature", "positive")
-        self.score = values["score"]
-        self.constant_delta = values.get("constant_delta", 0)
-        self.result_coord = values["result_coord"]
-
-        self.alt_cells = values.get("alt_cells", [])
-        self.test_cases = values.get("test_cases", [])
-
-        self.hidden = values["hidden"] if not debug_mode else False
-        self.killer = values["killer"] if not debug_mode else False
-        self.manual = values['manual']
-        self.description = values["description"]
-        self.fail_msg = values["fail_msg"]
-        self.prereq_cells = values.get("prereq_cells", []) if not debug_mode else []
-        self.test_params = values["test_params"]
-        self.is_correct = False
-        self.is_test_pass = False
-        self.debug = debug_mode
-        self.parse_excel = values.get('parse_excel', False)
-        self.log_mode = log_mode
+        prereq_cells = values.get("prereq_cells", []) if not debug_mode else []
+        test_params = values["test_params"]
+        fields = {
+            "cell_id": values["cell_id"],
+            "cell_coord": values["cell_coord"],
+            "rubric_type": values["rubric_type"],
+            "grading_nature": values.get("grading_nature", "positive"),
+            "score": values["score"],
+            "constant_delta": values.get("constant_delta", 0),
+            "result_coord": values["result_coord"],
+            "alt_cells": freeze_list(values.get("alt_cells", [])),
+            "test_cases": freeze_list(values.get("test_cases", [])),
+            "hidden": values["hidden"] if not debug_mode else False,
+            "killer": values["killer"] if not debug_mode else False,
+            "manual": values['manual'],
+            "description": values["description"],
+            "fail_msg": values["fail_msg"],
+            "prereq_cells": freeze_list(prereq_cells),
+            "test_params": MappingProxyType(dict(test_params)) if test_params is not None else None,
+            "parse_excel": values.get('parse_excel', False),
+            "debug": debug_mode,
+            "log_mode": log_mode,
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"GradingRubric is read-only, can't set '{name}'. Grading state belongs to RubricResult")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"GradingRubric is read-only, can't delete '{name}'")
+
+    def __reduce__(self):
+        # Read-only proxies can't be pickled, so rubrics are pickled as their initializer arguments.
+        return GradingRubric, (self.get_values(), self.debug, self.log_mode)
+
+    def get_values(self):
+        """
+        Returns the values of this rubric, as accepted by the initializer.
+        :return: Dictionary of rubric values.
+        """
+        values = {name: getattr(self, name) for name in self.VALUE_NAMES}
+        if values["test_params"] is not None:
+            values["test_params"] = dict(values["test_params"])
+        return values
 
     def get_all_cell_coord(self):
         """
@@ -135,6 +183,25 @@ class GradingRubric:
         :param sheet: The Sheet object that represents the sheet to be graded
         :return: List of GradingRubric.
         """
+        # Compiled keys already hold the parsed rubric values of every graded sheet.
+        if key_document and key_document.rubric_values is not None:
+            rubric_values = key_document.rubric_values.get(sheet.name, [])
+        else:
+            rubric_values = GradingRubric.create_rubric_values_for_sheet(key_document, sheet, log_mode)
+
+        return [GradingRubric(values, debug_mode, log_mode) for values in rubric_values]
+
+    @staticmethod
+    def create_rubric_values_for_sheet(key_document, sheet: Sheet, log_mode: bool):
+        """
+        Parse the rubrics of the passed `sheet` from the `_CheckOrder` sheet and rubric notes of the `key_document`,
+        into an ordered list of dictionaries that can be passed to the GradingRubric initializer.
+        Will return empty list of the passed key_document is invalid or doesn't have rubrics in the passed sheet.
+
+        :param key_document: Valid Document instance.
+        :param sheet: The Sheet object that represents the sheet to be graded
+        :return: List of dictionaries of rubric values.
+        """
         # Sanity check
         if not key_document or not key_document.is_valid_key():
             return []
@@ -190,9 +257,9 @@ class GradingRubric:
                     "failure_message": row[header_index["test_failure_message"]] if has_test_failure_message else None,
                     "expected_score": row[header_index["expected_score"]] if has_expected_score else None
                 }
-                r = GradingRubric.create_rubric_from_cell(cell_id, cell_coord,
-                                                          cell_description, hidden, killer, fail_msg, key_sheet, test_params, debug_mode, manual, log_mode)
-                
+                r = GradingRubric.create_rubric_values_from_cell(cell_id, cell_coord, cell_description, hidden,
+                                                                 killer, fail_msg, key_sheet, test_params, manual)
+
                 rubrics.append(r)
             except Exception as exc:
                 print(f"Exception when creating rubric: {exc}", file=sys.stderr)
@@ -203,10 +270,10 @@ class GradingRubric:
         return rubrics
 
     @staticmethod
-    def create_rubric_from_cell(cell_id: str, cell_coord: str, description: str, hidden: bool, killer: bool,fail_msg: str,
-                                key_sheet: Worksheet, test_params: dict, debug_mode: bool, manual: bool, log_mode:bool):
+    def create_rubric_values_from_cell(cell_id: str, cell_coord: str, description: str, hidden: bool, killer: bool,
+                                       fail_msg: str, key_sheet: Worksheet, test_params: dict, manual: bool):
         """
-        Creates GradingRubric instance from passed `cell_coord` of the `key_sheet`.
+        Creates the dictionary of GradingRubric values from passed `cell_coord` of the `key_sheet`.
         This method assumes the cell of the passed coordinate will have notes that holds the rubric.
 
         :param cell_id: String value of the cell identifier. It is the number left to the `cell_coord`
@@ -218,9 +285,10 @@ class GradingRubric:
         :param killer: True if the cell is killer cell 
         :param fail_msg: String value of general failure message, for example,
                 "This cell should have used standard deviation, which was $B3 according to your calculation."
-        :param key_sheet: Openpyxl's Worksheet instance of the key document.
+        :param key_sheet: Openpyxl's Worksheet or IndexedSheet instance of the key document.
         :param test_params: dictionary of parameters requried in test mode
-        :return: GradingRubric instance.
+        :param manual: True if the cell is a manual cell
+        :return: Dictionary of values for the GradingRubric initializer.
         """
 
         try:
@@ -228,7 +296,7 @@ class GradingRubric:
             key_comment = key_cell.comment.text
         except Exception as e:
             if manual:
-                return GradingRubric({
+                return {
                     "cell_id": cell_id,
                     "cell_coord": cell_coord,
                     "description": description,
@@ -246,12 +314,12 @@ class GradingRubric:
                     "test_params": test_params,
                     "parse_excel": None,
                     "manual": manual,
-                }, debug_mode, log_mode)
+                }
             else:
                 raise Exception(f"No rubric note found for cell: {cell_coord} in sheet: {key_sheet.title}")
 
         # Comment parsing
-        parsed_comment = yaml.load(key_comment, Loader=yaml.Loader)
+        parsed_comment = yaml.load(key_comment, Loader=YAML_LOADER)
         rubric_dict = parsed_comment['rubric'] if 'rubric' in parsed_comment else None
         alt_cells = parsed_comment['alt_cells'] if 'alt_cells' in parsed_comment else []
         test_cases = parsed_comment['test_cases'] if 'test_cases' in parsed_comment else {}
@@ -320,7 +388,7 @@ class GradingRubric:
             "parse_excel": rubric_parse_excel,
             "manual": manual,
         }
-        return GradingRubric(values, debug_mode, log_mode)
+        return values
 
     @staticmethod
     def create_test_cases_from_dict(raw_cases):
@@ -355,4 +423,12 @@ class GradingRubric:
                 continue
 
         return test_cases
-        
+
+
+def freeze_list(values):
+    """
+    Returns the passed list as a tuple, so it can't be modified. Other values are returned as they are.
+    :param values: List, or any other value.
+    :return: Tuple, or the passed value.
+    """
+    return tuple(values) if isinstance(values, list) else values
@@ -11,6 +11,10 @@ class AssertionStrategy(BaseStrategy):
     evalute as python expression and return bool
 
     """
+    REPORT_DESCRIPTION = "check result comparison "
+    HTML_RUBRIC_TYPE = "Result check"
+    HTML_PENALTY_RUBRIC_TYPE = "Result check (penalty)"
+
     def get_submitted_value(self):
         return str(self.sub_sheet_compute[self.cell_coord].value)
 
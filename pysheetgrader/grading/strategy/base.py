@@ -1,17 +1,22 @@
-from pysheetgrader.grading.rubric import GradingRubric
+from pysheetgrader.grading.rubric import GradingRubric, RubricResult
 from pysheetgrader.grading.report import GradingReport, GradingReportType
-from pysheetgrader.document import Document
+from pysheetgrader.grading.strategy.context import SheetContext
 from pysheetgrader.formula_parser import (
-    parse_formula_inputs, 
     parse_formula, 
-    encode_cell_reference, 
+    decode_cell_reference,
+    decode_range_reference,
     transform_excel_formula_to_sympy, 
-    parse_from_excel
+    parse_from_excel,
+    compile_formula,
+    evaluate_formula,
+    NumericValue,
+    get_exact_value
 )
-from pysheetgrader.custom_excel_formula import get_excel_formula_lambdas
+from pysheetgrader.profiler import profile_phase
+from pysheetgrader.workbook import get_range_values
 from traceback import print_exc
+import math
 import re
-from openpyxl.utils import get_column_letter, column_index_from_string
 from itertools import chain
 
 class BaseStrategy:
@@ -64,33 +69,65 @@ class BaseStrategy:
     and ensures that there are no opening and closing parentheses with any number of characters in between them immediately after the match.
     '''
 
-    def __init__(self, key_document: Document, sub_document: Document, sheet_name, grading_rubric: GradingRubric,correct_cells,
-                 report_line_prefix: str = ""):
+    # Description of the rubric type in the report line introducing a rubric, e.g. "formula comparison".
+    REPORT_DESCRIPTION = ""
+    # Rubric type shown in the HTML report, for positive and negative rubrics.
+    HTML_RUBRIC_TYPE = ""
+    HTML_PENALTY_RUBRIC_TYPE = ""
+    # Default prefix of the report lines returned by `grade()`.
+    REPORT_LINE_PREFIX = ""
+
+    parse_formula = staticmethod(parse_formula)
+    parse_from_excel = staticmethod(parse_from_excel)
+    re = re
+
+    def __init__(self, context: SheetContext, grading_rubric: GradingRubric, result: RubricResult = None,
+                 report_line_prefix: str = None):
         """
         Initializer of this class.
-        :param key_document: Document instance that used as a key.
-        :param sub_document: Document instance that will be graded as a submission.
-        :param sheet_name: String value of the sheet that will be graded.
+        :param context: SheetContext instance of the graded sheet, shared by the strategies of its rubrics.
         :param grading_rubric: GradingRubric instance.
+        :param result: RubricResult instance of the graded submission, updated by `grade()`. Defaults to None, which
+            creates a new one.
         :param report_line_prefix: Prefix of the report line returned by this instance's `grade()`.
-            Defaults to an empty string.
+            Defaults to None, which uses REPORT_LINE_PREFIX.
         """
-        self.key_document = key_document
-        self.sub_document = sub_document
-        self.sheet_name = sheet_name
+        self.context = context
+        self.key_document = context.key_document
+        self.sub_document = context.sub_document
+        self.sheet_name = context.sheet_name
+        self.correct_cells = context.correct_cells
+        self.custom_formulas = context.custom_formulas
+        self.key_sheet_compute, self.sub_sheet_compute = context.key_sheet_compute, context.sub_sheet_compute
+        self.key_sheet_raw, self.sub_sheet_raw = context.key_sheet_raw, context.sub_sheet_raw
+
         self.grading_rubric = grading_rubric
-        self.report_line_prefix = report_line_prefix
-        self.correct_cells = correct_cells
+        self.cell_coord = grading_rubric.cell_coord
+        self.result = result if result is not None else RubricResult()
+        self.report_line_prefix = report_line_prefix if report_line_prefix is not None else self.REPORT_LINE_PREFIX
 
-        ### setup 
         self.report = self.create_initial_report()
-        self.cell_coord = self.grading_rubric.cell_coord
-        self.key_sheet_compute, self.sub_sheet_compute = self.try_get_key_and_sub(computed=True)
-        self.key_sheet_raw, self.sub_sheet_raw = self.try_get_key_and_sub(computed=False)        
-        self.custom_formulas = get_excel_formula_lambdas()
-        self.parse_formula = parse_formula
-        self.parse_from_excel = parse_from_excel
-        self.re = re
+        for exc in context.errors:
+            self.report.append_line("{}{}", self.report_line_prefix, exc)
+            self.report.report_html_args['error'] = str(exc)
+
+    @classmethod
+    def append_header_lines(cls, report: GradingReport, rubric: GradingRubric):
+        """
+        Appends the report lines introducing the passed rubric, before the lines of `grade()`, to the passed report.
+        :param report: GradingReport instance.
+        :param rubric: GradingRubric instance.
+        """
+        report.append_line("    #{} Cell {}, {}", rubric.cell_id, rubric.cell_coord, cls.REPORT_DESCRIPTION)
+
+    @classmethod
+    def get_html_rubric_type(cls, rubric: GradingRubric):
+        """
+        Returns the rubric type shown in the HTML report for the passed rubric.
+        :param rubric: GradingRubric instance.
+        :return: String value.
+        """
+        return cls.HTML_RUBRIC_TYPE if rubric.grading_nature == 'positive' else cls.HTML_PENALTY_RUBRIC_TYPE
 
     def get_submitted_value(self):
         '''
@@ -131,35 +168,38 @@ class BaseStrategy:
                 return self.report
 
             ### grab the submitted value
-            sub_cell_value = self.get_submitted_value()
+            with profile_phase('submitted_value'):
+                sub_cell_value = self.get_submitted_value()
     
             ### loop thru all keys, including alt cells
             for key_coord in self.get_key_coord_set():
                 
                 ### get proper answer
-                key_cell_value = self.get_key_value(key_coord)
+                with profile_phase('key_value'):
+                    key_cell_value = self.get_key_value(key_coord)
                 
                 ### compare to submitted
-                is_correct = self.check_correct(sub_cell_value, key_cell_value, key_coord)
+                with profile_phase('comparison'):
+                    is_correct = self.check_correct(sub_cell_value, key_cell_value, key_coord)
                 
                 if is_correct and self.prereq_check():
                     ### here is where we can add weird logic for different grading natures
                     self.report.submission_score += self.get_correct_score(self.grading_rubric.grading_nature, self.grading_rubric.score)
 
                     #### mark as correct
-                    self.grading_rubric.is_correct = True
+                    self.result.is_correct = True
 
                     break
             
             ### subtract if necessary
-            if  self.grading_rubric.grading_nature == 'negative' and not self.grading_rubric.is_correct:
+            if  self.grading_rubric.grading_nature == 'negative' and not self.result.is_correct:
 
                 self.report.submission_score += self.grading_rubric.score
         
             return self.report
 
         except Exception as exc:
-            self.report.append_line(f"{self.report_line_prefix}Error: {exc}")
+            self.report.append_line("{}Error: {}", self.report_line_prefix, exc)
             self.report.report_html_args['error'] = f"Error: {exc}"
 
             if self.grading_rubric.log_mode:
@@ -193,22 +233,6 @@ class BaseStrategy:
         return self.sub_document.formula_wb[self.sheet_name] if not computed \
             else self.sub_document.computed_value_wb[self.sheet_name]
 
-    def try_get_key_and_sub(self, computed=True):
-        """
-        Attempt to load both key and submission sheet according to `sheet_name`. Log any exception if occurs to report.
-        :param computed: Should return the sheet with computed cells rather than formula strings
-        :param report: the report to log any exception
-        :return: the key sheet and submission sheet, None if execption occurs
-        """
-        try:
-            key_sheet = self.get_key_sheet(computed)
-            sub_sheet = self.get_sub_sheet(computed)
-        except Exception as exc:
-            self.report.append_line(f"{self.report_line_prefix}{exc}")
-            self.report.report_html_args['error'] = exc
-            return None, None
-        return key_sheet, sub_sheet
-
     def value_matches(self, key_value, sub_value):
         """
         Returns boolean whether the passed `sub_value` match the `key_value`. If both of them are numeric and there's
@@ -218,6 +242,11 @@ class BaseStrategy:
         :param sub_value: Any value.
         :return: True if they match, False otherwise.
         """
+        # Numeric evaluations of formulas are rounded floats: on a boundary of the comparison, compare their Sympy
+        # evaluations instead, so the result doesn't depend on how the formula was evaluated.
+        if (isinstance(key_value, NumericValue) or isinstance(sub_value, NumericValue)) \
+                and self.is_on_boundary(key_value, sub_value):
+            key_value, sub_value = get_exact_value(key_value), get_exact_value(sub_value)
 
         # Best case: both are equals by default
         if key_value == sub_value:
@@ -238,26 +267,45 @@ class BaseStrategy:
             # TODO: Check if we should log an error here.
             return False
 
+    def is_on_boundary(self, key_value, sub_value):
+        """
+        Returns boolean whether the passed `sub_value` is, apart from floating point rounding, equal to the
+        `key_value` or on a bound of the `constant_delta` range around it, i.e. where `value_matches` depends on
+        rounding.
+
+        :param key_value: Any value.
+        :param sub_value: Any value.
+        :return: True if both values are numbers on a boundary, False otherwise.
+        """
+        try:
+            key_float = float(key_value)
+            sub_float = float(sub_value)
+        except (TypeError, ValueError):
+            return False
+
+        bounds = [key_float]
+        if self.grading_rubric.constant_delta is not None:
+            delta = self.grading_rubric.constant_delta
+            bounds += [key_float - delta, key_float + delta]
+        return any(math.isclose(sub_float, bound, rel_tol=1e-9, abs_tol=1e-12) for bound in bounds)
+
     def prereq_check(self):
         """
-        Checks if the pre-requistes mentioned are correct or not the
-        :param cell_coord: current correct cell coordinate to be added to correct cells list
-        :return: True if the pre-requistes
+        Checks if the pre-requistes mentioned are correct or not, and reports them if they aren't.
+        :return: True if the pre-requistes are correct
         """
         if self.grading_rubric.prereq_cells is None or len(self.grading_rubric.prereq_cells) == 0:
             return True
 
-        if len(self.correct_cells)>0:
-            prereq_check = all(item in self.correct_cells for item in self.grading_rubric.prereq_cells)
-        else:
-            prereq_check = False
+        prereq_check = all(item in self.correct_cells for item in self.grading_rubric.prereq_cells)
 
-        if len(self.grading_rubric.prereq_cells) == 1:
-            prereq_string = 'Cell '+' '.join(self.grading_rubric.prereq_cells)
-        else:
-            prereq_string = 'Cells '+', '.join(self.grading_rubric.prereq_cells)
         if not prereq_check:
-            self.report.append_line(f"{self.report_line_prefix} "+ prereq_string + " must be correct before this cell can be graded!")
+            if len(self.grading_rubric.prereq_cells) == 1:
+                prereq_string = 'Cell '+' '.join(self.grading_rubric.prereq_cells)
+            else:
+                prereq_string = 'Cells '+', '.join(self.grading_rubric.prereq_cells)
+            self.report.append_line("{} {} must be correct before this cell can be graded!", self.report_line_prefix,
+                                    prereq_string)
             self.report.report_html_args['feedback'] = f" "+ prereq_string + " must be correct before this cell can be graded!"
 
         return prereq_check
@@ -288,15 +336,14 @@ class BaseStrategy:
         else:
             lowercased_formula = transform_excel_formula_to_sympy(key_raw_formula)
             
-            # extract input coordinates
-            input_coords = parse_formula_inputs(key_raw_formula, encoded=False)
-            encoded_inputs = {encode_cell_reference(coord): sub_sheet[coord].value for coord in input_coords}
-            local_dict = get_excel_formula_lambdas()
-            local_dict.update(encoded_inputs)
-
-            result = parse_formula(lowercased_formula, local_dict)
-            local_dict.clear()
-            r = result
+            # extract input values, reading each range at once instead of cell by cell
+            compiled = compile_formula(lowercased_formula, expand_ranges=False)
+            encoded_inputs = {
+                name: list(chain.from_iterable(get_range_values(sub_sheet, decode_range_reference(name))))
+                if name in compiled.ranges else sub_sheet[decode_cell_reference(name)].value
+                for name in compiled.arguments
+            }
+            r = evaluate_formula(lowercased_formula, encoded_inputs, expand_ranges=False)
         
         return r
 
@@ -311,36 +358,10 @@ class BaseStrategy:
 
         for concat in all_concats:
             # e.g.
-            # concat = 'A1:B1' 
-            # split -> [ 'A1', 'B1' ]
-            # regex sub parsing -> [ ('A', 1), ('B', 1) ] 
-            # column index from string -> [ (1, 1), (2, 1) ]
-            # chain + unpack -> [ 1, 1, 2, 1 ]
-
-            bounds = concat.split(':') 
-            first_col, first_num, last_col, last_num = list(
-                chain(
-                    *[
-                        ( 
-                            column_index_from_string(self.re.sub(r"[^A-Za-z]", "", bound).upper()), 
-                            int(self.re.sub(r"[^0-9]", "", bound))
-                        )
-                        for bound in bounds
-                    ]
-                )
-            )
-            
-            tgt_kwargs[concat] = [    
-                sub_sheet[f'{get_column_letter(col_idx)}{num}'.upper()].value 
-                
-                for col_idx in range(
-                    first_col, 
-                    last_col + 1
-                ) 
-                for num in range(
-                    first_num, 
-                    last_num + 1
-                )
-            ]
+            # concat = 'A1:B2'
+            # rows -> [ (A1, B1), (A2, B2) ]
+            # column by column -> [ A1, A2, B1, B2 ]
+            rows = get_range_values(sub_sheet, concat)
+            tgt_kwargs[concat] = [value for column in zip(*rows) for value in column]
 
         return parse_from_excel(key_raw_formula, **tgt_kwargs)
@@ -6,6 +6,10 @@ class CheckStrategy(BaseStrategy):
     This instance will check the alternative cells in the key if the submission value didn't match the key value
         in the main cell.
     """
+    REPORT_DESCRIPTION = "check result comparison "
+    HTML_RUBRIC_TYPE = "Result check"
+    HTML_PENALTY_RUBRIC_TYPE = "Result check (penalty)"
+
     def get_submitted_value(self):
         key_raw_formula = self.key_sheet_raw[self.cell_coord].value
         return self.get_formula_value(self.sub_sheet_compute, key_raw_formula, self.grading_rubric.parse_excel)
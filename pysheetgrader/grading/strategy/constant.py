@@ -7,6 +7,10 @@ class ConstantStrategy(BaseStrategy):
     This instance will check the alternative cells in the key if the submission value didn't match the key value
         in the main cell.
     """
+    REPORT_DESCRIPTION = "constant value comparison"
+    HTML_RUBRIC_TYPE = "Value check"
+    HTML_PENALTY_RUBRIC_TYPE = "Value check (penalty)"
+
     def get_submitted_value(self):
         return self.sub_sheet_compute[self.cell_coord].value
 
@@ -0,0 +1,50 @@
+from pysheetgrader.custom_excel_formula import get_excel_formula_lambdas
+
+
+class SheetContext:
+    """
+    State shared by the strategies grading the rubrics of a sheet of a submission: the key and submission sheets,
+    resolved once for the sheet instead of once per rubric, the custom formulas, the correct cells so far, and the
+    grader options used by some strategies.
+    """
+
+    def __init__(self, key_document, sub_document, sheet_name: str, correct_cells=None, equivalence_budget=None,
+                 verdict_cache=None):
+        """
+        Initializer of this class.
+        :param key_document: Document instance that used as a key.
+        :param sub_document: Document instance that will be graded as a submission.
+        :param sheet_name: String value of the sheet that will be graded.
+        :param correct_cells: Set of the coordinates of the cells graded as correct so far. Defaults to None, which
+            uses an empty set.
+        :param equivalence_budget: EquivalenceBudget instance limiting the formula comparison. Defaults to None.
+        :param verdict_cache: VerdictCache instance shared by the graded submissions. Defaults to None.
+        """
+        self.key_document = key_document
+        self.sub_document = sub_document
+        self.sheet_name = sheet_name
+        self.correct_cells = correct_cells if correct_cells is not None else set()
+        self.equivalence_budget = equivalence_budget
+        self.verdict_cache = verdict_cache
+        self.custom_formulas = get_excel_formula_lambdas()
+
+        # Exceptions raised while resolving the sheets, reported by every strategy of the sheet.
+        self.errors = []
+        self.key_sheet_compute, self.sub_sheet_compute = self.try_get_key_and_sub(computed=True)
+        self.key_sheet_raw, self.sub_sheet_raw = self.try_get_key_and_sub(computed=False)
+
+    def try_get_key_and_sub(self, computed=True):
+        """
+        Attempt to load both key and submission sheet according to `sheet_name`. Keeps any exception in `errors`.
+        :param computed: Should return the sheet with computed cells rather than formula strings
+        :return: the key sheet and submission sheet, None if execption occurs
+        """
+        try:
+            key_sheet = self.key_document.formula_wb[self.sheet_name] if not computed \
+                else self.key_document.computed_value_wb[self.sheet_name]
+            sub_sheet = self.sub_document.formula_wb[self.sheet_name] if not computed \
+                else self.sub_document.computed_value_wb[self.sheet_name]
+        except Exception as exc:
+            self.errors.append(exc)
+            return None, None
+        return key_sheet, sub_sheet
@@ -1,5 +1,6 @@
 from pysheetgrader.grading.strategy.base import BaseStrategy
-from sympy import simplify
+from pysheetgrader.equivalence import EquivalenceBudget, check_equivalence
+from pysheetgrader.verdict_cache import VerdictCache
 
 
 class NaiveFormulaStrategy(BaseStrategy):
@@ -7,15 +8,59 @@ class NaiveFormulaStrategy(BaseStrategy):
     Naively compare whether the formula between key and submission is the same when they're simplified.
     This instance will check the alternative cells in the key if the submission formula didn't match the key formula
         in the main cell.
+
+    The formulas are compared with `check_equivalence()`, and the tier that decided is added to the report HTML
+        arguments as `equivalence_tier`. Verdicts are reused from the VerdictCache, if any, before the formulas are
+        parsed.
     """
+    REPORT_DESCRIPTION = "formula comparison"
+    HTML_RUBRIC_TYPE = "Formula check"
+    HTML_PENALTY_RUBRIC_TYPE = "Formula check (penalty)"
+    REPORT_LINE_PREFIX = "\t"
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializer of this class. Accepts the arguments of BaseStrategy, and uses the EquivalenceBudget limiting the
+            formula comparison and the VerdictCache shared by the graded submissions of the SheetContext. Formulas
+            are compared every time if the VerdictCache is None.
+        """
+        super().__init__(*args, **kwargs)
+        self.equivalence_budget: EquivalenceBudget = self.context.equivalence_budget
+        self.verdict_cache: VerdictCache = self.context.verdict_cache
+        self.sub_expression = None
 
     def get_submitted_value(self):
-        sub_cell_value = self.sub_sheet_raw[self.cell_coord].value
-        return self.parse_formula(sub_cell_value, local_dict=self.custom_formulas)
+        # The formulas are only parsed by `check_correct()` if their verdict isn't cached.
+        return self.get_cell_formula(self.sub_sheet_raw, self.cell_coord)
 
     def check_correct(self, sub_cell_value, key_cell_value, key_coord):
-        return simplify(key_cell_value - sub_cell_value) == 0
+        delta = self.grading_rubric.constant_delta
+        result = self.verdict_cache.get(key_cell_value, sub_cell_value, delta) if self.verdict_cache else None
+
+        if result is None:
+            if self.sub_expression is None:
+                self.sub_expression = self.parse_formula(sub_cell_value, local_dict=self.custom_formulas)
+            key_expression = self.parse_formula(key_cell_value, local_dict=self.custom_formulas)
+
+            result = check_equivalence(key_expression, self.sub_expression, self.equivalence_budget)
+            if self.verdict_cache:
+                self.verdict_cache.put(key_cell_value, sub_cell_value, delta, result)
+
+        self.report.report_html_args['equivalence_tier'] = result.tier.value
+        return result.is_equivalent
 
     def get_key_value(self, key_coord):
-        key_cell_value = self.key_sheet_raw[key_coord].value
-        return self.parse_formula(key_cell_value, local_dict=self.custom_formulas)
+        return self.get_cell_formula(self.key_sheet_raw, key_coord)
+
+    @staticmethod
+    def get_cell_formula(sheet, cell_coord):
+        """
+        Returns the raw formula of the passed cell.
+        :param sheet: Worksheet instance of the raw values.
+        :param cell_coord: String value of the cell coordinate.
+        :return: String value of the formula. Raises ValueError, like `parse_formula`, if the cell has no formula.
+        """
+        formula = sheet[cell_coord].value
+        if not formula or not isinstance(formula, str):
+            raise ValueError(f"Expected formula, got {formula}")
+        return formula
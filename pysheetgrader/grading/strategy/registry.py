@@ -0,0 +1,69 @@
+from importlib.metadata import entry_points
+from types import MappingProxyType
+import sys
+
+from pysheetgrader.grading.rubric import GradingRubricType
+from pysheetgrader.grading.strategy.assertion import AssertionStrategy
+from pysheetgrader.grading.strategy.check import CheckStrategy
+from pysheetgrader.grading.strategy.constant import ConstantStrategy
+from pysheetgrader.grading.strategy.formula import NaiveFormulaStrategy
+from pysheetgrader.grading.strategy.relative import RelativeStrategy
+from pysheetgrader.grading.strategy.relative_f import RelativeFormulaStrategy
+from pysheetgrader.grading.strategy.soft import SoftFormulaStrategy
+from pysheetgrader.grading.strategy.test import TestRunStrategy
+
+# Entry point group of the strategies provided by other packages. The name of each entry point is a rubric type, as
+# written in rubric notes (e.g. "formula"), and its value a BaseStrategy subclass, which replaces the built-in one.
+STRATEGY_ENTRY_POINT_GROUP = 'pysheetgrader.strategies'
+
+
+"""
+Static registry of this file, built once. Please use `get_strategies()` to retrieve it instead of accessing it
+    directly.
+"""
+___strategies = None
+
+
+def get_strategies():
+    """
+    Returns the read-only registry of grading strategies: the built-in ones, replaced by the ones registered under the
+    STRATEGY_ENTRY_POINT_GROUP entry point group, if any.
+    :return: Read-only dictionary of {GradingRubricType: BaseStrategy subclass}.
+    """
+    global ___strategies
+
+    # If it's already initialized, then early return.
+    if ___strategies is not None:
+        return ___strategies
+
+    strategies = {
+        GradingRubricType.CONSTANT: ConstantStrategy,
+        GradingRubricType.FORMULA: NaiveFormulaStrategy,
+        GradingRubricType.TEST: TestRunStrategy,
+        GradingRubricType.SOFT_FORMULA: SoftFormulaStrategy,
+        GradingRubricType.RELATIVE: RelativeStrategy,
+        GradingRubricType.RELATIVE_F: RelativeFormulaStrategy,
+        GradingRubricType.CHECK: CheckStrategy,
+        GradingRubricType.ASSERTION: AssertionStrategy,
+    }
+    # Python < 3.10 returns a dictionary of {group: entry points}, and doesn't support selecting the group.
+    eps = entry_points()
+    group_eps = eps.select(group=STRATEGY_ENTRY_POINT_GROUP) if hasattr(eps, 'select') \
+        else eps.get(STRATEGY_ENTRY_POINT_GROUP, ())
+    for entry_point in group_eps:
+        try:
+            strategies[GradingRubricType.type_from_string(entry_point.name)] = entry_point.load()
+        except Exception as exc:
+            print(f"Exception when loading grading strategy {entry_point.name}: {exc}", file=sys.stderr)
+    ___strategies = MappingProxyType(strategies)
+
+    return ___strategies
+
+
+def get_strategy(rubric_type: GradingRubricType):
+    """
+    Returns the grading strategy of the passed rubric type.
+    :param rubric_type: GradingRubricType enum value, or None.
+    :return: BaseStrategy subclass, or None if there's none for the rubric type.
+    """
+    return get_strategies().get(rubric_type)
@@ -19,6 +19,11 @@ class RelativeStrategy(BaseStrategy):
 
     Thus, A1 doesn't pass.
     """
+    REPORT_DESCRIPTION = "relative comparison (accept both constant and formula cell)"
+    HTML_RUBRIC_TYPE = "Relative formula check (accept both constant and formula cell)"
+    HTML_PENALTY_RUBRIC_TYPE = "Relative formula check (accept both constant and formula cell) (penalty)"
+    REPORT_LINE_PREFIX = "\t"
+
     def get_submitted_value(self):
         return self.sub_sheet_compute[self.cell_coord].value
 
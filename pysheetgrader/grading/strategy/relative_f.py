@@ -6,6 +6,10 @@ class RelativeFormulaStrategy(RelativeStrategy):
     Like the RelativeStrategy but requires the evaluated submission cell to be a formula. If the
     evaluated cell is a hardcoded constant, the student will not get score.
     """
+    REPORT_DESCRIPTION = "relative comparison (only accept formula cell)"
+    HTML_RUBRIC_TYPE = "Relative formula check (only accept formula cell)"
+    HTML_PENALTY_RUBRIC_TYPE = "Relative formula (penalty)"
+
     def additional_fail_check(self):
         if not self.sub_sheet_raw or not isinstance(self.sub_sheet_raw, str):
             # student doesn't receive score if hardcoded a constant
@@ -7,6 +7,11 @@ class SoftFormulaStrategy(ConstantStrategy):
     2. If the cell contains a formula, grade it like a constant formula
         (compare cell's evaluated result to key's evaluated result)
     """
+    REPORT_DESCRIPTION = "soft formula comparison"
+    HTML_RUBRIC_TYPE = "Soft formula check"
+    HTML_PENALTY_RUBRIC_TYPE = "Soft Formula Check (penalty)"
+    REPORT_LINE_PREFIX = "\t"
+
     def get_submitted_value(self):
         return self.sub_sheet_raw[self.cell_coord].value
 
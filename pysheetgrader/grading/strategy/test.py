@@ -1,9 +1,11 @@
 from pysheetgrader.grading.strategy.base import BaseStrategy
 from pysheetgrader.grading.test_case import GradingTestCase
 from pysheetgrader.formula_parser import parse_formula
+from pysheetgrader.formula_parser import compile_formula, is_number, is_same_number
 from pysheetgrader.formula_parser import encode_cell_reference
 from pysheetgrader.formula_parser import transform_excel_formula_to_sympy
-from pysheetgrader.custom_excel_formula import get_excel_formula_lambdas
+from pysheetgrader.custom_excel_formula import create_formula_scope
+import numpy
 import re
 
 
@@ -11,6 +13,16 @@ class TestRunStrategy(BaseStrategy):
     """
     Runs all available test for the corresponding rubric.
     """
+    REPORT_DESCRIPTION = "test case runs"
+    HTML_RUBRIC_TYPE = "Test runs"
+    HTML_PENALTY_RUBRIC_TYPE = "Test Runs check (penalty)"
+    REPORT_LINE_PREFIX = "\t\t"
+
+    @classmethod
+    def append_header_lines(cls, report, rubric):
+        super().append_header_lines(report, rubric)
+        report.append_line("\t- Test cases:")
+
     def printTestCase(test_case):
         print('name: {} \n expected output : {}\n output delta: {}\n inputs: {}\n fail msf: {}'.format(test_case.name,test_case.expected_output,test_case.output_delta
                                                                                                        , test_case.inputs, test_case.failmsg))
@@ -20,10 +32,10 @@ class TestRunStrategy(BaseStrategy):
         report = self.create_initial_report()
         html_args = {'test_cases': [], 'all_test_pass': False}
 
-        # Retrieving sheets
-        _, sub_sheet = self.try_get_key_and_sub(report, computed=False)
+        # Retrieving sheets. Errors are already in the initial report of this instance.
+        sub_sheet = self.sub_sheet_raw
         if sub_sheet is None:
-            return report
+            return self.report
 
         # Grading cells
         cell_coord = self.grading_rubric.cell_coord
@@ -36,7 +48,8 @@ class TestRunStrategy(BaseStrategy):
        
         all_test_pass = True
         feedback = None
-        for test_case in self.grading_rubric.test_cases:
+        batch_runs = self.test_run_match_all(self.grading_rubric.test_cases, sub_raw_formula)
+        for index, test_case in enumerate(self.grading_rubric.test_cases):
             
             significant = len(str(test_case.expected_output).split('.')[-1])
             
@@ -44,7 +57,9 @@ class TestRunStrategy(BaseStrategy):
             test_case_html_args = {'success': False, 'error': '', 'feedback': '', 'name': test_case.name}
             result_suffix = "PASS"
             try:
-                result_match, result, lower_range, upper_range = self.test_run_match(test_case, sub_raw_formula)
+                batch_run = batch_runs[index] if batch_runs is not None else None
+                result_match, result, lower_range, upper_range = batch_run if batch_run is not None \
+                    else self.test_run_match(test_case, sub_raw_formula)
                 actual_result = float(str(result))
                     
                 if not result_match:
@@ -65,15 +80,15 @@ class TestRunStrategy(BaseStrategy):
                 test_case_html_args['error'] = result_suffix
 
             if not self.grading_rubric.hidden:
-                report.append_line(f"{self.report_line_prefix}- {test_case.name}: {result_suffix}")
+                report.append_line("{}- {}: {}", self.report_line_prefix, test_case.name, result_suffix)
                 if feedback is not None:
-                    report.append_line(f"{self.report_line_prefix}- {test_case.name} feedback: {feedback}")
+                    report.append_line("{}- {} feedback: {}", self.report_line_prefix, test_case.name, feedback)
 
             html_args['test_cases'].append(test_case_html_args)
 
         if all_test_pass:
             report.submission_score = self.grading_rubric.score
-            self.grading_rubric.is_correct = True
+            self.result.is_correct = True
         html_args['all_test_pass'] = all_test_pass
 
         report.report_html_args = html_args
@@ -94,9 +109,7 @@ class TestRunStrategy(BaseStrategy):
         lowercased_formula = transform_excel_formula_to_sympy(sub_raw_formula)
         encoded_inputs = {encode_cell_reference(cell_coord).lower(): raw_inputs[cell_coord]
                           for cell_coord in raw_inputs}
-        local_dict = get_excel_formula_lambdas()
-        local_dict.update(encoded_inputs)
-    
+        local_dict = create_formula_scope(encoded_inputs)
 
         result = parse_formula(lowercased_formula, local_dict=local_dict)
         
@@ -111,6 +124,74 @@ class TestRunStrategy(BaseStrategy):
 
         return result_match, result, expected_lower_range, expected_upper_range
 
+    def test_run_match_all(self, test_cases: [GradingTestCase], sub_raw_formula: str):
+        """
+        Runs all the passed test cases against the passed formula at once: the formula is compiled into a NumPy
+        function (see `CompiledFormula.get_numeric_function`) and evaluated over the input values of every test
+        case in a single call, then the results are compared with the expected ranges as arrays.
+
+        The results are compared with the expected ranges like `test_run_match()` does. Since they're floats
+        instead of exact Sympy numbers, test cases whose result is on a bound of the expected range, apart from
+        floating point rounding, are left to `test_run_match()`, like failing test cases, whose results are reported.
+        Only the test cases whose result is inside the expected range are decided this way. The result of the first
+        test case is also checked against `test_run_match()`.
+
+        Will return None if the formula can't be evaluated this way, e.g. if it's not a numeric formula, an input is
+        missing or isn't a number, a result isn't finite, or the first result doesn't match. The test cases should
+        then be run one by one.
+
+        :param test_cases: List of GradingTestCase instances.
+        :param sub_raw_formula: String of the raw formula.
+        :return: List of tuples of (Boolean, Float, Float, Float) like `test_run_match()`, or None for the test cases
+            that should be run one by one, in the order of `test_cases`. Returns None instead of a list if the formula
+            can't be evaluated at once.
+        """
+        if not test_cases:
+            return None
+
+        try:
+            compiled = compile_formula(transform_excel_formula_to_sympy(sub_raw_formula))
+            numeric_function = compiled.get_numeric_function(modules='numpy')
+            if numeric_function is None:
+                return None
+
+            case_inputs = [{encode_cell_reference(cell_coord).lower(): value
+                            for cell_coord, value in test_case.inputs.items()} for test_case in test_cases]
+            if not all(name in inputs and is_number(inputs[name])
+                       for inputs in case_inputs for name in compiled.arguments):
+                return None
+
+            columns = [numpy.array([inputs[name] for inputs in case_inputs], dtype=float)
+                       for name in compiled.arguments]
+            with numpy.errstate(all='ignore'):
+                results = numpy.broadcast_to(numpy.asarray(numeric_function(*columns), dtype=float),
+                                             (len(test_cases),))
+        except Exception:
+            return None
+
+        if not numpy.all(numpy.isfinite(results)):
+            return None
+
+        try:
+            _, first_result, _, _ = self.test_run_match(test_cases[0], sub_raw_formula)
+        except Exception:
+            return None
+        if not is_same_number(float(results[0]), first_result):
+            compiled.discard_numeric_function(modules='numpy')
+            return None
+
+        expected_outputs = numpy.array([test_case.expected_output for test_case in test_cases], dtype=float)
+        output_deltas = numpy.array([test_case.output_delta or 0 for test_case in test_cases], dtype=float)
+        lower_ranges = expected_outputs - output_deltas
+        upper_ranges = expected_outputs + output_deltas
+        on_bounds = numpy.isclose(results, lower_ranges, rtol=1e-9, atol=1e-12) \
+            | numpy.isclose(results, upper_ranges, rtol=1e-9, atol=1e-12)
+        result_matches = (lower_ranges <= results) & (results <= upper_ranges) & ~on_bounds
+
+        return [(True, float(result), float(lower_range), float(upper_range)) if match else None
+                for match, result, lower_range, upper_range
+                in zip(result_matches, results, lower_ranges, upper_ranges)]
+
     def failure_message_testcase(self, document, sheet_name, fail_msg_template: str):
         """
         Render generic failure message with failure message template. For example, if template is
@@ -1,8 +1,14 @@
+from types import MappingProxyType
+
+
 class GradingTestCase:
     """
     Represents a test case for the formula inside of a cell.
     Currently only work for a numeric inputs and output.
+
+    Instances are read-only, so the test cases of a key can be shared by concurrent gradings.
     """
+    __slots__ = ('name', 'expected_output', 'output_delta', 'inputs', 'failmsg')
 
     def __init__(self, name: str, expected_output: float, inputs: dict, output_delta: float = 0, failmsg: str = ""):
         """
@@ -12,8 +18,18 @@ class GradingTestCase:
         :param inputs: Dictionary of {str: float} with cell reference as key and the float input value as related value.
         :param output_delta: Flaot value of the delta for the expected output. Defaults to 0.
         """
-        self.name = name
-        self.expected_output = expected_output
-        self.output_delta = output_delta
-        self.inputs = inputs
-        self.failmsg = failmsg
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'expected_output', expected_output)
+        object.__setattr__(self, 'output_delta', output_delta)
+        object.__setattr__(self, 'inputs', MappingProxyType(dict(inputs)))
+        object.__setattr__(self, 'failmsg', failmsg)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"GradingTestCase is read-only, can't set '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"GradingTestCase is read-only, can't delete '{name}'")
+
+    def __reduce__(self):
+        # Read-only proxies can't be pickled, so test cases are pickled as their initializer arguments.
+        return GradingTestCase, (self.name, self.expected_output, dict(self.inputs), self.output_delta, self.failmsg)
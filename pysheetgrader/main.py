@@ -1,12 +1,37 @@
 from cgi import test
-import click, os, datetime
+import click, os, datetime, json
+import importlib.util
 import warnings
 
 from pysheetgrader.document import Document
+from pysheetgrader.compiled_key import CompiledKey, compile_key, load_key_document
 from pysheetgrader.grader import Grader
+from pysheetgrader.equivalence import EquivalenceBudget
+from pysheetgrader.verdict_cache import VerdictCache
+from pysheetgrader.gradebook import Gradebook
+from pysheetgrader.stats import ClassStatistics
+from pysheetgrader.profiler import profiled, start_profiler, stop_profiler
 
 
-@click.command()
+class DefaultCommandGroup(click.Group):
+    """
+    Click group that falls back to the `grade` command when the first argument is not one of its subcommands,
+    so the original `pysheetgrader KEY_DOCUMENT_PATH SUBMISSION_DOCUMENT_PATH` invocation keeps working.
+    """
+    DEFAULT_COMMAND_NAME = 'grade'
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args.insert(0, self.DEFAULT_COMMAND_NAME)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """ PySheetGrader: grades spreadsheet submissions against a key spreadsheet."""
+
+
+@cli.command()
 @click.argument('key_document_path',
                 type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
 @click.argument('submission_document_path',
@@ -17,13 +42,33 @@ from pysheetgrader.grader import Grader
               help="File path where the detailed report will be saved.")
 @click.option('--html-report-output', type=click.Path(writable=True),
               help="File path where the rendered HTML report will be saved.")
+@click.option('--json-report-output', type=click.Path(writable=True),
+              help="File path where the report will be saved as JSON.")
 @click.option('-v', '--verbose', is_flag=True, help="Print grading details verbosely in stdout")
 @click.option('-i', '--ignore-warnings', is_flag=True, help="Should suppress warnings from depending modules")
 @click.option('-T', '--test-mode', is_flag=True, help="Run the autograder in test mode")
 @click.option('-d', '--debug-mode', is_flag=True, help="Run the autograder in debug mode")
 @click.option('-l', '--log-mode', is_flag=True, help="Run the autograder in log mode")
-def cli(key_document_path, submission_document_path, score_output, report_output, html_report_output, verbose,
-        ignore_warnings, test_mode, debug_mode, log_mode):
+@click.option('--simplify-timeout', type=click.FloatRange(min=0), default=10.0, show_default=True,
+              help="Seconds a formula comparison may spend expanding and simplifying before the submission is "
+                   "marked as incorrect. "
+                   "0 disables the limit.")
+@click.option('--simplify-max-ops', type=click.IntRange(min=0), default=500, show_default=True,
+              help="Operations in a pair of formulas above which they're not expanded or simplified, and the "
+                   "submission is marked as incorrect unless they're identical. "
+                   "0 disables the limit.")
+@click.option('--verdict-cache', 'verdict_cache_path', type=click.Path(dir_okay=False, writable=True),
+              help="SQLite file where formula comparison verdicts are cached, to be reused by later runs.")
+@click.option('--profile', 'profile_output', type=click.Path(dir_okay=False, writable=True),
+              help="File path where the wall and CPU time of each grading phase will be saved as JSON.")
+@click.option('--profile-trace', 'profile_trace_output', type=click.Path(dir_okay=False, writable=True),
+              help="File path where the grading phases will be saved as Chrome trace events. Requires --profile.")
+@click.option('-R', '--recalculate', is_flag=True,
+              help="Compute the values of submission formula cells that have no value cached by the spreadsheet "
+                   "application, e.g. in files exported by scripts.")
+def grade(key_document_path, submission_document_path, score_output, report_output, html_report_output,
+          json_report_output, verbose, ignore_warnings, test_mode, debug_mode, log_mode, simplify_timeout,
+          simplify_max_ops, verdict_cache_path, profile_output, profile_trace_output, recalculate):
     """ Grades the passed spreadsheet in SUBMISSION_DOCUMENT_PATH using the key spreadsheet from KEY_DOCUMENT_PATH."""
 
     print("PySheetGrader!")
@@ -35,10 +80,13 @@ def cli(key_document_path, submission_document_path, score_output, report_output
     if ignore_warnings:
         warnings.filterwarnings(action='ignore')
 
-    key_doc = Document(key_document_path, read_only=False)
-    sub_doc = Document(submission_document_path, read_only=True)
+    profiler = start_profiling(profile_output, profile_trace_output)
+    key_doc = load_key_document(key_document_path)
+    budget = EquivalenceBudget(simplify_max_ops or None, simplify_timeout or None)
+    verdict_cache = VerdictCache(verdict_cache_path)
+    grader = Grader(key_doc, test_mode, debug_mode, log_mode, budget, verdict_cache, recalculate)
+    sub_doc = grader.open_submission(submission_document_path)
 
-    grader = Grader(key_doc, test_mode, debug_mode, log_mode)
     report = grader.grade(sub_doc)
 
     if verbose:
@@ -54,9 +102,203 @@ def cli(key_document_path, submission_document_path, score_output, report_output
 
     if html_report_output:
         save_html_report(report, html_report_output)
+
+    if json_report_output:
+        save_json_report(report, json_report_output)
         
     key_doc.close()
     sub_doc.close()
+    verdict_cache.close()
+
+    if profiler is not None:
+        save_profile(profiler, profile_output, profile_trace_output)
+
+
+@cli.command()
+@click.argument('key_document_path',
+                type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
+@click.argument('submission_paths', nargs=-1, required=True,
+                type=click.Path(exists=True, file_okay=True, dir_okay=True, readable=True))
+@click.option('-o', '--output-dir', required=True, type=click.Path(file_okay=False, writable=True),
+              help="Directory where the per-submission outputs and the gradebook will be saved.")
+@click.option('--report', 'write_reports', is_flag=True,
+              help="Save the detailed report of each submission in the output directory.")
+@click.option('--html-report', 'write_html_reports', is_flag=True,
+              help="Save the rendered HTML report of each submission in the output directory.")
+@click.option('--json-report', 'write_json_reports', is_flag=True,
+              help="Save the report of each submission as JSON in the output directory.")
+@click.option('--arrow-gradebook', 'write_arrow_gradebook', is_flag=True,
+              help="Also save the gradebook as an Arrow IPC stream in the output directory. Requires pyarrow.")
+@click.option('--stats', 'write_stats', is_flag=True,
+              help="Save statistics of the class (score distributions, pass rates and most frequent errors of each "
+                   "rubric) in the output directory, updated while the batch runs.")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of worker processes grading submissions in parallel.")
+@click.option('--max-tasks-per-worker', type=click.IntRange(min=1),
+              help="Number of submissions a worker process grades before it's replaced by a fresh one.")
+@click.option('-v', '--verbose', is_flag=True, help="Print grading details verbosely in stdout")
+@click.option('-i', '--ignore-warnings', is_flag=True, help="Should suppress warnings from depending modules")
+@click.option('-T', '--test-mode', is_flag=True, help="Run the autograder in test mode")
+@click.option('-d', '--debug-mode', is_flag=True, help="Run the autograder in debug mode")
+@click.option('-l', '--log-mode', is_flag=True, help="Run the autograder in log mode")
+@click.option('--simplify-timeout', type=click.FloatRange(min=0), default=10.0, show_default=True,
+              help="Seconds a formula comparison may spend expanding and simplifying before the submission is "
+                   "marked as incorrect. "
+                   "0 disables the limit.")
+@click.option('--simplify-max-ops', type=click.IntRange(min=0), default=500, show_default=True,
+              help="Operations in a pair of formulas above which they're not expanded or simplified, and the "
+                   "submission is marked as incorrect unless they're identical. "
+                   "0 disables the limit.")
+@click.option('--verdict-cache', 'verdict_cache_path', type=click.Path(dir_okay=False, writable=True),
+              help="SQLite file where formula comparison verdicts are cached, to be reused by later runs.")
+@click.option('--profile', 'profile_output', type=click.Path(dir_okay=False, writable=True),
+              help="File path where the wall and CPU time of each grading phase will be saved as JSON.")
+@click.option('--profile-trace', 'profile_trace_output', type=click.Path(dir_okay=False, writable=True),
+              help="File path where the grading phases will be saved as Chrome trace events. Requires --profile.")
+@click.option('-R', '--recalculate', is_flag=True,
+              help="Compute the values of submission formula cells that have no value cached by the spreadsheet "
+                   "application, e.g. in files exported by scripts.")
+def batch(key_document_path, submission_paths, output_dir, write_reports, write_html_reports, write_json_reports,
+          write_arrow_gradebook, write_stats, jobs, max_tasks_per_worker, verbose, ignore_warnings, test_mode,
+          debug_mode, log_mode, simplify_timeout, simplify_max_ops, verdict_cache_path, profile_output,
+          profile_trace_output, recalculate):
+    """ Grades every spreadsheet in SUBMISSION_PATHS (files, or directories of .xlsx files) using the key
+    spreadsheet from KEY_DOCUMENT_PATH. The key is loaded once for the whole batch."""
+
+    print("PySheetGrader!")
+    if test_mode:
+        print("==========Test Mode==========")
+    print(f"Key document path:\t\t{key_document_path}")
+
+    if ignore_warnings:
+        warnings.filterwarnings(action='ignore')
+
+    if write_arrow_gradebook and importlib.util.find_spec('pyarrow') is None:
+        raise click.UsageError("--arrow-gradebook requires the pyarrow package.")
+
+    document_paths = collect_submission_paths(submission_paths)
+    print(f"Submissions to grade:\t\t{len(document_paths)}")
+
+    profiler = start_profiling(profile_output, profile_trace_output)
+    if profiler is not None and jobs > 1:
+        print("Only the main process is profiled: the grading done by the worker processes isn't recorded.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    key_doc = load_key_document(key_document_path)
+    budget = EquivalenceBudget(simplify_max_ops or None, simplify_timeout or None)
+    verdict_cache = VerdictCache(verdict_cache_path)
+    grader = Grader(key_doc, test_mode, debug_mode, log_mode, budget, verdict_cache, recalculate)
+    arrow_gradebook_path = os.path.join(output_dir, "gradebook.arrows") if write_arrow_gradebook else None
+    gradebook = Gradebook(os.path.join(output_dir, "gradebook.csv"), grader.rubrics, arrow_gradebook_path)
+    stats = ClassStatistics(os.path.join(output_dir, "stats.json"), grader.rubrics) if write_stats else None
+
+    try:
+        for path, report in grader.grade_many(document_paths, jobs, max_tasks_per_worker):
+            name = os.path.splitext(os.path.basename(path))[0]
+            gradebook.append(name, report)
+            if stats is not None:
+                stats.append(report)
+
+            if report is None:
+                print(f"Grade of {name}:\tfailed to open or grade the submission")
+                continue
+
+            if verbose:
+                report.print_lines()
+
+            print(f"Grade of {name}:\t{report.submission_score} / {report.max_possible_score}")
+
+            save_score(report, os.path.join(output_dir, f"{name}_score.txt"))
+
+            if write_reports:
+                save_report(report, os.path.join(output_dir, f"{name}_report.txt"))
+
+            if write_html_reports:
+                save_html_report(report, os.path.join(output_dir, f"{name}_report.html"))
+
+            if write_json_reports:
+                save_json_report(report, os.path.join(output_dir, f"{name}_report.json"))
+    finally:
+        gradebook.close()
+        if stats is not None:
+            stats.close()
+        key_doc.close()
+        verdict_cache.close()
+
+    if profiler is not None:
+        save_profile(profiler, profile_output, profile_trace_output)
+
+
+@cli.command('compile-key')
+@click.argument('key_document_path',
+                type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
+@click.argument('output_path', required=False, type=click.Path(dir_okay=False, writable=True))
+@click.option('-f', '--force', is_flag=True, help="Compile the key even if the compiled key is up to date.")
+@click.option('-i', '--ignore-warnings', is_flag=True, help="Should suppress warnings from depending modules")
+@click.option('-l', '--log-mode', is_flag=True, help="Run the autograder in log mode")
+def compile_key_command(key_document_path, output_path, force, ignore_warnings, log_mode):
+    """ Compiles the key spreadsheet in KEY_DOCUMENT_PATH into a compiled key saved in OUTPUT_PATH, which can be
+    passed as the key of the other commands to skip parsing the key spreadsheet. Defaults to the key path with the
+    .pskey extension."""
+
+    if ignore_warnings:
+        warnings.filterwarnings(action='ignore')
+
+    output_path = output_path or CompiledKey.default_path(key_document_path)
+    if not force and CompiledKey.is_up_to_date(output_path, key_document_path):
+        print(f"Compiled key is up to date:\t{output_path}")
+        return
+
+    compile_key(key_document_path, output_path, log_mode)
+    print(f"Compiled key saved to:\t\t{output_path}")
+
+
+def start_profiling(profile_output, profile_trace_output):
+    """
+    Starts profiling the grading phases if a profile output path is passed.
+    :param profile_output: String value of the JSON profile output path, or None.
+    :param profile_trace_output: String value of the Chrome trace output path, or None.
+    :return: Profiler instance, or None if profiling isn't requested.
+    :exception click.UsageError: Raises a UsageError if only the trace output path is passed.
+    """
+    if profile_output is None:
+        if profile_trace_output is not None:
+            raise click.UsageError("--profile-trace requires --profile.")
+        return None
+
+    return start_profiler(trace=profile_trace_output is not None)
+
+
+def save_profile(profiler, profile_output, profile_trace_output):
+    """
+    Stops profiling and saves the recorded grading phases.
+    :param profiler: Profiler instance returned by `start_profiling()`.
+    :param profile_output: String value of the JSON profile output path.
+    :param profile_trace_output: String value of the Chrome trace output path, or None.
+    """
+    stop_profiler()
+    profiler.save(profile_output, profile_trace_output)
+    print(f"Profile saved to:\t\t{profile_output}")
+
+
+def collect_submission_paths(paths):
+    """
+    Expands the passed `paths` into a list of submission document paths. Directories are replaced by the .xlsx
+    files directly inside them (sorted by name), skipping Excel's temporary lock files.
+    :param paths: List of String values of file or directory paths.
+    :return: List of String values of submission document paths.
+    """
+    document_paths = []
+    for path in paths:
+        if not os.path.isdir(path):
+            document_paths.append(path)
+            continue
+
+        for file_name in sorted(os.listdir(path)):
+            if file_name.lower().endswith('.xlsx') and not file_name.startswith('~$'):
+                document_paths.append(os.path.join(path, file_name))
+
+    return document_paths
 
 
 def save_score(report, output_path):
@@ -69,6 +311,7 @@ def save_score(report, output_path):
         file.write(f"Assignment Score, {report.submission_score}\n")
 
 
+@profiled('render_text_report')
 def save_report(report, output_path):
     """
     Saves the report of the passed report to the output_path.
@@ -79,19 +322,54 @@ def save_report(report, output_path):
         file.writelines(report.report_lines)
 
 
+"""
+HTML report template, compiled once per process and shared by every report it renders. Please use
+`get_html_report_template()` to retrieve it instead of accessing it directly.
+"""
+___html_report_template = None
+
+
+def get_html_report_template():
+    """
+    Returns the compiled template of the HTML report. Jinja2 is only imported the first time it's needed.
+    :return: jinja2.Template instance.
+    """
+    global ___html_report_template
+
+    # If it's already initialized, then early return.
+    if ___html_report_template is not None:
+        return ___html_report_template
+
+    import jinja2
+    loader = jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), "template"))
+    env = jinja2.Environment(loader=loader)
+    ___html_report_template = env.get_template('report.html.jinja')
+    return ___html_report_template
+
+
+@profiled('render_html_report')
 def save_html_report(report, output_path):
     """
-    Save the HTML version of the passed report to the output_path
+    Save the HTML version of the passed report to the output_path. The page is streamed to the file as it's
+    rendered, instead of being built as one string first.
     :param report: GradingReport instance.
     :param output_path: String value of the output file path.
     :return:
     """
-    import jinja2
-    loader = jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), "template"))
-    env = jinja2.Environment(loader=loader)
+    template = get_html_report_template()
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M %p')
+
+    with open(output_path, 'w') as file:
+        file.writelines(template.generate(html_args=report.create_html_args(), now=now))
 
+
+@profiled('render_json_report')
+def save_json_report(report, output_path):
+    """
+    Save the JSON version of the passed report to the output_path. Values that aren't JSON types, e.g. errors, are
+    saved as strings.
+    :param report: GradingReport instance.
+    :param output_path: String value of the output file path.
+    """
     with open(output_path, 'w') as file:
-        template = env.get_template('report.html.jinja')
-        template.globals['now'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M %p')
-        rendered = template.render({'html_args': report.report_html_args})
-        file.write(rendered)
+        json.dump(report.to_dict(), file, indent=1, default=str)
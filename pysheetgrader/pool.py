@@ -0,0 +1,59 @@
+import multiprocessing
+import sys
+from traceback import print_exc
+
+from pysheetgrader.compiled_key import load_key_document
+
+# Grader of the current worker process, created once by `initialize_worker()`.
+_worker_grader = None
+
+
+def initialize_worker(key_document_path, grader_args):
+    """
+    Initializer of each worker process in the pool. Loads the key document and creates the Grader once, so every
+    submission graded by this worker reuses them.
+
+    :param key_document_path: String value of the key spreadsheet or compiled key path.
+    :param grader_args: Tuple of the Grader arguments following the key document.
+    """
+    # Imported here to avoid a circular import, since the Grader uses this module.
+    from pysheetgrader.grader import Grader
+
+    global _worker_grader
+    # The main process already warned about an outdated compiled key.
+    key_document = load_key_document(key_document_path, warn_outdated=False)
+    _worker_grader = Grader(key_document, *grader_args)
+
+
+def grade_in_worker(path):
+    """
+    Grades the submission document in `path` with the Grader of the current worker process.
+    :param path: String value of the submission document path.
+    :return: Tuple of (path, GradingReport), the same as the items of `Grader.grade_many()`. The GradingReport is
+        None if the submission couldn't be graded, so one submission can't stop the pool.
+    """
+    try:
+        return next(_worker_grader.grade_many([path]))
+    except Exception as exc:
+        print(f"Exception when grading submission {path}: {exc}", file=sys.stderr)
+        if getattr(_worker_grader, 'is_log', False):
+            print_exc()
+        return path, None
+
+
+def grade_in_pool(key_document_path, grader_args, document_paths, jobs, max_tasks_per_worker=None):
+    """
+    Grades the submission documents in `document_paths` using a pool of `jobs` worker processes.
+
+    :param key_document_path: String value of the key document path.
+    :param grader_args: Tuple of the Grader arguments following the key document.
+    :param document_paths: Iterable of String values of submission document paths.
+    :param jobs: Integer number of worker processes.
+    :param max_tasks_per_worker: Integer number of submissions graded by a worker before it's replaced by a fresh
+        one, to cap the memory growth of long batches. Defaults to None, which keeps the workers for the whole batch.
+    :return: Generator of (path, GradingReport) tuples, in the order of `document_paths`.
+    """
+    with multiprocessing.Pool(processes=jobs, initializer=initialize_worker,
+                              initargs=(key_document_path, grader_args),
+                              maxtasksperchild=max_tasks_per_worker) as pool:
+        yield from pool.imap(grade_in_worker, document_paths)
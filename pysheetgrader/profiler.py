@@ -0,0 +1,192 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+"""
+Profiler of the current process, set by `start_profiler()`. Please use `profile_phase()` to record phases instead of
+accessing it directly.
+"""
+___profiler = None
+
+# Returned by `profile_phase()` while profiling is off, so an unprofiled phase only costs a function call.
+NULL_PHASE = nullcontext()
+
+
+class Profiler:
+    """
+    Records the wall and CPU time of the phases of a grading run. Phases are nested: each phase is identified by its
+    path, e.g. `grade/rubric:FORMULA/comparison`, and its time includes the time of its nested phases.
+
+    The CPU time is the CPU time of the whole process (`time.process_time()`) during the phase.
+    """
+
+    def __init__(self, trace=False):
+        """
+        Initializer of this class.
+        :param trace: Boolean marker whether every recorded phase is also kept as a Chrome trace event. Defaults to
+            False, which only keeps the totals of each phase path.
+        """
+        self.phases = {}
+        self.stack = []
+        self.trace_events = [] if trace else None
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+
+    def phase(self, name, args=None):
+        """
+        Returns the context manager recording a phase nested in the current one.
+        :param name: String value of the phase name.
+        :param args: Dictionary of details of this occurrence of the phase, only kept in the trace events.
+            Defaults to None.
+        :return: ProfiledPhase instance.
+        """
+        return ProfiledPhase(self, name, args)
+
+    def record(self, path, name, start_wall_time, wall_time, cpu_time, args=None):
+        """
+        Records an occurrence of a phase.
+        :param path: String value of the phase path.
+        :param name: String value of the phase name.
+        :param start_wall_time: Float value of the `time.perf_counter()` when the phase started.
+        :param wall_time: Float seconds of wall time of the phase.
+        :param cpu_time: Float seconds of CPU time of the phase.
+        :param args: Dictionary of details of this occurrence of the phase. Defaults to None.
+        """
+        totals = self.phases.get(path)
+        if totals is None:
+            totals = self.phases[path] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += wall_time
+        totals[2] += cpu_time
+
+        if self.trace_events is not None:
+            event = {
+                'name': name,
+                'cat': path.split('/', 1)[0],
+                'ph': 'X',
+                'ts': (start_wall_time - self.start_wall_time) * 1e6,
+                'dur': wall_time * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+            }
+            if args:
+                event['args'] = args
+            self.trace_events.append(event)
+
+    def to_dict(self):
+        """
+        Returns the JSON-friendly representation of the recorded phases.
+        :return: Dictionary of the total wall and CPU time since this instance was created, and of the count, wall
+            time and CPU time of each phase path, sorted by path.
+        """
+        return {
+            'wall_time': time.perf_counter() - self.start_wall_time,
+            'cpu_time': time.process_time() - self.start_cpu_time,
+            'phases': {
+                path: {'count': count, 'wall_time': wall_time, 'cpu_time': cpu_time,
+                       'mean_wall_time': wall_time / count}
+                for path, (count, wall_time, cpu_time) in sorted(self.phases.items())
+            },
+        }
+
+    def save(self, output_path, trace_output_path=None):
+        """
+        Saves the recorded phases as JSON, and their trace events in the Chrome trace event format, which can be
+        opened in chrome://tracing or Perfetto.
+        :param output_path: String value of the JSON output file path.
+        :param trace_output_path: String value of the trace output file path. Defaults to None, which doesn't save
+            the trace events. Ignored if this instance doesn't keep them.
+        """
+        with open(output_path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=1)
+
+        if trace_output_path is not None and self.trace_events is not None:
+            with open(trace_output_path, 'w') as file:
+                json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, file)
+
+
+class ProfiledPhase:
+    """
+    Context manager recording the time of a phase in a Profiler.
+    """
+    __slots__ = ('profiler', 'name', 'args', 'path', 'start_wall_time', 'start_cpu_time')
+
+    def __init__(self, profiler: Profiler, name, args=None):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.path = None
+        self.start_wall_time = None
+        self.start_cpu_time = None
+
+    def __enter__(self):
+        stack = self.profiler.stack
+        self.path = f"{stack[-1]}/{self.name}" if stack else self.name
+        stack.append(self.path)
+        self.start_cpu_time = time.process_time()
+        self.start_wall_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self.start_wall_time
+        cpu_time = time.process_time() - self.start_cpu_time
+        self.profiler.stack.pop()
+        self.profiler.record(self.path, self.name, self.start_wall_time, wall_time, cpu_time, self.args)
+        return False
+
+
+def start_profiler(trace=False):
+    """
+    Starts profiling the phases of the current process.
+    :param trace: Boolean marker whether the trace events of the phases are kept, see `Profiler`. Defaults to False.
+    :return: Profiler instance recording the phases.
+    """
+    global ___profiler
+    ___profiler = Profiler(trace)
+    return ___profiler
+
+
+def stop_profiler():
+    """
+    Stops profiling the phases of the current process.
+    :return: Profiler instance that recorded the phases, or None if profiling wasn't started.
+    """
+    global ___profiler
+    profiler, ___profiler = ___profiler, None
+    return profiler
+
+
+def profile_phase(name, args=None):
+    """
+    Returns the context manager recording a phase, e.g. `with profile_phase('load_workbook'):`. While profiling is
+    off, it's a shared context manager doing nothing.
+    :param name: String value of the phase name.
+    :param args: Dictionary of details of this occurrence of the phase, only kept in the trace events.
+        Defaults to None.
+    :return: Context manager.
+    """
+    profiler = ___profiler
+    if profiler is None:
+        return NULL_PHASE
+    return profiler.phase(name, args)
+
+
+def profiled(name):
+    """
+    Decorator recording each call of the decorated function as a phase, see `profile_phase()`.
+    :param name: String value of the phase name.
+    :return: Decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = ___profiler
+            if profiler is None:
+                return function(*args, **kwargs)
+            with profiler.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
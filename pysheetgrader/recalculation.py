@@ -0,0 +1,123 @@
+from itertools import chain
+
+from openpyxl.utils.cell import rows_from_range
+from sympy.logic.boolalg import BooleanAtom
+
+from pysheetgrader.formula_parser import compile_formula, decode_cell_reference, decode_range_reference, \
+    evaluate_formula, parse_formula_inputs, transform_excel_formula_to_sympy
+
+
+def is_formula(value) -> bool:
+    """
+    Returns a Boolean value to identify whether the passed cell content is a formula.
+    :param value: Cell content, as read with openpyxl's `data_only=False`.
+    :return: Boolean value.
+    """
+    return isinstance(value, str) and value.startswith('=') and len(value) > 1
+
+
+def recalculate(formulas: dict, values: dict, coords) -> dict:
+    """
+    Computes the values of the formula cells in `coords` that have no cached value, and of the formula cells without
+    cached value they depend on, in dependency order. Cells that have a cached value are not recomputed.
+
+    Formulas are evaluated like relative rubrics (see `evaluate_formula`), with empty input cells read as 0, and
+    empty cells of ranges skipped.
+    Cells that can't be computed, e.g. formulas referring to other sheets, formulas with unsupported functions, or
+    formulas in a reference cycle, are left without value, as are the cells depending on them.
+
+    :param formulas: Dictionary of {cell coordinate: cell content} of the formula view of a sheet.
+    :param values: Dictionary of {cell coordinate: cached value} of the value view of the same sheet. The computed
+        values are added to it.
+    :param coords: Iterable of normalized cell coordinates whose values are needed.
+    :return: Dictionary of {cell coordinate: computed value}.
+    """
+    computed = {}
+    for coord in sort_dependencies(formulas, values, coords):
+        formula = formulas[coord]
+        try:
+            inputs = parse_formula_inputs(formula, encoded=False)
+            if any(values.get(input_coord) is None and is_formula(formulas.get(input_coord))
+                   for input_coord in inputs):
+                continue
+
+            sympy_formula = transform_excel_formula_to_sympy(formula)
+            compiled = compile_formula(sympy_formula, expand_ranges=False)
+            encoded_inputs = {
+                name: [values.get(coord)
+                       for coord in chain.from_iterable(rows_from_range(decode_range_reference(name)))]
+                if name in compiled.ranges else values.get(decode_cell_reference(name), 0)
+                for name in compiled.arguments
+            }
+            value = to_cell_value(evaluate_formula(sympy_formula, encoded_inputs, expand_ranges=False))
+        except Exception:
+            continue
+
+        if value is not None:
+            values[coord] = value
+            computed[coord] = value
+
+    return computed
+
+
+def sort_dependencies(formulas: dict, values: dict, coords) -> [str]:
+    """
+    Returns the formula cells without cached value among `coords` and their precedents, each after the cells it
+    depends on. Cells in a reference cycle are ordered arbitrarily.
+    :param formulas: Dictionary of {cell coordinate: cell content} of the formula view of a sheet.
+    :param values: Dictionary of {cell coordinate: cached value} of the value view of the same sheet.
+    :param coords: Iterable of normalized cell coordinates whose values are needed.
+    :return: List of cell coordinates.
+    """
+    order = []
+    # Cells being visited (False) or done (True).
+    states = {}
+
+    for root in coords:
+        # Iterative depth-first search, since chains of formulas can be longer than the recursion limit.
+        stack = [(root, None)]
+        while stack:
+            coord, precedents = stack.pop()
+            if precedents is None:
+                if coord in states or values.get(coord) is not None or not is_formula(formulas.get(coord)):
+                    continue
+                try:
+                    precedents = iter(parse_formula_inputs(formulas[coord], encoded=False))
+                except Exception:
+                    # Left to `recalculate()`, which fails to evaluate it too.
+                    precedents = iter(())
+                states[coord] = False
+
+            precedent = next(precedents, None)
+            if precedent is None:
+                states[coord] = True
+                order.append(coord)
+                continue
+
+            stack.append((coord, precedents))
+            # A precedent being visited closes a reference cycle. It's not followed, so the cells of the cycle are
+            # ordered anyway, but `recalculate()` skips them since one of their inputs is never computed.
+            if precedent not in states:
+                stack.append((precedent, None))
+
+    return order
+
+
+def to_cell_value(result):
+    """
+    Converts the result of `evaluate_formula` into a value like the ones cached by spreadsheet applications: a
+    Boolean, an int if the number is whole, a float, or a string.
+    :param result: Python or Sympy value.
+    :return: Boolean, int, float or String value, or None if the result isn't a single value.
+    """
+    if isinstance(result, (bool, str)):
+        return result
+    if isinstance(result, BooleanAtom):
+        return bool(result)
+
+    try:
+        number = float(result)
+    except (TypeError, ValueError):
+        return None
+
+    return int(number) if number.is_integer() else number
@@ -0,0 +1,260 @@
+import json
+import os
+
+
+class ScoreStatistics:
+    """
+    Streaming aggregate of scores: count, mean, minimum, maximum and a histogram of the scores as a fraction of the
+    maximum possible score. Uses the same memory whatever the number of scores added.
+    """
+
+    def __init__(self, histogram_bins: int = 10):
+        """
+        Initializer of this class.
+        :param histogram_bins: Integer number of histogram bins, splitting [0, 1] evenly. Defaults to 10.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.max_possible_score = 0
+        self.histogram = [0] * histogram_bins
+
+    def add(self, score, max_possible_score):
+        """
+        Adds a score. Negative scores are counted in the first histogram bin, and scores above the maximum possible
+        score in the last one.
+        :param score: Float value of the score.
+        :param max_possible_score: Float value of the maximum possible score.
+        """
+        self.count += 1
+        self.total += score
+        self.minimum = score if self.minimum is None else min(self.minimum, score)
+        self.maximum = score if self.maximum is None else max(self.maximum, score)
+        self.max_possible_score = max(self.max_possible_score, max_possible_score)
+
+        fraction = score / max_possible_score if max_possible_score > 0 else 0
+        bins = len(self.histogram)
+        self.histogram[min(max(int(fraction * bins), 0), bins - 1)] += 1
+
+    def to_dict(self):
+        """
+        Returns the JSON-friendly representation of this instance.
+        :return: Dictionary of the count, mean, minimum, maximum, maximum possible score and histogram.
+        """
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.minimum,
+            'max': self.maximum,
+            'max_possible_score': self.max_possible_score,
+            'histogram': list(self.histogram),
+        }
+
+
+class TopCounter:
+    """
+    Approximate counter of the most frequent values, keeping at most `maxsize` of them (Space-Saving algorithm).
+    When it's full, a new value replaces the least counted one and inherits its count, so the counts of rare values
+    can be overestimated, but frequent values are kept.
+    """
+
+    def __init__(self, maxsize: int = 10):
+        """
+        Initializer of this class.
+        :param maxsize: Integer maximum number of counted values. Defaults to 10.
+        """
+        self.maxsize = maxsize
+        self.counts = {}
+
+    def add(self, value):
+        """
+        Counts one occurrence of the passed `value`.
+        :param value: Hashable value.
+        """
+        if value in self.counts or len(self.counts) < self.maxsize:
+            self.counts[value] = self.counts.get(value, 0) + 1
+            return
+
+        least_value = min(self.counts, key=self.counts.get)
+        self.counts[value] = self.counts.pop(least_value) + 1
+
+    def most_common(self):
+        """
+        Returns the counted values, most frequent first.
+        :return: List of (value, count) tuples.
+        """
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+
+
+class RubricStatistics:
+    """
+    Streaming aggregate of the grading of a rubric, or of all rubrics of a GradingRubricType.
+    """
+
+    def __init__(self, rubric_type_name=None, histogram_bins: int = 10, max_errors: int = 10):
+        """
+        Initializer of this class.
+        :param rubric_type_name: String name of the rubric's GradingRubricType. Defaults to None.
+        :param histogram_bins: Integer number of bins of the score histogram. Defaults to 10.
+        :param max_errors: Integer number of most frequent errors kept. Defaults to 10.
+        """
+        self.rubric_type_name = rubric_type_name
+        self.scores = ScoreStatistics(histogram_bins)
+        self.correct = 0
+        self.errors = TopCounter(max_errors)
+
+    def add(self, rubric_report):
+        """
+        Adds the grading of a rubric.
+        :param rubric_report: GradingReport instance of the rubric.
+        """
+        self.scores.add(rubric_report.submission_score, rubric_report.max_possible_score)
+        if rubric_report.report_html_args.get('is_correct'):
+            self.correct += 1
+        error = rubric_report.report_html_args.get('error')
+        if error:
+            # Counted by message, since errors may be exception instances.
+            self.errors.add(str(error))
+
+    def to_dict(self):
+        """
+        Returns the JSON-friendly representation of this instance.
+        :return: Dictionary of the rubric type, counts, pass rate, scores and most frequent errors.
+        """
+        result = {'rubric_type': self.rubric_type_name} if self.rubric_type_name is not None else {}
+        result.update({
+            'graded': self.scores.count,
+            'correct': self.correct,
+            'pass_rate': self.correct / self.scores.count if self.scores.count else None,
+            'scores': self.scores.to_dict(),
+            'top_errors': [{'message': message, 'count': count} for message, count in self.errors.most_common()],
+        })
+        return result
+
+
+class ClassStatistics:
+    """
+    Statistics of a batch of graded submissions, aggregated as the submissions are graded: score distributions of
+    the assignment and its sheets, and pass rates, score distributions and most frequent errors of each rubric (by
+    sheet and cell ID) and of each GradingRubricType. The reports aren't kept, so the memory used only depends on
+    the key.
+
+    The statistics are saved as JSON every `write_interval` submissions and when the instance is closed. Please call
+    the `close()` method when the batch is done.
+    """
+
+    def __init__(self, output_path, rubrics, write_interval: int = 20, histogram_bins: int = 10,
+                 max_errors: int = 10, max_failed_rubrics: int = 5):
+        """
+        Initializer of this class.
+        :param output_path: String value of the JSON output file path.
+        :param rubrics: Dictionary of {sheet name: list of GradingRubric instances} of the key, in sheet order,
+            e.g. the `rubrics` of a Grader.
+        :param write_interval: Integer number of submissions between two saves of the statistics. Defaults to 20.
+        :param histogram_bins: Integer number of bins of the score histograms. Defaults to 10.
+        :param max_errors: Integer number of most frequent errors kept for each rubric and rubric type.
+            Defaults to 10.
+        :param max_failed_rubrics: Integer number of most failed rubrics listed for each sheet. Defaults to 5.
+        """
+        self.output_path = output_path
+        self.write_interval = write_interval
+        self.max_failed_rubrics = max_failed_rubrics
+        self.submissions = 0
+        self.failed_submissions = 0
+        self.scores = ScoreStatistics(histogram_bins)
+        self.sheet_scores = {}
+        self.minimum_work_not_reached = {}
+        self.rubric_statistics = {}
+        self.rubric_type_statistics = {}
+
+        for sheet_name, sheet_rubrics in rubrics.items():
+            self.sheet_scores[sheet_name] = ScoreStatistics(histogram_bins)
+            self.minimum_work_not_reached[sheet_name] = 0
+            statistics = self.rubric_statistics[sheet_name] = {}
+            for rubric in sheet_rubrics:
+                # Manual rubrics have no GradingRubricType.
+                type_name = rubric.rubric_type.name if rubric.rubric_type is not None else 'MANUAL'
+                statistics.setdefault(rubric.cell_id, RubricStatistics(type_name, histogram_bins, max_errors))
+                if type_name not in self.rubric_type_statistics:
+                    self.rubric_type_statistics[type_name] = RubricStatistics(None, histogram_bins, max_errors)
+
+    def append(self, report):
+        """
+        Adds a graded submission to the statistics, and saves them if `write_interval` submissions were added since
+        the last save.
+        :param report: GradingReport instance of the submission, or None if the submission couldn't be graded.
+        """
+        self.submissions += 1
+        if report is None:
+            self.failed_submissions += 1
+        else:
+            self.scores.add(report.submission_score, report.max_possible_score)
+            for sheet_report in report.children:
+                self.append_sheet(sheet_report)
+
+        if self.submissions % self.write_interval == 0:
+            self.save()
+
+    def append_sheet(self, sheet_report):
+        """
+        Adds the report of a graded sheet to the statistics.
+        :param sheet_report: GradingReport instance of the sheet.
+        """
+        sheet_name = sheet_report.report_html_args.get('name')
+        if sheet_name not in self.sheet_scores:
+            return
+
+        self.sheet_scores[sheet_name].add(sheet_report.submission_score, sheet_report.max_possible_score)
+        if not sheet_report.report_html_args.get('minimum_work_reached', True):
+            self.minimum_work_not_reached[sheet_name] += 1
+
+        statistics = self.rubric_statistics[sheet_name]
+        for rubric_report in sheet_report.children:
+            rubric_statistics = statistics.get(rubric_report.report_html_args.get('id'))
+            if rubric_statistics is None:
+                continue
+            rubric_statistics.add(rubric_report)
+            self.rubric_type_statistics[rubric_statistics.rubric_type_name].add(rubric_report)
+
+    def to_dict(self):
+        """
+        Returns the JSON-friendly representation of the statistics.
+        :return: Dictionary of the submission counts, assignment scores, sheets and rubric types statistics.
+        """
+        sheets = {}
+        for sheet_name, scores in self.sheet_scores.items():
+            rubrics = self.rubric_statistics[sheet_name]
+            failed = sorted(((statistics.scores.count - statistics.correct, cell_id)
+                             for cell_id, statistics in rubrics.items()), key=lambda item: item[0], reverse=True)
+            sheets[sheet_name] = {
+                'scores': scores.to_dict(),
+                'minimum_work_not_reached': self.minimum_work_not_reached[sheet_name],
+                'most_failed_rubrics': [{'cell_id': cell_id, 'failed': count}
+                                        for count, cell_id in failed[:self.max_failed_rubrics] if count > 0],
+                'rubrics': {cell_id: statistics.to_dict() for cell_id, statistics in rubrics.items()},
+            }
+
+        return {
+            'submissions': self.submissions,
+            'failed_submissions': self.failed_submissions,
+            'scores': self.scores.to_dict(),
+            'sheets': sheets,
+            'rubric_types': {name: statistics.to_dict() for name, statistics in self.rubric_type_statistics.items()},
+        }
+
+    def save(self):
+        """
+        Saves the statistics to the output path. The previous file is only replaced once the new one is written, so
+        the file stays readable if the batch stops while it's saved.
+        """
+        temporary_path = f"{self.output_path}.tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=1, default=str)
+        os.replace(temporary_path, self.output_path)
+
+    def close(self):
+        """
+        Saves the final statistics.
+        """
+        self.save()
@@ -1,3 +1,7 @@
+from collections import OrderedDict
+import threading
+
+
 def get_headers(header_names, row_values):
     """
     Takes a pre-defined dictionary and list of values
@@ -18,3 +22,66 @@ def get_headers(header_names, row_values):
                 header_index[key] = headers.pop(header)
                 break
     return header_index
+
+
+class LRUCache:
+    """
+    Bounded dictionary that evicts its least recently used entry when it's full, and counts its hits and misses.
+    Safe to share between threads. Each process has its own entries.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initializer of this class.
+        :param maxsize: Integer maximum number of entries. Defaults to 1024.
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value of the passed `key`, marking it as the most recently used entry.
+        :param key: Hashable key of the entry.
+        :param default: Value returned if there's no entry for the `key`. Defaults to None.
+        :return: Value of the entry, or `default`.
+        """
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores the passed `value` for the `key`, evicting the least recently used entry if the cache is full.
+        :param key: Hashable key of the entry.
+        :param value: Any value.
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every entry and resets the hit and miss counters.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
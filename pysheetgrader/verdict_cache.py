@@ -0,0 +1,137 @@
+import os
+import re
+import sqlite3
+
+from pysheetgrader.equivalence import EquivalenceResult, EquivalenceTier
+from pysheetgrader.formula_parser import compile_formula
+from pysheetgrader.utils import LRUCache
+
+# Matches whitespace outside of double-quoted strings.
+WHITESPACE_PATTERN = re.compile(r'\s+(?=(?:[^"]*"[^"]*")*[^"]*$)')
+
+
+class VerdictCache:
+    """
+    Cache of formula equivalence verdicts, keyed by the normalized key formula, the normalized submission formula and
+    the rubric delta. Verdicts are kept in memory, and optionally in a SQLite file that can be shared by worker
+    processes and by later runs, e.g. when a section is graded again after a rubric change. Only the verdicts of
+    tiers that don't depend on the EquivalenceBudget are stored in the SQLite file, since later runs can use
+    another budget.
+
+    Attributes:
+        VERSION         Version of the stored verdicts. SQLite files with another version are cleared when opened,
+                        so verdicts of older equivalence checks are not reused.
+        STORED_TIERS    EquivalenceTier values whose verdicts are stored in the SQLite file.
+    """
+
+    VERSION = 2
+    STORED_TIERS = frozenset((EquivalenceTier.STRUCTURAL, EquivalenceTier.PROBE, EquivalenceTier.ALGEBRAIC,
+                              EquivalenceTier.SIMPLIFY))
+
+    def __init__(self, path: str = None, maxsize: int = 65536):
+        """
+        Initializer of this class. The SQLite file is opened on first use, in each process using this instance.
+        :param path: String value of the SQLite file path. Defaults to None, which keeps the verdicts in memory only.
+        :param maxsize: Integer maximum number of verdicts kept in memory. Defaults to 65536.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.memory = LRUCache(maxsize)
+        self.connection = None
+        self.connection_pid = None
+
+    def __getstate__(self):
+        # Sent to worker processes without the verdicts in memory and the SQLite connection.
+        return {'path': self.path, 'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['maxsize'])
+
+    def get(self, key_formula: str, sub_formula: str, delta: float = 0):
+        """
+        Returns the cached verdict of the passed formulas, from memory or from the SQLite file.
+        :param key_formula: String value of the key formula.
+        :param sub_formula: String value of the submission formula.
+        :param delta: Float value of the rubric delta. Defaults to 0.
+        :return: EquivalenceResult instance, or None if there's no cached verdict.
+        """
+        key = self.create_key(key_formula, sub_formula, delta)
+        result = self.memory.get(key)
+        if result is not None or self.path is None:
+            return result
+
+        row = self.get_connection().execute(
+            "SELECT is_equivalent, tier FROM verdicts WHERE key_formula = ? AND sub_formula = ? AND delta = ?",
+            key).fetchone()
+        if row is None:
+            return None
+
+        result = EquivalenceResult(bool(row[0]), EquivalenceTier(row[1]))
+        self.memory.put(key, result)
+        return result
+
+    def put(self, key_formula: str, sub_formula: str, delta: float, result: EquivalenceResult):
+        """
+        Stores the verdict of the passed formulas in memory, and in the SQLite file if its tier is in STORED_TIERS.
+        :param key_formula: String value of the key formula.
+        :param sub_formula: String value of the submission formula.
+        :param delta: Float value of the rubric delta.
+        :param result: EquivalenceResult instance.
+        """
+        key = self.create_key(key_formula, sub_formula, delta)
+        self.memory.put(key, result)
+        if self.path is None or result.tier not in self.STORED_TIERS:
+            return
+
+        with self.get_connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)",
+                               key + (int(result.is_equivalent), result.tier.value))
+
+    def get_connection(self):
+        """
+        Returns the SQLite connection of the current process, opening the file and creating its table if needed.
+        :return: sqlite3.Connection instance.
+        """
+        if self.connection is not None and self.connection_pid == os.getpid():
+            return self.connection
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        with connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+                connection.execute("DROP TABLE IF EXISTS verdicts")
+                connection.execute(f"PRAGMA user_version = {self.VERSION}")
+            connection.execute("CREATE TABLE IF NOT EXISTS verdicts (key_formula TEXT, sub_formula TEXT, delta REAL, "
+                               "is_equivalent INTEGER, tier TEXT, PRIMARY KEY (key_formula, sub_formula, delta))")
+
+        self.connection = connection
+        self.connection_pid = os.getpid()
+        return connection
+
+    def close(self):
+        """
+        Closes the SQLite connection of the current process, if it's open.
+        """
+        if self.connection is not None and self.connection_pid == os.getpid():
+            self.connection.close()
+        self.connection = None
+
+    @staticmethod
+    def create_key(key_formula: str, sub_formula: str, delta: float):
+        """
+        Returns the cache key of the passed formulas and delta.
+        :param key_formula: String value of the key formula.
+        :param sub_formula: String value of the submission formula.
+        :param delta: Float value of the rubric delta.
+        :return: Tuple of (String, String, Float).
+        """
+        return normalize_formula(key_formula), normalize_formula(sub_formula), float(delta or 0)
+
+
+def normalize_formula(formula: str) -> str:
+    """
+    Returns the passed formula in the form it's parsed: cell ranges expanded, lower-cased, and without whitespace
+    outside of strings, so formulas only differing in these respects share their verdicts.
+    :param formula: String value of the formula. Should start with '='.
+    :return: String value of the normalized formula.
+    """
+    return WHITESPACE_PATTERN.sub('', compile_formula(formula).expression)
@@ -0,0 +1,460 @@
+import re
+
+from openpyxl import load_workbook
+from openpyxl.comments.comment_sheet import CommentSheet
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
+from openpyxl.utils import get_column_letter, coordinate_to_tuple, range_boundaries
+from openpyxl.worksheet._reader import WorkSheetParser, FORMULA_TAG
+from openpyxl.xml.constants import COMMENTS_NS
+from openpyxl.xml.functions import fromstring
+
+from pysheetgrader.formula_parser import parse_formula_inputs
+from pysheetgrader.profiler import profiled
+from pysheetgrader.recalculation import is_formula, recalculate
+
+# Matches a single cell coordinate, with optional absolute reference markers (e.g. "B4", "$B$4" or "b4").
+CELL_COORD_PATTERN = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+# Maximum number of times a partially loaded sheet is parsed again to load the cells its formula cells depend on,
+# before the whole sheet is loaded instead (see `WorkbookReader.load_precedents()`).
+MAX_PRECEDENT_PASSES = 4
+
+
+class IndexedCell:
+    """
+    Read-only cell returned by IndexedSheet. Like openpyxl's cells, its content is in the `value` attribute and its
+    note is in the `comment` attribute. The comments of the sheet are only read when a `comment` is accessed.
+    """
+    __slots__ = ('value', 'sheet', 'coord')
+
+    def __init__(self, value, sheet=None, coord=None):
+        self.value = value
+        self.sheet = sheet
+        self.coord = coord
+
+    @property
+    def comment(self):
+        return self.sheet.get_comment(self.coord) if self.sheet is not None else None
+
+
+class IndexedSheet:
+    """
+    Read-only worksheet backed by a coordinate -> value index, so looking up a cell doesn't depend on the size
+    of the sheet. Cells are accessed like openpyxl's worksheets, e.g. `sheet["B4"].value`.
+    Empty cells are not stored, and looking them up returns a cell with a None value.
+
+    A sheet can be partially loaded, holding only the cells in `loaded_coords`. Looking up any other cell calls
+    `load_all_cells()` first, which is expected to fill `values` with every cell and reset `loaded_coords` to None.
+    """
+
+    def __init__(self, title: str, values: dict, loaded_coords: set = None, load_all_cells=None,
+                 load_comments=None):
+        """
+        Initializer of this class.
+        :param title: String value of the sheet name.
+        :param values: Dictionary of {str: any} with upper-cased cell coordinates (without `$`) as keys
+            and the cell values as values.
+        :param loaded_coords: Set of the normalized cell coordinates loaded in `values` if the sheet is partially
+            loaded. Defaults to None, which means every cell is loaded.
+        :param load_all_cells: Callable without arguments that loads every cell of a partially loaded sheet.
+        :param load_comments: Callable without arguments that returns the dictionary of {cell coordinate: openpyxl's
+            Comment} of this sheet. Defaults to None, which means the sheet has no comments.
+        """
+        self.title = title
+        self.values = values
+        self.loaded_coords = loaded_coords
+        self.load_all_cells = load_all_cells
+        self.load_comments = load_comments
+        self.comments = None
+
+    def __getitem__(self, coord):
+        value = self.values.get(coord)
+        if value is not None:
+            return IndexedCell(value, self, coord)
+
+        coord = self.normalize_coord(coord)
+        if self.loaded_coords is not None and coord not in self.loaded_coords:
+            self.load_all_cells()
+
+        return IndexedCell(self.values.get(coord), self, coord)
+
+    def get_range(self, range_string):
+        """
+        Returns the values of the cells in the passed range, like the values of openpyxl's `worksheet[range_string]`.
+        Loads every cell first if any cell of the range isn't loaded.
+        :param range_string: String value of a cell range, e.g. "B2:$C$500".
+        :return: Tuple of rows, each a tuple of cell values.
+        """
+        min_col, min_row, max_col, max_row = range_boundaries(range_string)
+        columns = [get_column_letter(column) for column in range(min_col, max_col + 1)]
+        rows = range(min_row, max_row + 1)
+        if self.loaded_coords is not None \
+                and any(f"{column}{row}" not in self.loaded_coords for row in rows for column in columns):
+            self.load_all_cells()
+
+        values = self.values
+        return tuple(tuple(values.get(f"{column}{row}") for column in columns) for row in rows)
+
+    def get_comment(self, coord):
+        """
+        Returns the comment (note) of the passed cell, reading the comments of this sheet the first time it's called.
+        :param coord: String value of a normalized cell coordinate, e.g. "B4".
+        :return: openpyxl's Comment instance, or None if the cell has no comment.
+        """
+        if self.comments is None:
+            self.comments = self.load_comments() if self.load_comments else {}
+
+        return self.comments.get(coord)
+
+    def iter_rows(self, min_row=1, values_only=True):
+        """
+        Returns the rows of this sheet from `min_row` to its last non-empty row, like openpyxl's `iter_rows()`.
+        Every row holds the values from column A to the last non-empty column of the sheet.
+        :param min_row: Integer index of the first row, starting from 1. Defaults to 1.
+        :param values_only: Only True is supported, since this sheet doesn't have cell objects.
+        :return: Generator of tuples of cell values.
+        :exception ValueError: Raises a ValueError if `values_only` is False.
+        """
+        if not values_only:
+            raise ValueError("IndexedSheet only supports iterating over the cell values.")
+        if self.loaded_coords is not None:
+            self.load_all_cells()
+
+        cells = {coordinate_to_tuple(coord): value for coord, value in self.values.items()}
+        if not cells:
+            return
+
+        max_row = max(row for row, _ in cells)
+        max_column = max(column for _, column in cells)
+        for row in range(min_row, max_row + 1):
+            yield tuple(cells.get((row, column)) for column in range(1, max_column + 1))
+
+    @staticmethod
+    def normalize_coord(coord: str) -> str:
+        """
+        Returns the passed cell coordinate in the form used as key of the index: upper-cased and without `$`.
+        :param coord: String value of a cell coordinate, e.g. "$b$4".
+        :return: String value of the normalized coordinate, e.g. "B4".
+        :exception ValueError: Raises a ValueError if the passed `coord` is not a single cell coordinate.
+        """
+        match = CELL_COORD_PATTERN.match(coord) if isinstance(coord, str) else None
+        if not match:
+            raise ValueError(f"{coord} is not a valid cell coordinate")
+
+        return f"{match.group(1).upper()}{match.group(2)}"
+
+
+def get_range_values(sheet, range_string):
+    """
+    Returns the values of the cells in the passed range of an IndexedSheet or an openpyxl worksheet.
+    :param sheet: IndexedSheet or openpyxl's worksheet instance.
+    :param range_string: String value of a cell range, e.g. "B2:C500".
+    :return: Tuple of rows, each a tuple of cell values.
+    """
+    if isinstance(sheet, IndexedSheet):
+        return sheet.get_range(range_string)
+
+    min_col, min_row, max_col, max_row = range_boundaries(range_string)
+    return tuple(sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                                 values_only=True))
+
+
+class DualViewWorksheetParser(WorkSheetParser):
+    """
+    openpyxl's worksheet parser that reads both the formula and the cached value of every cell in a single pass.
+    The parsed cell dictionaries have an extra `formula` entry, holding what openpyxl would return as the cell value
+    with `data_only=False`, while `value` holds what it would return with `data_only=True`.
+    """
+
+    def __init__(self, *args, coords: set = None, **kwargs):
+        """
+        Initializer of this class. Accepts the arguments of openpyxl's WorkSheetParser, except `data_only`, and:
+        :param coords: Set of normalized cell coordinates to be parsed. The other cells are skipped and parsed as None.
+            Defaults to None, which parses every cell.
+        """
+        kwargs['data_only'] = True
+        super().__init__(*args, **kwargs)
+        self.coords = coords
+
+    def parse_cell(self, element):
+        coordinate = element.get('r')
+        if self.coords is not None and coordinate and coordinate not in self.coords:
+            self.col_counter = coordinate_to_tuple(coordinate)[1]
+            # Skipped cells may still be the origin of a shared formula used by a parsed cell.
+            formula = element.find(FORMULA_TAG)
+            if formula is not None and formula.get('t') == 'shared':
+                self.parse_formula(element)
+            return None
+
+        cell = super().parse_cell(element)
+        cell['formula'] = self.parse_formula(element) if element.find(FORMULA_TAG) is not None else cell['value']
+        return cell
+
+
+class WorkbookReader:
+    """
+    Reads the worksheets of an xlsx file on demand. Each worksheet is parsed once, the first time it's read, into two
+    IndexedSheet instances: one holding the formulas and one holding the values cached by the spreadsheet application.
+    Please call the `close()` method when it's not used anymore.
+
+    Sheets listed in `targets` are partially loaded: only their targeted cells are kept, and the sheet is only parsed
+    up to the last targeted row. If any other cell of such a sheet is looked up, the whole sheet is parsed again.
+
+    With `recalculate`, formula cells without cached value (e.g. in files saved by scripts or exported by some
+    spreadsheet applications) are computed when their sheet is read, see `recalculate_sheet()`. The cells they depend
+    on are then loaded too.
+    """
+
+    def __init__(self, path, targets: dict = None, recalculate: bool = False):
+        """
+        Initializer of this class. Only the workbook structure and shared strings are loaded here.
+        :param path: Valid path of the xlsx file.
+        :param targets: Dictionary of {sheet name: set of cell coordinates} of the cells that are expected to be
+            looked up. Defaults to None, which loads every cell of every sheet.
+        :param recalculate: Boolean marker whether the formula cells without cached value should be computed.
+            Defaults to False.
+        """
+        self.path = path
+        self.recalculate = recalculate
+        self.workbook = load_workbook(path, read_only=True, data_only=False)
+        self.sheetnames = self.workbook.sheetnames
+        self.sheets = {}
+        self.targets = {
+            sheet_name: {IndexedSheet.normalize_coord(coord) for coord in coords}
+            for sheet_name, coords in (targets or {}).items()
+        }
+
+    def read_sheet(self, sheet_name):
+        """
+        Returns the formula and value views of the passed sheet, parsing the sheet if it hasn't been read yet.
+        :param sheet_name: String value of the sheet name.
+        :return: Tuple of (IndexedSheet of formulas, IndexedSheet of cached values).
+        :exception KeyError: Raises a KeyError if the workbook doesn't have the passed sheet.
+        """
+        views = self.sheets.get(sheet_name)
+        if views is None:
+            coords = self.targets.get(sheet_name)
+            formulas, values = self.parse_worksheet(self.workbook[sheet_name], coords)
+            views = tuple(
+                IndexedSheet(sheet_name, sheet_values, coords, lambda: self.load_all_cells(sheet_name),
+                             lambda: self.read_comments(sheet_name))
+                for sheet_values in (formulas, values)
+            )
+            self.sheets[sheet_name] = views
+            if self.recalculate:
+                self.recalculate_sheet(sheet_name)
+
+        return views
+
+    def read_comments(self, sheet_name):
+        """
+        Reads the comments (notes) of the passed sheet directly from its comments part in the xlsx file, since
+        openpyxl's read-only worksheets don't load them.
+        :param sheet_name: String value of the sheet name.
+        :return: Dictionary of {cell coordinate: openpyxl's Comment}.
+        """
+        archive = self.workbook._archive
+        rels_path = get_rels_path(self.workbook[sheet_name]._worksheet_path)
+        if rels_path not in archive.namelist():
+            return {}
+
+        comments = {}
+        for rel in get_dependents(archive, rels_path).find(COMMENTS_NS):
+            comment_sheet = CommentSheet.from_tree(fromstring(archive.read(rel.target)))
+            comments.update(comment_sheet.comments)
+
+        return comments
+
+    def load_all_cells(self, sheet_name):
+        """
+        Parses every cell of the passed partially loaded sheet into both of its views.
+        :param sheet_name: String value of the sheet name.
+        """
+        formulas, values = self.parse_worksheet(self.workbook[sheet_name])
+        for sheet, sheet_values in zip(self.sheets[sheet_name], (formulas, values)):
+            sheet.values = sheet_values
+            sheet.loaded_coords = None
+
+        if self.recalculate:
+            self.recalculate_sheet(sheet_name)
+
+    @profiled('recalculate_sheet')
+    def recalculate_sheet(self, sheet_name):
+        """
+        Computes the values of the formula cells of the passed sheet that have no cached value, see `recalculate()`.
+        Only the targeted cells of the sheet, if any, and the cells they depend on are computed. Sheets whose targeted
+        cells all have a cached value are left as they are, so this costs a lookup per targeted cell for most files.
+        For partially loaded sheets, the cells the targeted cells depend on are loaded first (see `load_precedents()`),
+        or the whole sheet if there are too many levels of dependencies.
+        :param sheet_name: String value of the name of a sheet already read.
+        """
+        formula_sheet, value_sheet = self.sheets[sheet_name]
+        coords = self.targets.get(sheet_name) or list(formula_sheet.values)
+        if all(value_sheet.values.get(coord) is not None or not is_formula(formula_sheet.values.get(coord))
+               for coord in coords):
+            return
+
+        if formula_sheet.loaded_coords is not None and not self.load_precedents(sheet_name, coords):
+            # Loading every cell recalculates the sheet.
+            self.load_all_cells(sheet_name)
+            return
+
+        recalculate(formula_sheet.values, value_sheet.values, coords)
+
+    def load_precedents(self, sheet_name, coords):
+        """
+        Loads the cells of the passed partially loaded sheet that the formula cells without cached value among
+        `coords` depend on, directly or through other such formula cells. Each level of dependencies that isn't
+        loaded yet costs a parse of the sheet, up to MAX_PRECEDENT_PASSES.
+        :param sheet_name: String value of the name of a sheet already read.
+        :param coords: Iterable of normalized cell coordinates whose values are needed.
+        :return: True if every cell needed to recalculate `coords` is loaded, False if there were too many levels of
+            dependencies to load.
+        """
+        formula_sheet, value_sheet = self.sheets[sheet_name]
+        pending = set(coords)
+        visited = set()
+        passes = 0
+        while True:
+            missing = set()
+            while pending:
+                coord = pending.pop()
+                if coord in visited:
+                    continue
+                if coord not in formula_sheet.loaded_coords:
+                    if CELL_COORD_PATTERN.match(coord):
+                        missing.add(coord)
+                    continue
+
+                visited.add(coord)
+                formula = formula_sheet.values.get(coord)
+                if value_sheet.values.get(coord) is not None or not is_formula(formula):
+                    continue
+                try:
+                    pending.update(parse_formula_inputs(formula, encoded=False))
+                except Exception:
+                    # Left to `recalculate()`, which fails to evaluate it too.
+                    continue
+
+            if not missing:
+                return True
+            if passes == MAX_PRECEDENT_PASSES:
+                return False
+
+            self.load_cells(sheet_name, missing)
+            passes += 1
+            pending = missing
+
+    def load_cells(self, sheet_name, coords: set):
+        """
+        Parses the passed cells of the passed partially loaded sheet into both of its views.
+        :param sheet_name: String value of the sheet name.
+        :param coords: Set of normalized cell coordinates.
+        """
+        formulas, values = self.parse_worksheet(self.workbook[sheet_name], coords)
+        for sheet, sheet_values in zip(self.sheets[sheet_name], (formulas, values)):
+            sheet.values.update(sheet_values)
+            sheet.loaded_coords = sheet.loaded_coords | coords
+
+    @profiled('parse_worksheet')
+    def parse_worksheet(self, worksheet, coords: set = None):
+        """
+        Parses the passed read-only worksheet into the values of its formula and value views.
+        :param worksheet: openpyxl's ReadOnlyWorksheet instance of this reader's workbook.
+        :param coords: Set of normalized cell coordinates to be parsed. Defaults to None, which parses every cell.
+        :return: Tuple of (dictionary of formulas, dictionary of cached values), keyed by cell coordinates.
+        """
+        formulas = {}
+        values = {}
+        last_row = max(coordinate_to_tuple(coord)[0] for coord in coords) if coords else None
+        with worksheet._get_source() as source:
+            parser = DualViewWorksheetParser(source, worksheet._shared_strings,
+                                             epoch=self.workbook.epoch,
+                                             date_formats=self.workbook._date_formats,
+                                             timedelta_formats=self.workbook._timedelta_formats,
+                                             coords=coords)
+            for row_index, row in parser.parse():
+                if last_row is not None and row_index > last_row:
+                    break
+
+                for cell in row:
+                    if cell is None:
+                        continue
+                    coord = f"{get_column_letter(cell['column'])}{cell['row']}"
+                    if cell['formula'] is not None:
+                        formulas[coord] = cell['formula']
+                    if cell['value'] is not None:
+                        values[coord] = cell['value']
+
+        return formulas, values
+
+    def close(self):
+        """
+        Closes the xlsx file.
+        """
+        self.workbook.close()
+
+
+class PreloadedWorkbookReader:
+    """
+    WorkbookReader counterpart for sheets that were already parsed, e.g. the sheets stored in a compiled key.
+    """
+
+    def __init__(self, sheets: dict):
+        """
+        Initializer of this class.
+        :param sheets: Dictionary of {sheet name: (IndexedSheet of formulas, IndexedSheet of cached values)},
+            in the order of the sheets in the workbook.
+        """
+        self.sheets = sheets
+        self.sheetnames = list(sheets)
+
+    def read_sheet(self, sheet_name):
+        """
+        Returns the formula and value views of the passed sheet.
+        :param sheet_name: String value of the sheet name.
+        :return: Tuple of (IndexedSheet of formulas, IndexedSheet of cached values).
+        :exception KeyError: Raises a KeyError if there's no sheet with the passed name.
+        """
+        if sheet_name not in self.sheets:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+        return self.sheets[sheet_name]
+
+    def close(self):
+        """
+        Does nothing, since there's no file to close. Defined for compatibility with WorkbookReader.
+        """
+
+
+class IndexedWorkbook:
+    """
+    Read-only workbook whose sheets are IndexedSheet instances, read on demand through a WorkbookReader.
+    Sheets that are never accessed are never read.
+    Please call the `close()` method when it's not used anymore.
+    """
+
+    def __init__(self, reader: WorkbookReader, data_only: bool):
+        """
+        Initializer of this class.
+        :param reader: WorkbookReader (or PreloadedWorkbookReader) instance. It can be shared by the formula and
+            value views.
+        :param data_only: Boolean marker whether the sheets should hold the cached values instead of the formulas,
+            like openpyxl's `data_only`.
+        """
+        self.reader = reader
+        self.data_only = data_only
+        self.sheetnames = reader.sheetnames
+
+    def __getitem__(self, sheet_name):
+        formula_sheet, value_sheet = self.reader.read_sheet(sheet_name)
+        return value_sheet if self.data_only else formula_sheet
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self.sheetnames
+
+    def close(self):
+        """
+        Closes the underlying WorkbookReader.
+        """
+        self.reader.close()
@@ -5,7 +5,7 @@ setup(
     version='1.0',
     packages=find_packages(),
     install_requires=[
-        'openpyxl', 'sympy', 'click', 'pyYAML'
+        'openpyxl', 'sympy', 'click', 'pyYAML', 'numpy'
     ],
     entry_points='''
         [console_scripts]